@@ -5,7 +5,6 @@
 from flask import Flask
 from flask import Blueprint
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bootstrap import Bootstrap
 from config import Config
@@ -14,7 +13,6 @@ from config import Config
 # region
 # Database
 db = SQLAlchemy()
-migrate = Migrate()
 
 # Authentication
 login = LoginManager()
@@ -22,6 +20,16 @@ login.login_view = 'auth.login'
 
 # Bootstrap
 bootstrap = Bootstrap()
+
+# Migrations: `from app import migrate` still gets the Flask-Migrate extension,
+# but it's only created (and Alembic imported) when first asked for
+def __getattr__(name):
+    if name == 'migrate':
+        from flask_migrate import Migrate
+        globals()['migrate'] = Migrate()
+        return globals()['migrate']
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 # endregion
 
 def create_app(config=Config):
@@ -30,9 +38,27 @@ def create_app(config=Config):
     app = Flask(__name__)
     app.config.from_object(config)
 
+    # Take the client's address and scheme from trusted proxies' headers
+    if app.config['TRUSTED_PROXIES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
     # Init db extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+
+    # Init extensions only needed by the flask command (Alembic is slow to import)
+    if app.config['LOAD_CLI_EXTENSIONS']:
+        from app import migrate
+        migrate.init_app(app, db)
+
+    # Init database connection settings
+    from app import database
+    database.init_app(app)
+
+    # Init per-request SQL instrumentation
+    from app import instrumentation
+    instrumentation.init_app(app)
 
     # Init login extension
     login.init_app(app)
@@ -48,13 +74,17 @@ def create_app(config=Config):
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix="/auth")
 
+    # Init request metrics (registers the metrics blueprint when enabled)
+    from app import metrics
+    metrics.init_app(app)
+
     return app
 
 # Avoiding circular import
-from app.auth.models import Admin
+from app.auth.identity import load_identity
 
 @login.user_loader
-def user_loader(admin_id):
+def user_loader(user_id):
     """User loader function for Flask-Login."""
 
-    return Admin.query.get(admin_id)
+    return load_identity(user_id)
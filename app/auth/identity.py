@@ -0,0 +1,171 @@
+"""Cached identities for signed-in admins.
+
+Flask-Login loads the signed-in admin on every authenticated request. Instead of
+querying the admin table each time, a detached AdminIdentity is kept in a
+per-process cache for IDENTITY_CACHE_TTL seconds.
+
+Session ids carry a fingerprint of the admin's email and password hash, so a
+session started before either changed no longer matches once the cached
+identity is refreshed. (Rehashing a password with a new method changes the
+hash too, so it also signs the admin's other sessions out.) Sessions holding
+a bare admin id, from before fingerprints, are upgraded to a fingerprinted id
+while ACCEPT_LEGACY_SESSION_IDS is set and refused once it isn't.
+
+Changes made in this process drop the cached identity immediately. If
+IDENTITY_CACHE_DIR names a directory shared by the worker processes, each
+change also touches a marker file there, and other workers reload an identity
+whose marker is newer than their copy. Without it, other workers notice within
+the TTL.
+"""
+
+import os
+import threading
+import time
+from flask import current_app, has_app_context, has_request_context, session
+from flask_login import UserMixin
+from sqlalchemy import event
+from app.auth.models import Admin
+
+class AdminIdentity(UserMixin):
+    """The signed-in admin, detached from any database session."""
+
+    def __init__(self, admin):
+        self.id = admin.id #pylint: disable=invalid-name
+        self.first_name = admin.first_name
+        self.last_name = admin.last_name
+        self.email = admin.email
+        self.fingerprint = admin.session_fingerprint()
+
+    def get_id(self):
+        return f'{self.id}:{self.fingerprint}'
+
+class IdentityCache():
+    """A TTL-bounded cache of AdminIdentity objects keyed by admin id."""
+
+    def __init__(self, ttl, directory=None, max_entries=1024):
+        self.ttl = ttl
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _marker(self, admin_id):
+        return os.path.join(self.directory, f'admin-{admin_id}')
+
+    def _changed_since(self, admin_id, loaded):
+        """Check whether another process invalidated an admin after loaded (time.time())."""
+
+        if not self.directory:
+            return False
+
+        try:
+            return os.stat(self._marker(admin_id)).st_mtime >= loaded
+        except FileNotFoundError:
+            return False
+
+    def get(self, admin_id):
+        """Get a cached identity, or None if it's missing, expired, or invalidated."""
+
+        with self._lock:
+            entry = self._entries.get(admin_id)
+
+        if entry is None:
+            return None
+
+        identity, loaded = entry
+        if time.time() - loaded >= self.ttl or self._changed_since(admin_id, loaded):
+            self.discard(admin_id)
+            return None
+
+        return identity
+
+    def put(self, identity):
+        """Cache an identity."""
+
+        if not self.ttl:
+            return
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[identity.id] = (identity, time.time())
+
+    def discard(self, admin_id):
+        """Drop an admin's identity from this process's cache."""
+
+        with self._lock:
+            self._entries.pop(admin_id, None)
+
+    def invalidate(self, admin_id):
+        """Drop an admin's identity in this process and, if shared, in the others."""
+
+        self.discard(admin_id)
+
+        if self.directory:
+            with open(self._marker(admin_id), 'a'):
+                pass
+            os.utime(self._marker(admin_id))
+
+def identity_cache():
+    """Get the current app's identity cache, creating it on first use."""
+
+    cache = current_app.extensions.get('identity_cache')
+
+    if cache is None:
+        cache = IdentityCache(
+            current_app.config['IDENTITY_CACHE_TTL'],
+            directory=current_app.config['IDENTITY_CACHE_DIR']
+        )
+        current_app.extensions['identity_cache'] = cache
+
+    return cache
+
+def load_identity(user_id):
+    """Load the admin for a Flask-Login session id, or None if it's no longer valid.
+
+    Session ids are "<admin id>:<fingerprint>". Bare admin ids from sessions
+    started before fingerprints were added are accepted while
+    ACCEPT_LEGACY_SESSION_IDS is set, and the session's id is upgraded so it's
+    checked like any other from then on.
+    """
+
+    admin_id, _, session_fingerprint = user_id.partition(':')
+
+    if not session_fingerprint and not current_app.config['ACCEPT_LEGACY_SESSION_IDS']:
+        return None
+
+    try:
+        admin_id = int(admin_id)
+    except ValueError:
+        return None
+
+    cache = identity_cache()
+    identity = cache.get(admin_id)
+
+    # A mismatch may just mean our copy predates a change made elsewhere
+    if identity is None or \
+            (session_fingerprint and identity.fingerprint != session_fingerprint):
+        admin = Admin.query.get(admin_id)
+        if admin is None:
+            cache.discard(admin_id)
+            return None
+
+        identity = AdminIdentity(admin)
+        cache.put(identity)
+
+    if session_fingerprint and identity.fingerprint != session_fingerprint:
+        return None
+
+    if not session_fingerprint and has_request_context():
+        session['_user_id'] = identity.get_id()
+
+    return identity
+
+@event.listens_for(Admin, 'after_update')
+@event.listens_for(Admin, 'after_delete')
+def _invalidate_admin(mapper, connection, admin): #pylint: disable=unused-argument
+    if has_app_context():
+        identity_cache().invalidate(admin.id)
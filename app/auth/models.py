@@ -1,5 +1,6 @@
 """Models for authentication."""
 
+import hashlib
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
@@ -13,12 +14,33 @@ class Admin(UserMixin, db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     email = db.Column(db.String(64), nullable=False)
 
-    def set_password(self, password):
-        """Set the user's password."""
+    def set_password(self, password, method='pbkdf2:sha256'):
+        """Set the user's password, hashed with the given werkzeug method."""
 
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=method)
+
+    def needs_rehash(self, method):
+        """Check whether the password hash was made with a method other than method."""
+
+        return self.password_hash.split('$', 1)[0] != method
 
     def check_password(self, password):
         """Check the user's password."""
 
         return check_password_hash(self.password_hash, password)
+
+    def session_fingerprint(self):
+        """Get a short digest of the admin's email and password hash.
+
+        werkzeug salts every new hash, so this changes whenever the password is
+        set or rehashed, even to the same password.
+        """
+
+        return hashlib.sha256(
+            f'{self.email}\0{self.password_hash}'.encode('utf-8')
+        ).hexdigest()[:16]
+
+    def get_id(self):
+        """Get the Flask-Login session id, which changes with the email or password."""
+
+        return f'{self.id}:{self.session_fingerprint()}'
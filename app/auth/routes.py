@@ -1,11 +1,14 @@
 """Routes for authentication."""
 
-from flask import flash, redirect, url_for, render_template, request
+from flask import flash, redirect, url_for, render_template, request, current_app
 from flask_login import login_required, logout_user, login_user, current_user
+from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.urls import url_parse
+from app import db
 from app.auth import bp
 from app.auth.forms import LoginForm
 from app.auth.models import Admin
+from app.auth.verification import VerifierBusy, login_throttle, password_verifier
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -16,11 +19,58 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
+        config = current_app.config
+        throttle = login_throttle()
+        ip_key = f'ip:{request.remote_addr}'
+        email_key = f'email:{form.email.data.strip().lower()}'
+
+        if throttle.blocked(ip_key, config['LOGIN_MAX_FAILURES_PER_IP']):
+            flash('Too many failed sign-in attempts. Please wait a few minutes and try again.',
+                  'danger')
+            return render_template('login.html', title='Sign in', form=form), 429
+
+        # Anyone can fail sign-ins for a known email, so a throttled email is
+        # still checked and only its failures are refused
+        email_blocked = throttle.blocked(email_key, config['LOGIN_MAX_FAILURES_PER_EMAIL'])
+
+        verifier = password_verifier()
         admin = Admin.query.filter_by(email=form.email.data).first()
-        if admin is None or not admin.check_password(form.password.data):
+
+        try:
+            valid = admin is not None and \
+                verifier.run(check_password_hash, admin.password_hash, form.password.data)
+        except VerifierBusy:
+            flash('Sign-in is busy right now. Please try again in a moment.', 'danger')
+            return render_template('login.html', title='Sign in', form=form), 503
+
+        if not valid:
+            throttle.fail(ip_key)
+            throttle.fail(email_key)
+
+            if email_blocked:
+                flash('Too many failed sign-in attempts. Please wait a few minutes and try '
+                      'again.', 'danger')
+                return render_template('login.html', title='Sign in', form=form), 429
+
             flash('Unknown user or invalid password!', 'danger')
             return redirect(url_for('auth.login'))
         else:
+            throttle.reset(email_key)
+
+            # Upgrade the stored hash now that we have the password. The new hash
+            # has a new salt, so this changes the session fingerprint and signs
+            # the admin's other sessions out; this one is started below with
+            # the new fingerprint.
+            method = config['PASSWORD_HASH_METHOD']
+            if admin.needs_rehash(method):
+                try:
+                    admin.password_hash = verifier.run(
+                        generate_password_hash, form.password.data, method
+                    )
+                    db.session.commit()
+                except VerifierBusy:
+                    pass
+
             login_user(admin, remember=form.remember_me)
 
             next_page = request.args.get('next')
@@ -0,0 +1,88 @@
+"""Tests for cached admin identities."""
+
+import shutil
+import tempfile
+import time
+import unittest
+from app import db
+from app.auth.identity import AdminIdentity, IdentityCache
+from app.auth.models import Admin
+from app.tests.test_utils import RouteTestMixin, StatementCounter
+
+class TestIdentityCache(RouteTestMixin, unittest.TestCase):
+    """Signed-in admins are loaded from the cache until they change."""
+
+    def test_cached_between_requests(self):
+        """Only the first authenticated request queries the admin table."""
+
+        self.login_admin()
+
+        with StatementCounter() as first:
+            self.assertEqual(200, self.client.get('/meal_list').status_code)
+        with StatementCounter() as second:
+            self.assertEqual(200, self.client.get('/meal_list').status_code)
+
+        self.assertEqual(len(first) - 1, len(second))
+        self.assertFalse([statement for statement in second.statements
+                          if 'FROM admin' in statement])
+
+    def test_password_change_signs_out(self):
+        """Sessions started before a password change are no longer accepted."""
+
+        admin = self.login_admin()
+        self.client.get('/meal_list')
+
+        admin.set_password('changed')
+        db.session.commit()
+
+        self.assertEqual(302, self.client.get('/meal_list').status_code)
+
+    def test_legacy_session_id(self):
+        """Sessions holding a bare admin id are upgraded, then checked like any other."""
+
+        admin = self.login_admin()
+
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+
+        self.assertEqual(200, self.client.get('/meal_list').status_code)
+
+        with self.client.session_transaction() as session:
+            self.assertEqual(admin.get_id(), session['_user_id'])
+
+        admin.set_password('changed')
+        db.session.commit()
+
+        self.assertEqual(302, self.client.get('/meal_list').status_code)
+
+    def test_legacy_session_id_refused(self):
+        """Bare admin ids are refused once legacy session ids are turned off."""
+
+        admin = self.login_admin()
+        self.app.config['ACCEPT_LEGACY_SESSION_IDS'] = False
+
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+
+        self.assertEqual(302, self.client.get('/meal_list').status_code)
+
+    def test_shared_invalidation(self):
+        """Invalidating in one process's cache reaches others sharing a directory."""
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        admin = Admin(first_name='Test', last_name='Admin', email='admin@example.com')
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.commit()
+
+        first = IdentityCache(60, directory=directory)
+        second = IdentityCache(60, directory=directory)
+        second.put(AdminIdentity(admin))
+        self.assertIsNotNone(second.get(admin.id))
+
+        time.sleep(0.01)
+        first.invalidate(admin.id)
+
+        self.assertIsNone(second.get(admin.id))
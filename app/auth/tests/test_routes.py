@@ -0,0 +1,123 @@
+"""Tests for authentication routes."""
+
+import threading
+import unittest
+from app import db
+from app.auth.models import Admin
+from app.auth.verification import password_verifier
+from app.tests.test_utils import RouteTestConfig, RouteTestMixin
+
+class TestLogin(RouteTestMixin, unittest.TestCase):
+    """Tests for signing in."""
+
+    def setUp(self):
+        """Create an admin with a cheap password hash."""
+
+        super().setUp()
+
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+
+        admin = Admin(first_name='Paul', last_name='Revere', email='paul@rider.com')
+        admin.set_password('password', method='pbkdf2:sha256:1000')
+        db.session.add(admin)
+        db.session.commit()
+
+        self.admin_id = admin.id
+
+    def login(self, password='password', email='paul@rider.com'):
+        """Submit the login form."""
+
+        return self.client.post('/auth/login', data={'email': email, 'password': password})
+
+    def test_login(self):
+        """A correct password signs the admin in."""
+
+        result = self.login()
+
+        self.assertEqual(302, result.status_code)
+        with self.client.session_transaction() as session:
+            self.assertEqual(Admin.query.get(self.admin_id).get_id(), session['_user_id'])
+
+    def test_throttle(self):
+        """Repeated failures for an email are refused, but the right password still works."""
+
+        limit = self.app.config['LOGIN_MAX_FAILURES_PER_EMAIL']
+
+        for _ in range(limit):
+            self.assertEqual(302, self.login('wrong').status_code)
+
+        self.assertEqual(429, self.login('wrong').status_code)
+        self.assertEqual(302, self.login(email='other@rider.com').status_code)
+
+        self.assertEqual(302, self.login().status_code)
+        with self.client.session_transaction() as session:
+            self.assertEqual(Admin.query.get(self.admin_id).get_id(), session['_user_id'])
+
+    def test_throttle_address(self):
+        """Repeated failures from an address are refused outright."""
+
+        self.app.config['LOGIN_MAX_FAILURES_PER_IP'] = 2
+
+        for i in range(2):
+            self.login('wrong', email=f'person{i}@rider.com')
+
+        self.assertEqual(429, self.login().status_code)
+
+    def test_rehash(self):
+        """The stored hash is upgraded when the configured method changes."""
+
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+        self.login()
+
+        admin = Admin.query.get(self.admin_id)
+        self.assertTrue(admin.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertTrue(admin.check_password('password'))
+
+    def test_verifier_busy(self):
+        """Sign-in fails fast when the hashing pool is full."""
+
+        self.app.config.update(LOGIN_VERIFY_CONCURRENCY=1, LOGIN_VERIFY_QUEUE=0,
+                               LOGIN_VERIFY_WAIT=0.01)
+        verifier = password_verifier()
+
+        release = threading.Event()
+        blocker = threading.Thread(target=verifier.run, args=(release.wait,))
+        blocker.start()
+
+        try:
+            self.assertEqual(503, self.login().status_code)
+        finally:
+            release.set()
+            blocker.join()
+
+        self.assertEqual(302, self.login().status_code)
+
+class ProxyTestConfig(RouteTestConfig):
+    """Route test config behind one trusted proxy."""
+
+    TRUSTED_PROXIES = 1
+    LOGIN_MAX_FAILURES_PER_IP = 2
+
+class TestLoginBehindProxy(RouteTestMixin, unittest.TestCase):
+    """Tests for throttling sign-ins by the address a proxy forwarded."""
+
+    config = ProxyTestConfig
+
+    def login(self, client_address):
+        """Submit a failing login form through the proxy for a client address."""
+
+        return self.client.post(
+            '/auth/login',
+            data={'email': f'{client_address}@rider.com', 'password': 'wrong'},
+            headers={'X-Forwarded-For': client_address}
+        )
+
+    def test_forwarded_address(self):
+        """Each forwarded client address has its own failure count."""
+
+        for _ in range(2):
+            self.assertEqual(302, self.login('10.0.0.1').status_code)
+
+        self.assertEqual(429, self.login('10.0.0.1').status_code)
+        self.assertEqual(302, self.login('10.0.0.2').status_code)
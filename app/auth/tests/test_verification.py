@@ -0,0 +1,38 @@
+"""Tests for sign-in attempt throttling."""
+
+import unittest
+from app.auth.verification import AttemptThrottle
+
+class TestAttemptThrottle(unittest.TestCase):
+    """Failures are counted per key within fixed windows."""
+
+    def test_window(self):
+        """Failures block a key until the window rolls over."""
+
+        throttle = AttemptThrottle(window=60)
+
+        for _ in range(3):
+            throttle.fail('email:a@example.com', now=10)
+
+        self.assertTrue(throttle.blocked('email:a@example.com', 3, now=59))
+        self.assertFalse(throttle.blocked('email:b@example.com', 3, now=59))
+        self.assertFalse(throttle.blocked('email:a@example.com', 3, now=61))
+
+        throttle.fail('email:a@example.com', now=61)
+        self.assertEqual(1, throttle.failures('email:a@example.com', now=61))
+
+        throttle.reset('email:a@example.com')
+        self.assertEqual(0, throttle.failures('email:a@example.com', now=61))
+
+    def test_prune(self):
+        """A full table keeps the keys with the most failures."""
+
+        throttle = AttemptThrottle(window=60, max_keys=4)
+
+        for _ in range(5):
+            throttle.fail('ip:attacker', now=0)
+        for i in range(10):
+            throttle.fail(f'email:{i}@example.com', now=0)
+
+        self.assertEqual(5, throttle.failures('ip:attacker', now=0))
+        self.assertLessEqual(len(throttle._failures), 4) #pylint: disable=protected-access
@@ -0,0 +1,162 @@
+"""Bounded password hashing and sign-in attempt throttling.
+
+Password hashes are deliberately slow to compute. Hashing runs on a small
+per-process thread pool, and at most LOGIN_VERIFY_CONCURRENCY hashes run at once
+with up to LOGIN_VERIFY_QUEUE more waiting. When the pool is saturated, sign-in
+attempts are turned away quickly instead of occupying every worker and stalling
+the public pages.
+
+Failed attempts are counted per client address and per email address in
+fixed windows of LOGIN_THROTTLE_WINDOW seconds. Attempts over the limit are
+refused before any hashing is done.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+class VerifierBusy(Exception):
+    """Raised when the password hashing pool has no room for another task."""
+
+class PasswordVerifier():
+    """Runs password hashing on a bounded thread pool.
+
+    wait is how long (seconds) a caller waits for room in the pool before
+    VerifierBusy is raised.
+    """
+
+    def __init__(self, concurrency=2, queue=8, wait=2.0):
+        self.concurrency = concurrency
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(concurrency + queue)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+
+    def _get_executor(self):
+        """Get this process's thread pool; threads don't survive fork."""
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix='password-verifier'
+                )
+
+            return self._executor
+
+    def run(self, func, *args):
+        """Run func(*args) on the pool and return its result.
+
+        The pool bounds how many hashes run at once, not how many requests are
+        held up: the calling thread blocks while waiting for room (up to wait
+        seconds) and while func runs.
+        """
+
+        if not self._slots.acquire(timeout=self.wait):
+            raise VerifierBusy()
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+
+        return future.result()
+
+class AttemptThrottle():
+    """Counts failed attempts per key in fixed time windows.
+
+    Keys are stored as 8-byte digests alongside a (window start, count) pair.
+    Once more than max_keys are tracked, expired entries are dropped, then the
+    entries with the fewest failures.
+    """
+
+    def __init__(self, window=300, max_keys=10000):
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._failures = {}
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+
+    def _window_start(self, now):
+        return int(now // self.window)
+
+    def failures(self, key, now=None):
+        """Get the number of failures for key in the current window."""
+
+        window = self._window_start(now if now is not None else time.time())
+
+        with self._lock:
+            start, count = self._failures.get(self._digest(key), (window, 0))
+
+        return count if start == window else 0
+
+    def blocked(self, key, limit, now=None):
+        """Check whether key has reached limit failures in the current window."""
+
+        return self.failures(key, now) >= limit
+
+    def fail(self, key, now=None):
+        """Record a failed attempt for key."""
+
+        window = self._window_start(now if now is not None else time.time())
+        digest = self._digest(key)
+
+        with self._lock:
+            start, count = self._failures.get(digest, (window, 0))
+            self._failures[digest] = (window, count + 1 if start == window else 1)
+
+            if len(self._failures) > self.max_keys:
+                self._prune(window)
+
+    def reset(self, key):
+        """Forget the failures recorded for key."""
+
+        with self._lock:
+            self._failures.pop(self._digest(key), None)
+
+    def _prune(self, window):
+        """Make room in the table. Caller holds the lock."""
+
+        self._failures = {
+            digest: entry for digest, entry in self._failures.items() if entry[0] == window
+        }
+
+        if len(self._failures) > self.max_keys:
+            kept = sorted(self._failures.items(), key=lambda item: item[1][1], reverse=True)
+            self._failures = dict(kept[:self.max_keys // 2])
+
+def password_verifier():
+    """Get the current app's password verifier, creating it on first use."""
+
+    verifier = current_app.extensions.get('password_verifier')
+
+    if verifier is None:
+        verifier = PasswordVerifier(
+            concurrency=current_app.config['LOGIN_VERIFY_CONCURRENCY'],
+            queue=current_app.config['LOGIN_VERIFY_QUEUE'],
+            wait=current_app.config['LOGIN_VERIFY_WAIT']
+        )
+        current_app.extensions['password_verifier'] = verifier
+
+    return verifier
+
+def login_throttle():
+    """Get the current app's sign-in attempt throttle, creating it on first use."""
+
+    throttle = current_app.extensions.get('login_throttle')
+
+    if throttle is None:
+        throttle = AttemptThrottle(window=current_app.config['LOGIN_THROTTLE_WINDOW'])
+        current_app.extensions['login_throttle'] = throttle
+
+    return throttle
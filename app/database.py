@@ -0,0 +1,117 @@
+"""Database connection setup.
+
+For server databases such as Postgres, the engine gets a TimedQueuePool sized
+by the DB_POOL_* settings, with pre-ping (so connections dropped while idle are
+replaced instead of failing the next request), recycling, and an optional
+per-statement timeout. Time spent waiting for a pooled connection is recorded
+in the request instrumentation.
+
+With SQLITE_PRODUCTION enabled, every new SQLite connection is configured for
+several worker processes sharing one database file: WAL journaling (so readers
+don't block the writer and vice versa), synchronous=NORMAL (safe with WAL, and
+avoids an fsync per commit), a busy timeout (writers wait for the lock instead
+of failing with "database is locked"), and a larger page cache and mmap window.
+"""
+
+import time
+from sqlalchemy import Column, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+from app import db
+from app.instrumentation import record_pool_wait
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            record_pool_wait(time.perf_counter() - start)
+
+def pool_options(config):
+    """Get engine options for a connection pool to a server database.
+
+    Returns no options for SQLite, which keeps the pools SQLAlchemy picks for it.
+    """
+
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+
+    if url.get_backend_name() == 'sqlite':
+        return {}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING']
+    }
+
+    if config['DB_STATEMENT_TIMEOUT_MS'] and url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {
+            'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        }
+
+    return options
+
+def sqlite_pragmas(config):
+    """Get the (name, value) pragmas to run on each connection for a config."""
+
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        # Negative sizes are in KiB rather than pages
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE'])
+    ]
+
+def is_sqlite_file(uri):
+    """Check whether a database URI names an SQLite database file."""
+
+    url = make_url(uri)
+
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def migration_filter(dialect_name):
+    """Get an Alembic include_object hook for comparing models to a database.
+
+    SQLite doesn't reflect indexes on expressions (such as lower(email)), so on
+    SQLite they're left out of the comparison rather than always looking new.
+    """
+
+    #pylint: disable=unused-argument,too-many-arguments
+    def include_object(object_, name, type_, reflected, compare_to):
+        if type_ == 'index' and not reflected and dialect_name == 'sqlite':
+            return all(isinstance(expression, Column) for expression in object_.expressions)
+
+        return True
+
+    return include_object
+
+def init_app(app):
+    """Configure the app's engine: pool options, and SQLite pragmas if enabled.
+
+    Explicit SQLALCHEMY_ENGINE_OPTIONS take priority over the DB_POOL_* settings.
+    """
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        pool_options(app.config), **app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    )
+
+    if not app.config['SQLITE_PRODUCTION'] or \
+            not is_sqlite_file(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+
+    def set_pragmas(dbapi_connection, connection_record): #pylint: disable=unused-argument
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    event.listen(db.get_engine(app), 'connect', set_pragmas)
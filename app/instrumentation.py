@@ -0,0 +1,173 @@
+"""Per-request SQL instrumentation.
+
+Counts the statements each request runs, the time spent in the database, and
+the time spent waiting for a pooled connection, reporting them in a
+Server-Timing response header and a structured log line. Routes can declare a
+query budget; exceeding it logs a warning, or fails outright when
+ENFORCE_QUERY_BUDGETS is set (as it is in tests). Streamed responses are
+checked once their body has been sent, so statements run while streaming count
+towards the budget.
+"""
+
+import functools
+import json
+import logging
+import time
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Name of the stderr handler the request log is given
+LOG_HANDLER_NAME = 'request-log'
+
+class RequestStats():
+    """Database statistics for a single request."""
+
+    __slots__ = ('start', 'statements', 'db_seconds', 'pool_checkouts', 'pool_wait_seconds',
+                 'budget')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.pool_checkouts = 0
+        self.pool_wait_seconds = 0.0
+        self.budget = None
+
+    def server_timing(self):
+        """Format the stats as a Server-Timing header value."""
+
+        app_ms = (time.perf_counter() - self.start) * 1000
+
+        timing = f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} queries", '
+
+        if self.pool_checkouts:
+            timing += f'pool;dur={self.pool_wait_seconds * 1000:.2f};' \
+                f'desc="{self.pool_checkouts} checkouts", '
+
+        return timing + f'app;dur={app_ms:.2f}'
+
+def current_stats():
+    """Get the stats for the current request, or None outside an instrumented request."""
+
+    return g.get('request_stats') if has_app_context() else None
+
+# Engine event listeners, registered with named=True so they only take what they use
+def _before_cursor_execute(context, **_):
+    context.query_start = time.perf_counter()
+
+def _after_cursor_execute(context, **_):
+    elapsed = time.perf_counter() - context.query_start
+
+    stats = current_stats()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+def record_pool_wait(seconds):
+    """Record time spent waiting to check a connection out of the pool."""
+
+    stats = current_stats()
+    if stats is not None:
+        stats.pool_checkouts += 1
+        stats.pool_wait_seconds += seconds
+
+def _start_request():
+    g.request_stats = RequestStats()
+
+def _finish_request(response):
+    stats = current_stats()
+
+    if stats is None:
+        return response
+
+    if current_app.config['SERVER_TIMING_HEADER']:
+        response.headers['Server-Timing'] = stats.server_timing()
+
+    if stats.budget is not None:
+        enforce = current_app.config['ENFORCE_QUERY_BUDGETS']
+
+        if response.is_streamed:
+            response.response = _budgeted_body(response.response, stats, request.endpoint, enforce)
+        else:
+            _check_budget(stats, request.endpoint, enforce)
+
+    return response
+
+def _check_budget(stats, endpoint, enforce):
+    if stats.statements > stats.budget:
+        message = f'{endpoint} ran {stats.statements} queries (budget {stats.budget})'
+
+        if enforce:
+            raise AssertionError(message)
+
+        logger.warning(message)
+
+def _budgeted_body(body, stats, endpoint, enforce):
+    """Stream a response body, then check the statements run while producing it."""
+
+    try:
+        yield from body
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+    _check_budget(stats, endpoint, enforce)
+
+def _log_request(exc): #pylint: disable=unused-argument
+    stats = g.pop('request_stats', None)
+
+    # Logged at teardown so statements run while streaming a response are included
+    if stats is not None:
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'duration_ms': round((time.perf_counter() - stats.start) * 1000, 2),
+            'db_statements': stats.statements,
+            'db_ms': round(stats.db_seconds * 1000, 2),
+            'pool_wait_ms': round(stats.pool_wait_seconds * 1000, 2)
+        }))
+
+def query_budget(budget):
+    """Declare the most statements a route should run per request."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            stats = current_stats()
+            if stats is not None:
+                stats.budget = budget
+
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def init_app(app):
+    """Install the instrumentation hooks if SQL_INSTRUMENTATION is enabled."""
+
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+
+    # Nothing else configures logging (and the default level is WARNING), so the
+    # request log gets a handler of its own
+    logger.setLevel(app.config['REQUEST_LOG_LEVEL'])
+    if not any(handler.name == LOG_HANDLER_NAME for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.set_name(LOG_HANDLER_NAME)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+    # Engine events are process-wide; only requests of instrumented apps record stats
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute, named=True)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute, named=True)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_log_request)
@@ -1,6 +1,7 @@
 from flask import Blueprint
 
-bp = Blueprint('main', __name__, template_folder="templates")
+bp = Blueprint('main', __name__, template_folder="templates", cli_group=None)
 
 from app.main import routes
-from app.main import models
\ No newline at end of file
+from app.main import models
+from app.main import commands
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""Moving past meals out of the live tables and bringing them back.
+
+Archiving a meal stores the meal, its drink and food lists, and its responses
+as gzip-compressed JSON in a MealArchive row, then deletes the live rows with
+bulk DELETE statements. Meals are archived a batch at a time, one transaction
+per batch, so a large backlog never holds a long write lock.
+
+Restoring recreates the meal under a new id. Menu items deleted since the meal
+was archived are dropped from its menu, and responses that chose them keep the
+item's label as their "other" value. The meal rejoins its template's series
+unless the template is gone or has another meal on that date.
+"""
+
+import gzip
+import json
+from datetime import date, datetime
+from app import db
+from app.main.models import Meal, MealType, MealArchive, MealTemplate, Response, ChoiceCount,\
+    Food, Side, Drink, meal_drink, meal_food, sync_association
+from app.main.orders import insert_responses
+
+# Bumped if the layout of the archived JSON changes
+ARCHIVE_VERSION = 1
+
+# Archived response columns (the id and meal_id aren't kept)
+RESPONSE_COLUMNS = [
+    'first_name',
+    'last_name',
+    'email',
+    'food_id',
+    'side_id',
+    'drink_id',
+    'food_other',
+    'side_other',
+    'drink_other',
+    'note',
+    'timestamp'
+]
+
+# Menu item choices on a response: (id column, "other" column, archived label, model)
+CHOICES = [
+    ('food_id', 'food_other', 'food_label', Food),
+    ('side_id', 'side_other', 'side_label', Side),
+    ('drink_id', 'drink_other', 'drink_label', Drink)
+]
+
+def _encode(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    raise TypeError(f'Cannot archive {value!r}')
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+def pack(payload):
+    """Compress an archive payload."""
+
+    return gzip.compress(json.dumps(payload, default=_encode).encode('utf-8'))
+
+def unpack(data):
+    """Decompress an archive payload."""
+
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+def archivable_meals(before, now=None):
+    """Get a query of the ids of meals dated before a day whose registration has closed."""
+
+    now = now or datetime.utcnow()
+
+    return db.session.query(Meal.id).filter(
+        Meal.date < before,
+        db.or_(Meal.registration_close.is_(None), Meal.registration_close <= now)
+    ).order_by(Meal.date, Meal.id)
+
+def archive_meals(before, batch_size=50, now=None):
+    """Archive every meal dated before a day whose registration has closed.
+
+    Commits after each batch of batch_size meals. Returns the number of meals
+    archived.
+    """
+
+    archived = 0
+
+    while True:
+        meal_ids = [row[0] for row in archivable_meals(before, now).limit(batch_size)]
+
+        if not meal_ids:
+            return archived
+
+        archive_batch(meal_ids)
+        db.session.commit()
+
+        archived += len(meal_ids)
+
+def archive_batch(meal_ids):
+    """Archive a batch of meals with a fixed number of statements.
+
+    The meals' rows are read with one query per table, written as MealArchive
+    rows, and deleted with one DELETE per table. Doesn't commit.
+    """
+
+    payloads = {}
+
+    for row in db.session.query(
+            Meal.id,
+            Meal.meal_type_id,
+            MealType.name,
+            Meal.restaurant,
+            Meal.date,
+            Meal.registration_open,
+            Meal.registration_close,
+            Meal.template_id
+        ).outerjoin(MealType, Meal.meal_type_id == MealType.id)\
+            .filter(Meal.id.in_(meal_ids)):
+        payloads[row.id] = {
+            'version': ARCHIVE_VERSION,
+            'meal': {
+                'id': row.id,
+                'meal_type_id': row.meal_type_id,
+                'meal_type': row.name,
+                'restaurant': row.restaurant,
+                'date': row.date,
+                'registration_open': row.registration_open,
+                'registration_close': row.registration_close,
+                'template_id': row.template_id
+            },
+            'drinks': [],
+            'foods': [],
+            'responses': []
+        }
+
+    for key, table in [('drinks', meal_drink), ('foods', meal_food)]:
+        owner_column, target_column = table.c
+        for owner, target in db.session.query(owner_column, target_column)\
+                .filter(owner_column.in_(meal_ids)):
+            payloads[owner][key].append(target)
+
+    table = Response.__table__
+    query = db.session.query(
+        table.c.meal_id,
+        *(table.c[column] for column in RESPONSE_COLUMNS),
+        *(model.label.label(label_column) for _, _, label_column, model in CHOICES)
+    ).outerjoin(Food, table.c.food_id == Food.id)\
+        .outerjoin(Side, table.c.side_id == Side.id)\
+        .outerjoin(Drink, table.c.drink_id == Drink.id)\
+        .filter(table.c.meal_id.in_(meal_ids))\
+        .order_by(table.c.id)
+
+    for row in query:
+        response = dict(row._mapping) #pylint: disable=protected-access
+        payloads[response.pop('meal_id')]['responses'].append(response)
+
+    archived_at = datetime.utcnow()
+    db.session.execute(MealArchive.__table__.insert(), [
+        {
+            'meal_id': meal_id,
+            'meal_type_name': payload['meal']['meal_type'],
+            'restaurant': payload['meal']['restaurant'],
+            'date': payload['meal']['date'],
+            'response_count': len(payload['responses']),
+            'archived_at': archived_at,
+            'data': pack(payload)
+        } for meal_id, payload in payloads.items()
+    ])
+
+    meal_ids = list(payloads)
+    db.session.execute(table.delete().where(table.c.meal_id.in_(meal_ids)))
+    db.session.execute(meal_drink.delete().where(meal_drink.c.meal_id.in_(meal_ids)))
+    db.session.execute(meal_food.delete().where(meal_food.c.meal_id.in_(meal_ids)))
+    db.session.execute(
+        ChoiceCount.__table__.delete().where(ChoiceCount.__table__.c.meal_id.in_(meal_ids))
+    )
+    db.session.execute(Meal.__table__.delete().where(Meal.id.in_(meal_ids)))
+
+def _restore_meal_type(meal_type_id, name):
+    """Find the meal type an archived meal had, recreating it if it's gone."""
+
+    if name is None:
+        return None
+
+    meal_type = MealType.query.get(meal_type_id) if meal_type_id else None
+
+    if meal_type is None or meal_type.name != name:
+        meal_type = MealType.query.filter_by(name=name).first() or MealType(name=name)
+
+    return meal_type
+
+def _restore_template_id(template_id, meal_date):
+    """Find the template an archived meal was generated from, if it can rejoin its series."""
+
+    if template_id is None or MealTemplate.query.get(template_id) is None:
+        return None
+
+    taken = db.session.query(Meal.id)\
+        .filter(Meal.template_id == template_id, Meal.date == meal_date).first()
+
+    return None if taken else template_id
+
+def restore_archive(archive):
+    """Move an archived meal back into the live tables under a new id.
+
+    Returns the restored Meal. Doesn't commit.
+    """
+
+    payload = unpack(archive.data)
+    archived = payload['meal']
+
+    meal_date = date.fromisoformat(archived['date'])
+
+    # Archives from before templates have no template_id
+    meal = Meal(
+        meal_type=_restore_meal_type(archived['meal_type_id'], archived['meal_type']),
+        template_id=_restore_template_id(archived.get('template_id'), meal_date),
+        restaurant=archived['restaurant'],
+        date=meal_date,
+        registration_open=_datetime(archived['registration_open']),
+        registration_close=_datetime(archived['registration_close'])
+    )
+    db.session.add(meal)
+    db.session.flush()
+
+    sync_association(meal_drink, meal.id, Drink, payload['drinks'])
+    sync_association(meal_food, meal.id, Food, payload['foods'])
+
+    responses = payload['responses']
+
+    for id_column, other_column, label_column, model in CHOICES:
+        requested = {row[id_column] for row in responses if row[id_column] is not None}
+        existing = set()
+        if requested:
+            existing = {row[0] for row in db.session.query(model.id)\
+                .filter(model.id.in_(requested))}
+
+        for row in responses:
+            label = row.pop(label_column)
+            if row[id_column] is not None and row[id_column] not in existing:
+                row[id_column] = None
+                row[other_column] = row[other_column] or label
+
+    for row in responses:
+        row['meal_id'] = meal.id
+        row['timestamp'] = _datetime(row['timestamp'])
+
+    if responses:
+        insert_responses(responses)
+
+    db.session.delete(archive)
+
+    return meal
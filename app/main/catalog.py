@@ -0,0 +1,372 @@
+"""Importing foods, sides, and drinks in bulk from a CSV or JSON catalog.
+
+A catalog lists items by label (matched case-insensitively against existing
+items of the same kind), with an optional description and, for foods, an
+optional list of side labels. Items that don't exist are created, items whose
+label casing or description differ are updated, and a food that lists sides
+has its side links set to exactly those sides. Nothing is ever deleted.
+
+JSON catalogs look like:
+
+    {"foods": [{"label": "Hamburger", "description": "...", "sides": ["Fries"]}],
+     "sides": [{"label": "Fries"}],
+     "drinks": [{"label": "Tea"}]}
+
+CSV catalogs have a header row with type (food, side, or drink), label,
+description, and sides (side labels separated by semicolons) columns.
+
+Importing is planned first, with one query per item table and a few for the
+food-side links, so a dry run can show the differences without writing. Then
+the plan is applied with bulk statements in the caller's transaction.
+"""
+
+import csv
+import io
+import json
+from app import db
+from app.main.models import Food, Side, Drink, Meal, meal_food, meal_drink, food_side,\
+    sync_associations
+
+# Item models by catalog type, in the order they're reported
+KINDS = {
+    'food': Food,
+    'side': Side,
+    'drink': Drink
+}
+
+# Separator between side labels in a CSV catalog's sides column
+SIDE_SEPARATOR = ';'
+
+# Most ids in one IN list; keeps statements under SQLite's historical limit of
+# 999 bound parameters
+IN_CHUNK = 500
+
+# Foods whose side links are synced per sync_associations() call
+ASSOCIATION_OWNERS = 400
+
+# Longest label and description the item tables hold
+LABEL_LENGTH = Food.label.type.length
+DESCRIPTION_LENGTH = Food.description.type.length
+
+class CatalogPlan():
+    """The changes an import would make.
+
+    created and updated map each type to lists of labels. links maps the
+    labels of foods whose side links change to (added, removed) side labels.
+    errors lists problems that keep the catalog from being imported. inserts,
+    updates, and sides hold the rows apply_import() writes.
+    """
+
+    def __init__(self):
+        self.created = {kind: [] for kind in KINDS}
+        self.updated = {kind: [] for kind in KINDS}
+        self.unchanged = {kind: 0 for kind in KINDS}
+        self.links = {}
+        self.errors = []
+        self.inserts = {kind: [] for kind in KINDS}
+        self.updates = {kind: [] for kind in KINDS}
+        # Lowercased side labels wanted for each lowercased food label
+        self.sides = {}
+
+    @property
+    def changed(self):
+        """Check whether applying the plan would change anything."""
+
+        return any(self.created.values()) or any(self.updated.values()) or bool(self.links)
+
+    def summary(self):
+        """Describe the plan as a list of lines."""
+
+        lines = []
+
+        for kind in KINDS:
+            lines.append(
+                f'{kind.capitalize()}s: {len(self.created[kind])} new, '
+                f'{len(self.updated[kind])} updated, {self.unchanged[kind]} unchanged'
+            )
+
+        lines.append(f'Foods with changed sides: {len(self.links)}')
+
+        return lines
+
+    def details(self):
+        """Describe every change as a list of lines."""
+
+        lines = []
+
+        for kind in KINDS:
+            lines.extend(f'+ {kind} {label}' for label in self.created[kind])
+            lines.extend(f'~ {kind} {label}' for label in self.updated[kind])
+
+        for label, (added, removed) in self.links.items():
+            changes = [f'+{side}' for side in added] + [f'-{side}' for side in removed]
+            lines.append(f"~ food {label} sides: {', '.join(changes)}")
+
+        return lines
+
+def _key(label):
+    return label.strip().lower()
+
+def _chunks(items, size=IN_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def parse_catalog(text, file_format):
+    """Get a list of catalog records from CSV or JSON text.
+
+    Records are dicts with type, label, description, and sides keys; sides is
+    a list of labels, or None if the catalog doesn't give one. Raises ValueError if the text
+    can't be read as a catalog.
+    """
+
+    if file_format == 'json':
+        data = json.loads(text)
+
+        if isinstance(data, dict):
+            data = [
+                dict(item, type=kind) if isinstance(item, dict) else item \
+                    for kind in KINDS for item in data.get(f'{kind}s', [])
+            ]
+
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON object of foods, sides, and drinks.')
+
+        records = []
+        for item in data:
+            if not isinstance(item, dict):
+                raise ValueError('Expected each catalog item to be an object.')
+            sides = item.get('sides')
+            if isinstance(sides, str):
+                sides = sides.split(SIDE_SEPARATOR)
+            records.append(dict(item, sides=sides))
+
+        return records
+
+    if file_format == 'csv':
+        records = []
+
+        for row in csv.DictReader(io.StringIO(text)):
+            sides = row.get('sides')
+            records.append(dict(
+                row,
+                sides=sides.split(SIDE_SEPARATOR) if sides and sides.strip() else None
+            ))
+
+        return records
+
+    raise ValueError(f'Unknown catalog format "{file_format}".')
+
+def validate_catalog(records):
+    """Check catalog records and group them by type.
+
+    Returns a tuple of (catalog, errors). catalog maps each type to a dict of
+    records keyed by lowercased label. errors is a list of
+    {'row': index, 'errors': [messages]} dicts, like bulk responses.
+    """
+
+    catalog = {kind: {} for kind in KINDS}
+    errors = []
+
+    for index, record in enumerate(records):
+        messages = []
+        kind = str(record.get('type') or '').strip().lower()
+        label = str(record.get('label') or '').strip()
+        description = str(record.get('description') or '').strip() or None
+        sides = record.get('sides')
+
+        if kind not in KINDS:
+            messages.append('Type must be food, side, or drink.')
+        if not label:
+            messages.append('A label is required.')
+        elif len(label) > LABEL_LENGTH:
+            messages.append(f'Labels can be at most {LABEL_LENGTH} characters.')
+        if description and len(description) > DESCRIPTION_LENGTH:
+            messages.append(f'Descriptions can be at most {DESCRIPTION_LENGTH} characters.')
+        if sides is not None and kind != 'food':
+            messages.append('Only foods can list sides.')
+        if sides is not None and not isinstance(sides, list):
+            messages.append('Sides must be a list of side labels.')
+
+        if kind in KINDS and label and _key(label) in catalog[kind]:
+            messages.append(f'This {kind} is listed more than once.')
+
+        if messages:
+            errors.append({'row': index, 'errors': messages})
+            continue
+
+        catalog[kind][_key(label)] = {
+            'label': label,
+            'description': description,
+            'sides': None if sides is None else \
+                [str(side).strip() for side in sides if str(side).strip()]
+        }
+
+    return catalog, errors
+
+def _existing(model):
+    """Get {lowercased label: (id, label, description)} for every item of a model.
+
+    If several items share a label, the oldest is used.
+    """
+
+    existing = {}
+    for row in db.session.query(model.id, model.label, model.description).order_by(model.id):
+        existing.setdefault(_key(row.label), (row.id, row.label, row.description))
+
+    return existing
+
+def plan_import(catalog):
+    """Work out what importing a validated catalog would change.
+
+    Reads each item table and the food-side links once. Returns a CatalogPlan.
+    """
+
+    plan = CatalogPlan()
+    existing = {kind: _existing(model) for kind, model in KINDS.items()}
+
+    for kind, records in catalog.items():
+        for key, record in records.items():
+            current = existing[kind].get(key)
+
+            if current is None:
+                plan.created[kind].append(record['label'])
+                plan.inserts[kind].append({
+                    'label': record['label'],
+                    'description': record['description']
+                })
+            elif (current[1], current[2] or None) != (record['label'], record['description']):
+                plan.updated[kind].append(record['label'])
+                plan.updates[kind].append({
+                    'item_id': current[0],
+                    'item_label': record['label'],
+                    'item_description': record['description']
+                })
+            else:
+                plan.unchanged[kind] += 1
+
+    # Side labels a food can use: existing sides and sides in this catalog
+    side_labels = {key: current[1] for key, current in existing['side'].items()}
+    side_labels.update({key: record['label'] for key, record in catalog['side'].items()})
+
+    side_names = {current[0]: current[1] for current in existing['side'].values()}
+    links = {}
+    food_ids = [current[0] for current in existing['food'].values()]
+    for chunk in _chunks(food_ids):
+        for food_id, side_id in db.session.query(food_side.c.food_id, food_side.c.side_id)\
+                .filter(food_side.c.food_id.in_(chunk)):
+            if side_id in side_names:
+                links.setdefault(food_id, set()).add(_key(side_names[side_id]))
+
+    for key, record in catalog['food'].items():
+        if record['sides'] is None:
+            continue
+
+        wanted = set()
+        for side in record['sides']:
+            if _key(side) in side_labels:
+                wanted.add(_key(side))
+            else:
+                plan.errors.append(f"Food \"{record['label']}\" lists an unknown side \"{side}\".")
+
+        current = existing['food'].get(key)
+        linked = links.get(current[0], set()) if current else set()
+
+        if wanted != linked:
+            plan.links[record['label']] = (
+                sorted(side_labels[side] for side in wanted - linked),
+                sorted(existing['side'][side][1] for side in linked - wanted)
+            )
+            plan.sides[key] = wanted
+
+    return plan
+
+def apply_import(plan):
+    """Write a plan's changes with bulk statements. Doesn't commit.
+
+    New items are inserted with one statement per type and changed items
+    updated with one statement per type. Side links are synced in bulk, and
+    the versions of changed foods, and of meals showing changed items, are
+    bumped so cached pages and menus are refreshed.
+    """
+
+    changed = {kind: set() for kind in KINDS}
+
+    for kind, model in KINDS.items():
+        table = model.__table__
+
+        if plan.inserts[kind]:
+            db.session.execute(table.insert(), plan.inserts[kind])
+
+        if plan.updates[kind]:
+            db.session.execute(
+                table.update()\
+                    .where(table.c.id == db.bindparam('item_id'))\
+                    .values(
+                        label=db.bindparam('item_label'),
+                        description=db.bindparam('item_description')
+                    ),
+                plan.updates[kind]
+            )
+            changed[kind].update(row['item_id'] for row in plan.updates[kind])
+
+    if plan.sides:
+        foods = _existing(Food)
+        sides = _existing(Side)
+
+        wanted = {
+            foods[key][0]: {sides[side][0] for side in side_keys} \
+                for key, side_keys in plan.sides.items()
+        }
+        for chunk in _chunks(wanted, size=ASSOCIATION_OWNERS):
+            sync_associations(food_side, Side, {food_id: wanted[food_id] for food_id in chunk})
+
+        changed['food'].update(wanted)
+
+    _bump_versions(changed)
+
+def _bump_versions(changed):
+    """Mark changed foods, foods offering changed sides, and meals showing any of them."""
+
+    foods = Food.__table__
+
+    for chunk in _chunks(changed['food']):
+        db.session.execute(
+            foods.update().where(foods.c.id.in_(chunk)).values(version=foods.c.version + 1)
+        )
+        Meal.bump_versions(
+            db.session.query(meal_food.c.meal_id).filter(meal_food.c.food_id.in_(chunk))
+        )
+
+    for chunk in _chunks(changed['side']):
+        offering = db.session.query(food_side.c.food_id).filter(food_side.c.side_id.in_(chunk))
+        db.session.execute(
+            foods.update().where(foods.c.id.in_(offering))\
+                .values(version=foods.c.version + 1)
+        )
+        Meal.bump_versions(
+            db.session.query(meal_food.c.meal_id)\
+                .join(food_side, food_side.c.food_id == meal_food.c.food_id)\
+                .filter(food_side.c.side_id.in_(chunk))
+        )
+
+    for chunk in _chunks(changed['drink']):
+        Meal.bump_versions(
+            db.session.query(meal_drink.c.meal_id).filter(meal_drink.c.drink_id.in_(chunk))
+        )
+
+def import_catalog(records, dry_run=False):
+    """Validate, plan, and (unless dry_run or there are errors) apply a catalog.
+
+    Returns a tuple of (plan, errors), where errors are the per-row errors from
+    validate_catalog(). Nothing is written if there are any errors. Doesn't
+    commit.
+    """
+
+    catalog, errors = validate_catalog(records)
+    plan = plan_import(catalog)
+
+    if not dry_run and not errors and not plan.errors:
+        apply_import(plan)
+
+    return plan, errors
@@ -0,0 +1,132 @@
+"""Command line maintenance tasks, run with the flask command."""
+
+import csv
+from datetime import date, timedelta
+import click
+from flask import current_app
+from app import db
+from app.main import bp
+from app.main.archive import archivable_meals, archive_meals, restore_archive
+from app.main.catalog import parse_catalog, import_catalog
+from app.main.counters import recount
+from app.main.models import MealArchive, MealTemplate
+from app.main.series import generate_series, next_series_start
+
+@bp.cli.command('archive-meals')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Archive meals dated before this day (YYYY-MM-DD).')
+@click.option('--days', type=int,
+              help='Archive meals dated more than this many days ago '
+                   '(default: ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int,
+              help='Meals per transaction (default: ARCHIVE_BATCH_MEALS).')
+@click.option('--dry-run', is_flag=True, help='Only count the meals that would be archived.')
+def archive_meals_command(before, days, batch_size, dry_run):
+    """Move past meals and their responses into the archive."""
+
+    if before is not None and days is not None:
+        raise click.UsageError('Use either --before or --days, not both.')
+
+    if before is not None:
+        before = before.date()
+    else:
+        days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+        before = date.today() - timedelta(days=days)
+
+    if dry_run:
+        count = archivable_meals(before).count()
+        click.echo(f'{count} meals dated before {before} would be archived.')
+        return
+
+    count = archive_meals(before, batch_size or current_app.config['ARCHIVE_BATCH_MEALS'])
+    click.echo(f'Archived {count} meals dated before {before}.')
+
+@bp.cli.command('restore-meal')
+@click.argument('archive_id', type=int)
+def restore_meal_command(archive_id):
+    """Move an archived meal back into the live tables."""
+
+    archive = MealArchive.query.get(archive_id)
+
+    if archive is None:
+        raise click.ClickException(f'No archived meal with id {archive_id}.')
+
+    meal = restore_archive(archive)
+    db.session.commit()
+
+    click.echo(f'Restored the meal on {meal.date} as meal {meal.id} '
+               f'with {archive.response_count} responses.')
+
+@bp.cli.command('recount-responses')
+@click.option('--meal-id', 'meal_ids', type=int, multiple=True,
+              help='Only recount this meal (may be repeated).')
+def recount_responses_command(meal_ids):
+    """Rebuild the per-meal response counters from the responses."""
+
+    recount(meal_ids or None)
+    db.session.commit()
+
+    if meal_ids:
+        click.echo(f'Recounted the responses for {len(meal_ids)} meals.')
+    else:
+        click.echo('Recounted the responses for every meal.')
+
+@bp.cli.command('import-catalog')
+@click.argument('catalog', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'json']),
+              help='Catalog format (default: from the file extension).')
+@click.option('--dry-run', is_flag=True, help='Only show what would change.')
+def import_catalog_command(catalog, file_format, dry_run):
+    """Create and update foods, sides, and drinks from a CSV or JSON catalog."""
+
+    file_format = file_format or ('json' if catalog.name.lower().endswith('.json') else 'csv')
+
+    try:
+        records = parse_catalog(catalog.read(), file_format)
+    except (ValueError, csv.Error) as error:
+        raise click.ClickException(f'Could not read the catalog: {error}')
+
+    plan, errors = import_catalog(records, dry_run=dry_run)
+
+    for error in errors:
+        click.echo(f"Row {error['row'] + 1}: {' '.join(error['errors'])}", err=True)
+    for error in plan.errors:
+        click.echo(error, err=True)
+    if errors or plan.errors:
+        raise click.ClickException('The catalog was not imported.')
+
+    for line in plan.details() + plan.summary():
+        click.echo(line)
+
+    if dry_run:
+        click.echo('Dry run; nothing was changed.')
+    else:
+        db.session.commit()
+
+@bp.cli.command('generate-meals')
+@click.argument('template_id', type=int)
+@click.option('--count', type=int, required=True, help='Number of meals to create.')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']),
+              help="Date of the first meal (YYYY-MM-DD; default: one interval after "
+                   "the template's latest meal, or today).")
+@click.option('--every', 'interval_days', type=click.IntRange(min=1),
+              help="Days between meals (default: the template's).")
+def generate_meals_command(template_id, count, start, interval_days):
+    """Create a series of meals from a meal template."""
+
+    template = MealTemplate.query.get(template_id)
+
+    if template is None:
+        raise click.ClickException(f'No meal template with id {template_id}.')
+
+    most = current_app.config['MEAL_SERIES_MAX']
+    if not 1 <= count <= most:
+        raise click.BadParameter(f'Generate between 1 and {most} meals at a time.',
+                                 param_hint='--count')
+
+    start = start.date() if start is not None else next_series_start(template)
+    dates = generate_series(template, start, count, interval_days)
+    db.session.commit()
+
+    click.echo(f'Created {len(dates)} meals from the {template.name} template'
+               f'{": " + ", ".join(str(day) for day in dates) if dates else ""}.')
@@ -0,0 +1,268 @@
+"""Per-meal response counters, kept up to date as responses are written.
+
+Meal.response_count and the ChoiceCount rows are adjusted in the same
+transaction as the responses they count, so reading them never needs an
+aggregate query. Meal.response_revision is bumped by every write, so watchers
+can tell when anything about a meal's responses changed. insert_responses()
+adjusts them for the rows it writes, and mapper events cover responses added,
+changed, or deleted through the ORM.
+Bulk UPDATE or DELETE statements on the response table bypass both, so code
+issuing them has to adjust the counters itself (or call recount()).
+
+Counters that have drifted (for example after editing the database by hand)
+are rebuilt from the response table with recount(), also available as the
+flask recount-responses command.
+"""
+
+from collections import Counter
+from sqlalchemy import event
+from app import db
+from app.main.models import Meal, Response, ChoiceCount
+
+# Item id that "other" answers are counted under
+OTHER = 0
+
+# Choices counted for each response: (kind, id column, "other" column)
+KINDS = [
+    ('food', 'food_id', 'food_other'),
+    ('side', 'side_id', 'side_other'),
+    ('drink', 'drink_id', 'drink_other')
+]
+
+# Response columns that decide which counters a response is counted in
+COUNTED_COLUMNS = ['meal_id'] + [column for _, id_column, other_column in KINDS \
+    for column in (id_column, other_column)]
+
+def choice_keys(row):
+    """Get the (kind, item id) choices a response row is counted under."""
+
+    for kind, id_column, other_column in KINDS:
+        if row.get(id_column):
+            yield kind, int(row[id_column])
+        elif row.get(other_column):
+            yield kind, OTHER
+
+def count_deltas(added=(), removed=()):
+    """Get the counter changes for adding and removing response rows.
+
+    Rows are mappings of response columns. Returns a tuple of Counters:
+    responses per meal id, and responses per (meal id, kind, item id).
+    """
+
+    meals = Counter()
+    choices = Counter()
+
+    for rows, sign in [(added, 1), (removed, -1)]:
+        for row in rows:
+            meal_id = int(row['meal_id'])
+            meals[meal_id] += sign
+            for kind, item_id in choice_keys(row):
+                choices[(meal_id, kind, item_id)] += sign
+
+    return meals, choices
+
+def apply_deltas(connection, meals, choices):
+    """Apply counter changes from count_deltas() on a connection.
+
+    Every meal in meals has its response revision bumped, even if its count
+    doesn't change (a response was replaced). Meals changing by the same
+    amount share one UPDATE. Choice counts are upserted with one statement on
+    SQLite and Postgres.
+    """
+
+    by_delta = {}
+    for meal_id, delta in meals.items():
+        by_delta.setdefault(delta, []).append(meal_id)
+
+    table = Meal.__table__
+    for delta, meal_ids in by_delta.items():
+        connection.execute(
+            table.update()\
+                .where(table.c.id.in_(meal_ids))\
+                .values(
+                    response_count=table.c.response_count + delta,
+                    response_revision=table.c.response_revision + 1
+                )
+        )
+
+    rows = [
+        {'meal_id': meal_id, 'kind': kind, 'item_id': item_id, 'count': delta} \
+            for (meal_id, kind, item_id), delta in choices.items() if delta
+    ]
+
+    if rows:
+        _increment(connection, ChoiceCount.__table__, rows)
+
+def _increment(connection, table, rows):
+    """Add each row's count to the matching choice count, creating missing ones."""
+
+    dialect = connection.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        statement = insert(table).values(rows)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.meal_id, table.c.kind, table.c.item_id],
+            set_={'count': table.c.count + statement.excluded.count}
+        ))
+        return
+
+    for row in rows:
+        key = db.and_(
+            table.c.meal_id == row['meal_id'],
+            table.c.kind == row['kind'],
+            table.c.item_id == row['item_id']
+        )
+        result = connection.execute(
+            table.update().where(key).values(count=table.c.count + row['count'])
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(row))
+
+def lock_meals(connection, meal_ids):
+    """Take the write lock on meals before reading the responses a write replaces.
+
+    Issues a no-op UPDATE of the meals. On SQLite that takes the database's
+    write lock, which otherwise isn't taken until the first INSERT.
+    """
+
+    table = Meal.__table__
+
+    connection.execute(
+        table.update()\
+            .where(table.c.id.in_(meal_ids))\
+            .values(response_revision=table.c.response_revision)
+    )
+
+def replaced_responses(rows):
+    """Get the stored responses that upserting rows will replace.
+
+    Returns the counted columns of every existing response sharing a meal and
+    (case-insensitive) email with one of the rows, read with one query.
+    """
+
+    keys = {(int(row['meal_id']), row['email'].lower()) for row in rows if row.get('email')}
+
+    if not keys:
+        return []
+
+    table = Response.__table__
+    email = db.func.lower(table.c.email)
+    query = db.select([table.c[column] for column in COUNTED_COLUMNS] + [email.label('key')])\
+        .where(table.c.meal_id.in_({meal_id for meal_id, _ in keys}))\
+        .where(email.in_({key for _, key in keys}))
+
+    # On Postgres the rows are locked, so a concurrent update or delete of one
+    # can't change what's being replaced before it's replaced. Responses that
+    # don't exist yet can't be locked; insert_responses() works out which rows
+    # a concurrent request got to first from what its upsert actually did.
+    if db.engine.dialect.name == 'postgresql':
+        query = query.with_for_update()
+
+    rows = db.session.execute(query)
+
+    return [
+        row._mapping for row in rows #pylint: disable=protected-access
+        if (row.meal_id, row.key) in keys
+    ]
+
+def recount(meal_ids=None):
+    """Rebuild the counters from the response table.
+
+    Rebuilds every meal's counters, or just those of meal_ids. Doesn't commit.
+    """
+
+    meal = Meal.__table__
+    response = Response.__table__
+    choice = ChoiceCount.__table__
+
+    responses = db.select([db.func.count(response.c.id)])\
+        .where(response.c.meal_id == meal.c.id).scalar_subquery()
+    update = meal.update().values(response_count=responses)
+    delete = choice.delete()
+
+    if meal_ids is not None:
+        update = update.where(meal.c.id.in_(meal_ids))
+        delete = delete.where(choice.c.meal_id.in_(meal_ids))
+
+    db.session.execute(update)
+    db.session.execute(delete)
+
+    for kind, id_column, other_column in KINDS:
+        item_id = db.func.coalesce(response.c[id_column], OTHER)
+        query = db.select([
+            response.c.meal_id,
+            db.literal(kind),
+            item_id,
+            db.func.count(response.c.id)
+        ]).where(db.or_(
+            response.c[id_column].isnot(None),
+            db.and_(response.c[other_column].isnot(None), response.c[other_column] != '')
+        )).group_by(response.c.meal_id, item_id)
+
+        if meal_ids is not None:
+            query = query.where(response.c.meal_id.in_(meal_ids))
+
+        db.session.execute(
+            choice.insert().from_select(['meal_id', 'kind', 'item_id', 'count'], query)
+        )
+
+def delete_responses(meal_id):
+    """Delete a meal's responses with one statement, ahead of deleting the meal.
+
+    Deleting the meal would otherwise cascade to each response in turn, and
+    uncount each one. The meal's counters go with it, so they're left as they
+    are. Doesn't commit.
+    """
+
+    table = Response.__table__
+    db.session.execute(table.delete().where(table.c.meal_id == meal_id))
+
+def _stored(connection, target):
+    """Get the counted columns of a response as they are in the database."""
+
+    table = Response.__table__
+    row = connection.execute(
+        db.select([table.c[column] for column in COUNTED_COLUMNS])\
+            .where(table.c.id == target.id)
+    ).first()
+
+    return dict(row._mapping) if row else None #pylint: disable=protected-access
+
+def _current(target):
+    return {column: getattr(target, column) for column in COUNTED_COLUMNS}
+
+@event.listens_for(Response, 'after_insert')
+def _count_insert(mapper, connection, target): #pylint: disable=unused-argument
+    apply_deltas(connection, *count_deltas(added=[_current(target)]))
+
+# Updates and deletes read the stored row before it changes. Attribute history
+# can't be used: foreign keys set through relationships (response.food = ...)
+# are copied to the columns during the flush without recording history.
+@event.listens_for(Response, 'before_update')
+def _count_update(mapper, connection, target): #pylint: disable=unused-argument
+    before = _stored(connection, target)
+
+    if before is not None:
+        apply_deltas(connection, *count_deltas(added=[_current(target)], removed=[before]))
+
+@event.listens_for(Response, 'before_delete')
+def _count_delete(mapper, connection, target): #pylint: disable=unused-argument
+    before = _stored(connection, target)
+
+    if before is not None:
+        apply_deltas(connection, *count_deltas(removed=[before]))
+
+# Choice counts reference the meal, so they go before it does (emptied counts
+# keep their rows, so there's usually something to delete). The meal's
+# responses are deleted earlier: by delete_responses(), or uncounted one at a
+# time earlier in the same flush.
+@event.listens_for(Meal, 'before_delete')
+def _delete_counts(mapper, connection, target): #pylint: disable=unused-argument
+    connection.execute(
+        ChoiceCount.__table__.delete().where(ChoiceCount.__table__.c.meal_id == target.id)
+    )
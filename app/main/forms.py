@@ -1,10 +1,12 @@
 """Forms for the core app."""
 
+from flask import current_app
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, SubmitField, SelectMultipleField, SelectField,\
-    HiddenField, BooleanField, TextAreaField
-from wtforms.fields.html5 import DateField
-from wtforms.validators import DataRequired, Email
+    HiddenField, TextAreaField, BooleanField, IntegerField
+from wtforms.fields.html5 import DateField, DateTimeLocalField
+from wtforms.validators import DataRequired, Email, Optional, ValidationError, NumberRange
 
 class SelectFieldNoValidate(SelectField):
     def pre_validate(self, form):
@@ -50,6 +52,28 @@ class MealDeleteForm(FlaskForm):
 
     meal_id = HiddenField(validators=[DataRequired()])
 
+class ArchiveForm(FlaskForm):
+    """Form for archiving past meals."""
+
+    before = DateField('Archive meals dated before', validators=[DataRequired()])
+    submit = SubmitField('Archive')
+
+class ArchiveRestoreForm(FlaskForm):
+    """Form for restoring archived meals."""
+
+    archive_id = HiddenField(validators=[DataRequired()])
+
+class CatalogImportForm(FlaskForm):
+    """Form for importing foods, sides, and drinks from a catalog file."""
+
+    catalog = FileField('Catalog', validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'json'], 'Catalogs must be CSV or JSON files.')
+    ], description='Columns: type (food, side, or drink), label, description, '
+                   'and sides (labels separated by semicolons).')
+    dry_run = BooleanField('Dry run (only show what would change)', default=True)
+    submit = SubmitField('Import')
+
 class MealForm(FlaskForm):
     """Form for adding meals."""
 
@@ -68,9 +92,98 @@ class MealForm(FlaskForm):
         coerce=int,
         validators=[DataRequired()]
     )
-    registration_open = BooleanField('Registration Open')
+    registration_open = DateTimeLocalField(
+        'Registration Opens (UTC)',
+        format='%Y-%m-%dT%H:%M',
+        validators=[Optional()]
+    )
+    registration_close = DateTimeLocalField(
+        'Registration Closes (UTC)',
+        description='Leave either registration time blank to keep the meal closed.',
+        format='%Y-%m-%dT%H:%M',
+        validators=[Optional()]
+    )
+    submit = SubmitField('Save')
+
+    def validate_registration_close(self, field):
+        """Registration has to close after it opens."""
+
+        if self.registration_open.data and field.data <= self.registration_open.data:
+            raise ValidationError('Registration must close after it opens.')
+
+class MealTemplateForm(FlaskForm):
+    """Form for meal templates."""
+
+    name = StringField('Name', validators=[DataRequired()])
+    meal_type = SelectField('Meal Type', validators=[DataRequired()], coerce=int)
+    restaurant = StringField('Restaurant')
+    interval_days = IntegerField(
+        'Days Between Meals',
+        default=7,
+        validators=[DataRequired(), NumberRange(min=1)]
+    )
+    drinks = SelectMultipleField(
+        'Choose Drinks',
+        description='Use CTRL (Windows) or CMD (Mac) to select multiple drinks.',
+        coerce=int,
+        validators=[DataRequired()]
+    )
+    foods = SelectMultipleField(
+        'Choose Foods',
+        description='Use CTRL (Windows) or CMD (Mac) to select multiple foods.',
+        coerce=int,
+        validators=[DataRequired()]
+    )
+    registration_open_hours = IntegerField(
+        'Registration Opens (hours before the meal date)',
+        validators=[Optional()]
+    )
+    registration_close_hours = IntegerField(
+        'Registration Closes (hours before the meal date)',
+        description='Hours count back from midnight UTC at the start of the meal date. '
+                    'Leave either blank to keep generated meals closed.',
+        validators=[Optional()]
+    )
     submit = SubmitField('Save')
 
+    def validate_registration_close_hours(self, field):
+        """Registration has to close after it opens."""
+
+        if self.registration_open_hours.data is not None and field.data is not None \
+                and field.data >= self.registration_open_hours.data:
+            raise ValidationError('Registration must close after it opens.')
+
+class MealTemplateNameForm(FlaskForm):
+    """Form for saving a meal as a template."""
+
+    name = StringField('Template Name', validators=[DataRequired()])
+    submit = SubmitField('Save Template')
+
+class MealTemplateDeleteForm(FlaskForm):
+    """Form for deleting meal templates."""
+
+    template_id = HiddenField(validators=[DataRequired()])
+
+class SeriesForm(FlaskForm):
+    """Form for generating a series of meals from a template."""
+
+    start = DateField('First Meal Date', validators=[DataRequired()])
+    count = IntegerField('Number of Meals', default=4, validators=[DataRequired()])
+    interval_days = IntegerField(
+        'Days Between Meals',
+        description="Leave blank to use the template's.",
+        validators=[Optional(), NumberRange(min=1)]
+    )
+    submit = SubmitField('Generate')
+
+    def validate_count(self, field):
+        """Series are limited to MEAL_SERIES_MAX meals."""
+
+        most = current_app.config['MEAL_SERIES_MAX']
+
+        if not 1 <= field.data <= most:
+            raise ValidationError(f'Generate between 1 and {most} meals at a time.')
+
 class ResponseForm(FlaskForm):
     """Form for signing up for a meal."""
 
@@ -86,3 +199,20 @@ class ResponseForm(FlaskForm):
     drink_other = StringField('Other Drink', render_kw={'disabled':''})
     note = TextAreaField('Notes')
     submit = SubmitField('Submit')
+
+    def apply_menu(self, menu):
+        """Populate the food, side, and drink choices from a meal's Menu."""
+
+        self.food.choices = menu.food_choices()
+        self.drink.choices = menu.drink_choices()
+        self.side.choices = menu.side_choices(self.food.data)
+
+    def validate_menu(self, menu):
+        """Check the food, side, and drink choices against a meal's Menu."""
+
+        errors = menu.choice_errors(self.food.data, self.side.data, self.drink.data)
+
+        for field, messages in errors.items():
+            getattr(self, field).errors.extend(messages)
+
+        return not errors
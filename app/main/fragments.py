@@ -0,0 +1,100 @@
+"""Cache of rendered page fragments for the public pages.
+
+The meal list and sign-up form only change when an admin edits a meal or an
+item on its menu, so their rendered HTML is cached under keys that include the
+meals' versions. Editing bumps the versions, so stale fragments are never looked
+up again and age out of the LRU.
+
+Per-user parts of the page (the navbar, flashed messages, and the CSRF token)
+are not cached. Forms are rendered into fragments with CSRF_SENTINEL in place of
+the token, which with_csrf_token() swaps for the user's own.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+
+# Stands in for the CSRF token in cached forms
+CSRF_SENTINEL = '__csrf_token_placeholder__'
+
+class FragmentCache():
+    """A bounded, thread-safe LRU cache of rendered fragments.
+
+    Entries older than max_age seconds are re-rendered, bounding how long an
+    edit that didn't change a key (such as a reused meal id) can go unnoticed.
+    """
+
+    def __init__(self, max_entries, max_age):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, render):
+        """Get the fragment for key, calling render() to build it if needed."""
+
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.max_age:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        fragment = render()
+
+        if self.max_entries:
+            with self._lock:
+                self._entries[key] = (fragment, now)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return fragment
+
+    def clear(self):
+        """Drop every cached fragment."""
+
+        with self._lock:
+            self._entries.clear()
+
+def fragment_cache():
+    """Get the current app's fragment cache, creating it on first use."""
+
+    cache = current_app.extensions.get('fragment_cache')
+
+    if cache is None:
+        cache = FragmentCache(
+            current_app.config['FRAGMENT_CACHE_SIZE'],
+            current_app.config['FRAGMENT_CACHE_MAX_AGE']
+        )
+        current_app.extensions['fragment_cache'] = cache
+
+    return cache
+
+def cached_fragment(key, render):
+    """Get a rendered fragment from the cache, calling render() on a miss."""
+
+    return Markup(fragment_cache().get(key, render))
+
+def static_form(form):
+    """Prepare a form to be rendered into a cached fragment."""
+
+    if 'csrf_token' in form:
+        form.csrf_token.current_token = CSRF_SENTINEL
+
+    return form
+
+def with_csrf_token(fragment):
+    """Put the current user's CSRF token into a cached fragment."""
+
+    if CSRF_SENTINEL in fragment:
+        fragment = Markup(fragment.replace(CSRF_SENTINEL, generate_csrf()))
+
+    return fragment
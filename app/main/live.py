@@ -0,0 +1,258 @@
+"""Live signup updates for the admin dashboard, streamed as Server-Sent Events.
+
+Each process has one ChangeFeed. While anyone is watching, a background thread
+checks every watched meal's response revision with a single query every
+LIVE_POLL_INTERVAL seconds, however many viewers there are. Only meals whose
+revision changed are read further: their tally (from the response counters)
+and their most recent responses. The resulting events are fanned out to every
+viewer's queue, and each viewer's stream just waits on its queue.
+
+Events are 'tally' (the meal's counts), 'response' (a new or replaced
+response), and 'closed' (the meal was deleted or archived). A viewer that
+subscribes to a meal someone else is already watching is sent the feed's
+latest tally and recent responses right away.
+
+A viewer whose queue fills up (LIVE_MAX_QUEUED_EVENTS) is disconnected rather
+than buffered without limit. Streams also end after LIVE_STREAM_MAX_AGE
+seconds, so a worker thread is never held indefinitely; browsers reconnect on
+their own and start again from a fresh snapshot.
+
+Each open stream holds one of the worker's threads, so a worker serves at most
+LIVE_MAX_STREAMS of them at once (FeedFull is raised past that, and the stream
+is refused with a 503). The rest of its threads stay free for everything else.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from app import db
+from app.main.models import Meal, Response, ChoiceCount, Food, Side, Drink
+
+class FeedFull(Exception):
+    """Raised when a process is already streaming to as many viewers as it allows."""
+
+class Subscription():
+    """One viewer's queue of events for a meal."""
+
+    def __init__(self, meal_id, max_events=100):
+        self.meal_id = meal_id
+        self.overflowed = False
+        self._events = queue.Queue(maxsize=max_events)
+
+    def put(self, event):
+        """Queue an event, marking the subscription overflowed if there's no room."""
+
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Get the next event, or None if none arrives within timeout seconds."""
+
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class ChangeFeed():
+    """Polls the watched meals on behalf of every viewer in this process."""
+
+    def __init__(self, app, interval=1.0, recent=20, max_events=100, max_streams=None):
+        self.app = app
+        self.interval = interval
+        self.recent = recent
+        self.max_events = max_events
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._pid = None
+        self._subscribers = {}
+        # Per watched meal: (revision, snapshot events, {response id: timestamp})
+        self._meals = {}
+        self._watching = threading.Event()
+
+    def _start(self):
+        """Start (or, after a fork, restart) the poller for this process.
+
+        Threads don't survive fork, so each worker starts its own on first use.
+        Caller holds the lock.
+        """
+
+        self._pid = os.getpid()
+        self._subscribers = {}
+        self._meals = {}
+        self._watching = threading.Event()
+
+        threading.Thread(target=self._run, name='live-change-feed', daemon=True).start()
+
+    def subscribe(self, meal_id):
+        """Start watching a meal. Returns a Subscription.
+
+        Raises FeedFull if max_streams viewers are already subscribed.
+        """
+
+        subscription = Subscription(meal_id, self.max_events)
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+
+            if self.max_streams is not None and \
+                    sum(map(len, self._subscribers.values())) >= self.max_streams:
+                raise FeedFull()
+
+            self._subscribers.setdefault(meal_id, set()).add(subscription)
+            self._watching.set()
+
+            if meal_id in self._meals:
+                for event in self._meals[meal_id][1]:
+                    subscription.put(event)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop watching a meal."""
+
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.meal_id, set())
+            subscribers.discard(subscription)
+
+            if not subscribers:
+                self._subscribers.pop(subscription.meal_id, None)
+                self._meals.pop(subscription.meal_id, None)
+
+            if not self._subscribers:
+                self._watching.clear()
+
+    def poll(self):
+        """Check the watched meals once and publish whatever changed."""
+
+        with self._lock:
+            meal_ids = list(self._subscribers)
+            states = {meal_id: self._meals.get(meal_id) for meal_id in meal_ids}
+
+        if not meal_ids:
+            return
+
+        with self.app.app_context():
+            revisions = {
+                row.id: row for row in db.session.query(
+                    Meal.id, Meal.response_revision, Meal.response_count
+                ).filter(Meal.id.in_(meal_ids))
+            }
+
+            for meal_id in meal_ids:
+                meal = revisions.get(meal_id)
+
+                if meal is None:
+                    self._publish(meal_id, [{'event': 'closed', 'data': {}}])
+                    continue
+
+                state = states[meal_id]
+                if state is not None and state[0] == meal.response_revision:
+                    continue
+
+                self._update(meal_id, meal, state[2] if state else {})
+
+    def _update(self, meal_id, meal, sent):
+        """Read a changed meal's tally and recent responses, and publish them."""
+
+        tally = dict(ChoiceCount.tally(meal_id), responses=meal.response_count)
+        tally_event = {'event': 'tally', 'id': meal.response_revision, 'data': tally}
+
+        rows = reversed(recent_responses(meal_id, self.recent))
+        responses = [{'event': 'response', 'data': row} for row in rows]
+        changed = [
+            event for event in responses \
+                if sent.get(event['data']['id']) != event['data']['timestamp']
+        ]
+
+        with self._lock:
+            if meal_id not in self._subscribers:
+                return
+
+            self._meals[meal_id] = (
+                meal.response_revision,
+                [tally_event] + responses,
+                {event['data']['id']: event['data']['timestamp'] for event in responses}
+            )
+
+        self._publish(meal_id, [tally_event] + changed)
+
+    def _publish(self, meal_id, events):
+        with self._lock:
+            subscribers = list(self._subscribers.get(meal_id, ()))
+
+        for subscription in subscribers:
+            for event in events:
+                subscription.put(event)
+
+    def _run(self):
+        while True:
+            self._watching.wait()
+            time.sleep(self.interval)
+
+            try:
+                self.poll()
+            except Exception: #pylint: disable=broad-except
+                self.app.logger.exception('Live change feed poll failed')
+
+def recent_responses(meal_id, limit):
+    """Get a meal's most recently submitted responses, newest first.
+
+    Returns dicts of the response id, name, chosen labels, note, and ISO
+    timestamp (emails aren't included).
+    """
+
+    rows = db.session.query(
+        Response.id,
+        Response.first_name,
+        Response.last_name,
+        db.func.coalesce(Food.label, Response.food_other),
+        db.func.coalesce(Side.label, Response.side_other),
+        db.func.coalesce(Drink.label, Response.drink_other),
+        Response.note,
+        Response.timestamp
+    ).outerjoin(Food, Response.food_id == Food.id)\
+        .outerjoin(Side, Response.side_id == Side.id)\
+        .outerjoin(Drink, Response.drink_id == Drink.id)\
+        .filter(Response.meal_id == meal_id)\
+        .order_by(Response.timestamp.desc(), Response.id.desc())\
+        .limit(limit)
+
+    keys = ['id', 'first_name', 'last_name', 'food', 'side', 'drink', 'note', 'timestamp']
+
+    return [
+        dict(zip(keys, row[:-1]), timestamp=row[-1].isoformat() if row[-1] else None) \
+            for row in rows
+    ]
+
+def format_event(event):
+    """Encode an event for a text/event-stream response."""
+
+    lines = [f"event: {event['event']}"]
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+
+    return '\n'.join(lines) + '\n\n'
+
+def change_feed():
+    """Get the current app's change feed, creating it on first use."""
+
+    feed = current_app.extensions.get('change_feed')
+
+    if feed is None:
+        feed = ChangeFeed(
+            current_app._get_current_object(), #pylint: disable=protected-access
+            interval=current_app.config['LIVE_POLL_INTERVAL'],
+            recent=current_app.config['LIVE_RECENT_RESPONSES'],
+            max_events=current_app.config['LIVE_MAX_QUEUED_EVENTS'],
+            max_streams=current_app.config['LIVE_MAX_STREAMS']
+        )
+        current_app.extensions['change_feed'] = feed
+
+    return feed
@@ -0,0 +1,215 @@
+"""Immutable, eagerly loaded menus for meals."""
+
+from collections import namedtuple, OrderedDict
+from types import MappingProxyType
+from app import db
+from app.main.models import Meal, MealType, Drink, Food, Side, meal_drink, meal_food,\
+    food_side, registration_is_open
+
+# A single food, side, or drink choice
+MenuItem = namedtuple('MenuItem', ['id', 'label', 'description'])
+
+def side_options(sides):
+    """Serialize sides for the respond page's side picker.
+
+    Accepts anything with id, label, and description attributes.
+    """
+
+    side_list = [
+        {
+            'id': side.id,
+            'label': side.label,
+            'description': side.description
+        } for side in sides
+    ]
+
+    # Can only get "other" side if we have at least one side
+    if side_list:
+        side_list.append({
+            'id': 0,
+            'label': 'Other',
+            'description': 'Choose another side.'
+        })
+
+    return side_list
+
+class Menu(namedtuple('Menu', [
+        'meal_id',
+        'meal_type',
+        'restaurant',
+        'date',
+        'registration_open',
+        'registration_close',
+        'foods',
+        'drinks',
+        'sides'
+    ])):
+    """Everything needed to present and validate a meal's choices.
+
+    Foods and drinks are tuples of MenuItems. Sides is a read-only mapping of
+    food id to a tuple of MenuItems for that food.
+    """
+
+    __slots__ = ()
+
+    def is_open(self, now=None):
+        """Check whether registration for the meal is currently open."""
+
+        return registration_is_open(self.registration_open, self.registration_close, now)
+
+    def food_choices(self):
+        """Get select field choices for the meal's foods."""
+
+        choices = [
+            (food.id, f'{food.label} {f"({food.description})" if food.description else ""}') \
+                for food in self.foods
+        ]
+        choices.append(("0", "Other"))
+
+        return choices
+
+    def drink_choices(self):
+        """Get select field choices for the meal's drinks."""
+
+        choices = [(drink.id, drink.label) for drink in self.drinks]
+        choices.append(("0", "Other"))
+
+        return choices
+
+    def side_choices(self, food_id=None):
+        """Get select field choices for the sides of the given food.
+
+        Falls back to the first food on the menu if food_id isn't on the menu.
+        """
+
+        if food_id not in self.sides:
+            food_id = self.foods[0].id if self.foods else None
+
+        choices = [(side.id, side.label) for side in self.sides.get(food_id, ())]
+
+        # Can only get "other" side if we have choice of at least one side
+        if choices:
+            choices.append(("0", "Other"))
+
+        return choices
+
+    def choice_errors(self, food_id, side_id, drink_id):
+        """Check that chosen food, side, and drink ids are on the menu.
+
+        Ids of 0 or None mean "other" and are always allowed. Returns a dict of
+        field name to a list of error messages.
+        """
+
+        errors = {}
+
+        if food_id and food_id not in self.sides:
+            errors['food'] = ['That food is not on the menu.']
+
+        if side_id and side_id not in {side.id for side in self.sides.get(food_id, ())}:
+            errors['side'] = ['That side is not available with the chosen food.']
+
+        if drink_id and drink_id not in {drink.id for drink in self.drinks}:
+            errors['drink'] = ['That drink is not on the menu.']
+
+        return errors
+
+    def resolve_labels(self, formdata):
+        """Replace food, side, and drink labels in formdata with their menu ids.
+
+        Sides are matched against the chosen food's sides. Labels that don't
+        match are removed from formdata. Returns a dict of field name to a list
+        of error messages for those.
+        """
+
+        errors = {}
+
+        for field in ['food', 'drink', 'side']:
+            value = formdata.get(field)
+
+            if value is None or value.strip().isdigit():
+                continue
+
+            if field == 'food':
+                items = self.foods
+            elif field == 'drink':
+                items = self.drinks
+            else:
+                food_id = formdata.get('food', '')
+                items = self.sides.get(int(food_id), ()) if food_id.isdigit() else ()
+
+            matches = [item.id for item in items if item.label.lower() == value.strip().lower()]
+
+            if matches:
+                formdata[field] = str(matches[0])
+            else:
+                del formdata[field]
+                errors[field] = [f'"{value}" is not on the menu.']
+
+        return errors
+
+    def side_map(self):
+        """Get the side options for every food on the menu, keyed by food id."""
+
+        return {str(food_id): side_options(sides) for food_id, sides in self.sides.items()}
+
+def load_menu(meal_id):
+    """Load the menu for a meal in a fixed number of queries.
+
+    Returns None if the meal doesn't exist.
+    """
+
+    meal = db.session.query(
+        Meal.id,
+        MealType.name,
+        Meal.restaurant,
+        Meal.date,
+        Meal.registration_open,
+        Meal.registration_close
+    )\
+        .outerjoin(MealType, Meal.meal_type_id == MealType.id)\
+        .filter(Meal.id == meal_id).first()
+
+    if not meal:
+        return None
+
+    # Foods and all of their sides come back together, one row per pairing
+    food_rows = db.session.query(
+        Food.id,
+        Food.label,
+        Food.description,
+        Side.id,
+        Side.label,
+        Side.description
+    ).join(meal_food, meal_food.c.food_id == Food.id)\
+        .outerjoin(food_side, food_side.c.food_id == Food.id)\
+        .outerjoin(Side, food_side.c.side_id == Side.id)\
+        .filter(meal_food.c.meal_id == meal.id)\
+        .order_by(Food.id, Side.label).all()
+
+    foods = OrderedDict()
+    sides = {}
+    for row in food_rows:
+        if row[0] not in foods:
+            foods[row[0]] = MenuItem(*row[:3])
+            sides[row[0]] = []
+        if row[3] is not None:
+            sides[row[0]].append(MenuItem(*row[3:]))
+
+    drinks = db.session.query(Drink.id, Drink.label, Drink.description)\
+        .join(meal_drink, meal_drink.c.drink_id == Drink.id)\
+        .filter(meal_drink.c.meal_id == meal.id)\
+        .order_by(Drink.label).all()
+
+    return Menu(
+        meal_id=meal.id,
+        meal_type=meal.name,
+        restaurant=meal.restaurant,
+        date=meal.date,
+        registration_open=meal.registration_open,
+        registration_close=meal.registration_close,
+        foods=tuple(foods.values()),
+        drinks=tuple(MenuItem(*drink) for drink in drinks),
+        sides=MappingProxyType({
+            food_id: tuple(food_sides) for food_id, food_sides in sides.items()
+        })
+    )
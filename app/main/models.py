@@ -1,6 +1,6 @@
 """Database models for the primary app functionality."""
 
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from app import db
 
 # region
@@ -24,8 +24,98 @@ food_side = db.Table( #pylint: disable=invalid-name
     db.Column('food_id', db.Integer, db.ForeignKey('food.id'), primary_key=True),
     db.Column('side_id', db.Integer, db.ForeignKey('side.id'), primary_key=True)
 )
+
+# Association table for meal templates and drinks
+meal_template_drink = db.Table( #pylint: disable=invalid-name
+    'meal_template_drink',
+    db.Column('template_id', db.Integer, db.ForeignKey('meal_template.id'), primary_key=True),
+    db.Column('drink_id', db.Integer, db.ForeignKey('drink.id'), primary_key=True)
+)
+
+# Association table for meal templates and foods
+meal_template_food = db.Table( #pylint: disable=invalid-name
+    'meal_template_food',
+    db.Column('template_id', db.Integer, db.ForeignKey('meal_template.id'), primary_key=True),
+    db.Column('food_id', db.Integer, db.ForeignKey('food.id'), primary_key=True)
+)
+
+# Rows per INSERT when adding association rows (two parameters per row keeps
+# each statement under SQLite's historical limit of 999 bound parameters)
+ASSOCIATION_CHUNK_ROWS = 400
+
+def sync_association(table, owner_id, target_model, target_ids):
+    """Make the association rows for one owner match target_ids.
+
+    See sync_associations().
+    """
+
+    return sync_associations(table, target_model, {owner_id: target_ids})
+
+def sync_associations(table, target_model, wanted):
+    """Make the association rows for many owners match the wanted targets.
+
+    table is one of the association tables above; its first column is the
+    owner (e.g. meal_id) and its second is the target (e.g. drink_id). wanted
+    maps owner ids to iterables of target ids. Targets are validated with one
+    IN query, then the difference from the current rows is applied with at
+    most one bulk DELETE and one bulk INSERT. Doesn't commit.
+
+    Returns the set of requested target ids that don't exist (and were skipped).
+    """
+
+    owner_column, target_column = table.c
+    wanted = {owner: set(targets) for owner, targets in wanted.items()}
+    requested = set().union(*wanted.values())
+
+    valid = set()
+    if requested:
+        valid = {row[0] for row in db.session.query(target_model.id)\
+            .filter(target_model.id.in_(requested))}
+
+    current = {}
+    if wanted:
+        for owner, target in db.session.query(owner_column, target_column)\
+                .filter(owner_column.in_(wanted.keys())):
+            current.setdefault(owner, set()).add(target)
+
+    removals = []
+    additions = []
+    for owner, targets in wanted.items():
+        targets &= valid
+        existing = current.get(owner, set())
+
+        if existing - targets:
+            removals.append(db.and_(
+                owner_column == owner,
+                target_column.in_(existing - targets)
+            ))
+
+        additions.extend(
+            {owner_column.name: owner, target_column.name: target} \
+                for target in targets - existing
+        )
+
+    if removals:
+        db.session.execute(table.delete().where(db.or_(*removals)))
+
+    for start in range(0, len(additions), ASSOCIATION_CHUNK_ROWS):
+        db.session.execute(
+            table.insert().values(additions[start:start + ASSOCIATION_CHUNK_ROWS])
+        )
+
+    return requested - valid
 # endregion
 
+def registration_is_open(registration_open, registration_close, now=None):
+    """Check whether now (default: the current UTC time) falls in a registration window."""
+
+    if not registration_open or not registration_close:
+        return False
+
+    now = now or datetime.utcnow()
+
+    return registration_open < now < registration_close
+
 class MealType(db.Model):
     """The type of meal (breakfast, lunch, dinner, brunch, etc.)"""
 
@@ -39,11 +129,28 @@ class MealType(db.Model):
 class Meal(db.Model):
     """Represents an individual meal that will take place."""
 
+    __table_args__ = (
+        # Open meals: a range scan over meals that haven't closed yet, in closing order
+        db.Index('ix_meal_registration_close_open', 'registration_close', 'registration_open'),
+        # A template's meals, one per date (see series.py)
+        db.Index('ix_meal_template_id_date', 'template_id', 'date', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     meal_type_id = db.Column(db.Integer, db.ForeignKey('meal_type.id'))
     restaurant = db.Column(db.String(128))
-    date = db.Column(db.Date, nullable=False)
-    registration_open = db.Column(db.Boolean, nullable=False, default=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    # Registration window (UTC); meals without both are never open
+    registration_open = db.Column(db.DateTime)
+    registration_close = db.Column(db.DateTime)
+    # Incremented whenever the meal or anything on its menu changes (keys cached pages)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Number of responses, kept up to date as responses are written (see counters.py)
+    response_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Incremented whenever any of the meal's responses is written (see counters.py)
+    response_revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # The template the meal was generated from, if any (see series.py)
+    template_id = db.Column(db.Integer, db.ForeignKey('meal_template.id'))
     drinks = db.relationship(
         'Drink',
         secondary=meal_drink,
@@ -61,11 +168,91 @@ class Meal(db.Model):
     def get_open_meals():
         """Get currently available meals for registration."""
 
-        return Meal.query.filter(
-            Meal.registration_open < datetime.utcnow(),
-            Meal.registration_close > datetime.utcnow()
+        now = datetime.utcnow()
+
+        return Meal.query.options(db.joinedload(Meal.meal_type)).filter(
+            Meal.registration_close > now,
+            Meal.registration_open < now
         ).order_by(Meal.registration_close).all()
 
+    @staticmethod
+    def get_next_opening():
+        """Get the earliest registration opening time that's still in the future."""
+
+        return db.session.query(db.func.min(Meal.registration_open))\
+            .filter(Meal.registration_open > datetime.utcnow()).scalar()
+
+    def is_open(self, now=None):
+        """Check whether registration for this meal is currently open."""
+
+        return registration_is_open(self.registration_open, self.registration_close, now)
+
+    def bump_version(self):
+        """Mark this meal as changed."""
+
+        self.version = Meal.version + 1
+
+    @staticmethod
+    def bump_versions(meal_ids):
+        """Mark the meals whose ids are selected by a query as changed."""
+
+        Meal.query.filter(Meal.id.in_(meal_ids))\
+            .update({Meal.version: Meal.version + 1}, synchronize_session=False)
+
+class MealTemplate(db.Model):
+    """A recurring meal's type, restaurant, menu, and registration window.
+
+    Meals are generated from a template with generate_series() (see
+    series.py). The registration window is given in hours before the start of
+    the meal's date (UTC); templates without both offsets generate meals that
+    are never open.
+    """
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+    meal_type_id = db.Column(db.Integer, db.ForeignKey('meal_type.id'))
+    meal_type = db.relationship('MealType', backref=db.backref('templates', lazy='dynamic'))
+    restaurant = db.Column(db.String(128))
+    # Days between generated meals
+    interval_days = db.Column(db.Integer, nullable=False, default=7, server_default='7')
+    registration_open_hours = db.Column(db.Integer)
+    registration_close_hours = db.Column(db.Integer)
+    meals = db.relationship('Meal', backref='template', lazy='dynamic')
+    drinks = db.relationship(
+        'Drink',
+        secondary=meal_template_drink,
+        backref=db.backref('templates', lazy='dynamic'),
+        lazy='dynamic'
+    )
+    foods = db.relationship(
+        'Food',
+        secondary=meal_template_food,
+        backref=db.backref('templates', lazy='dynamic'),
+        lazy='dynamic'
+    )
+
+    @staticmethod
+    def registration_start(meal_date):
+        """Get the time the registration offsets count back from for a meal date."""
+
+        return datetime.combine(meal_date, time())
+
+    def registration_window(self, meal_date):
+        """Get the (open, close) registration times for a meal on meal_date."""
+
+        if self.registration_open_hours is None or self.registration_close_hours is None:
+            return None, None
+
+        start = MealTemplate.registration_start(meal_date)
+
+        return (
+            start - timedelta(hours=self.registration_open_hours),
+            start - timedelta(hours=self.registration_close_hours)
+        )
+
+    def __repr__(self):
+        return f"<MealTemplate: {self.id}, {self.name}>"
+
 class Drink(db.Model):
     """Represents a possible drink choice."""
 
@@ -79,6 +266,8 @@ class Food(db.Model):
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     label = db.Column(db.String(140), nullable=False)
     description = db.Column(db.String(250))
+    # Incremented whenever the food or its side list changes (used for ETags)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     sides = db.relationship(
         'Side',
         secondary=food_side,
@@ -86,6 +275,11 @@ class Food(db.Model):
         lazy='dynamic'
     )
 
+    def bump_version(self):
+        """Mark this food's side list as changed."""
+
+        self.version = Food.version + 1
+
 class Side(db.Model):
     """Represents a possible side choice."""
 
@@ -93,6 +287,31 @@ class Side(db.Model):
     label = db.Column(db.String(140), nullable=False)
     description = db.Column(db.String(250))
 
+    def bump_food_versions(self):
+        """Mark the side lists of every food offering this side as changed."""
+
+        Food.query.filter(
+            Food.id.in_(
+                db.session.query(food_side.c.food_id).filter(food_side.c.side_id == self.id)
+            )
+        ).update({Food.version: Food.version + 1}, synchronize_session=False)
+
+def bump_meal_versions(item):
+    """Mark every meal showing a meal type, food, side, or drink as changed."""
+
+    if isinstance(item, MealType):
+        meal_ids = db.session.query(Meal.id).filter(Meal.meal_type_id == item.id)
+    elif isinstance(item, Food):
+        meal_ids = db.session.query(meal_food.c.meal_id).filter(meal_food.c.food_id == item.id)
+    elif isinstance(item, Drink):
+        meal_ids = db.session.query(meal_drink.c.meal_id).filter(meal_drink.c.drink_id == item.id)
+    else:
+        meal_ids = db.session.query(meal_food.c.meal_id)\
+            .join(food_side, food_side.c.food_id == meal_food.c.food_id)\
+            .filter(food_side.c.side_id == item.id)
+
+    Meal.bump_versions(meal_ids)
+
 class Response(db.Model):
     """Represents a meal choice response."""
 
@@ -100,22 +319,22 @@ class Response(db.Model):
     first_name = db.Column(db.String(64), nullable=False)
     last_name = db.Column(db.String(64), nullable=False)
     email = db.Column(db.String(64))
-    meal_id = db.Column(db.Integer, db.ForeignKey('meal.id'), nullable=False)
+    meal_id = db.Column(db.Integer, db.ForeignKey('meal.id'), nullable=False, index=True)
     meal = db.relationship(
         'Meal',
         backref=db.backref('responses', lazy='dynamic', cascade="all, delete-orphan"),
     )
-    food_id = db.Column(db.Integer, db.ForeignKey('food.id'))
+    food_id = db.Column(db.Integer, db.ForeignKey('food.id'), index=True)
     food = db.relationship(
         'Food',
         backref=db.backref('responses', lazy='dynamic')
     )
-    drink_id = db.Column(db.Integer, db.ForeignKey('drink.id'))
+    drink_id = db.Column(db.Integer, db.ForeignKey('drink.id'), index=True)
     drink = db.relationship(
         'Drink',
         backref=db.backref('responses', lazy='dynamic')
     )
-    side_id = db.Column(db.Integer, db.ForeignKey('side.id'))
+    side_id = db.Column(db.Integer, db.ForeignKey('side.id'), index=True)
     side = db.relationship(
         'Side',
         backref=db.backref('responses', lazy='dynamic')
@@ -124,4 +343,149 @@ class Response(db.Model):
     drink_other = db.Column(db.String(140))
     side_other = db.Column(db.String(140))
     note = db.Column(db.String(255))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def export_query(meal_id):
+        """Get a flat, single-statement query of the responses for a meal.
+
+        Food, side, and drink labels are joined in (falling back to the "other"
+        free-text values) so rows can be exported without per-row lazy loads.
+        """
+
+        return db.session.query(
+            Response.first_name,
+            Response.last_name,
+            Response.email,
+            db.func.coalesce(Food.label, Response.food_other),
+            db.func.coalesce(Side.label, Response.side_other),
+            db.func.coalesce(Drink.label, Response.drink_other),
+            Response.note,
+            Response.timestamp
+        ).outerjoin(Food, Response.food_id == Food.id)\
+            .outerjoin(Side, Response.side_id == Side.id)\
+            .outerjoin(Drink, Response.drink_id == Drink.id)\
+            .filter(Response.meal_id == meal_id)\
+            .order_by(Response.id)
+
+    @staticmethod
+    def tally(meal_id):
+        """Count a meal's responses for each food, side, and drink choice.
+
+        Counting happens in the database with one GROUP BY query per choice type.
+        "Other" free-text values are counted by their text, with an id of None.
+        """
+
+        tally = {}
+
+        for key, model, id_column, other_column in [
+                ('foods', Food, Response.food_id, Response.food_other),
+                ('sides', Side, Response.side_id, Response.side_other),
+                ('drinks', Drink, Response.drink_id, Response.drink_other)
+            ]:
+            label = db.func.coalesce(model.label, other_column)
+            count = db.func.count(Response.id)
+
+            rows = db.session.query(id_column, label, count)\
+                .outerjoin(model, id_column == model.id)\
+                .filter(Response.meal_id == meal_id)\
+                .group_by(id_column, label)\
+                .order_by(count.desc(), label).all()
+
+            tally[key] = [
+                {'id': row[0], 'label': row[1], 'count': row[2]} for row in rows
+            ]
+
+        # Every response has exactly one food row (even if it's empty)
+        tally['responses'] = sum(row['count'] for row in tally['foods'])
+
+        return tally
+
+class ChoiceCount(db.Model):
+    """The number of a meal's responses choosing one food, side, or drink.
+
+    kind is 'food', 'side', or 'drink'. Responses giving an "other" answer
+    instead of a menu item are counted together under an item_id of 0. Kept up
+    to date as responses are written (see counters.py).
+    """
+
+    meal_id = db.Column(db.Integer, db.ForeignKey('meal.id'), primary_key=True)
+    kind = db.Column(db.String(8), primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def for_meal(meal_id):
+        """Get a meal's counts as {kind: {item_id: count}}."""
+
+        counts = {'food': {}, 'side': {}, 'drink': {}}
+
+        for kind, item_id, count in db.session.query(
+                ChoiceCount.kind, ChoiceCount.item_id, ChoiceCount.count
+            ).filter(ChoiceCount.meal_id == meal_id, ChoiceCount.count != 0):
+            counts[kind][item_id] = count
+
+        return counts
+
+    @staticmethod
+    def tally(meal_id):
+        """Get a meal's counts with item labels, shaped like Response.tally().
+
+        Reads the counters with a single query. Returns 'foods', 'sides', and
+        'drinks' lists of {'id', 'label', 'count'}, most chosen first. "Other"
+        answers are counted together with an id of None.
+        """
+
+        label = db.case([
+            (ChoiceCount.kind == 'food', Food.label),
+            (ChoiceCount.kind == 'side', Side.label)
+        ], else_=Drink.label)
+
+        rows = db.session.query(ChoiceCount.kind, ChoiceCount.item_id, label, ChoiceCount.count)\
+            .outerjoin(Food, db.and_(ChoiceCount.kind == 'food', ChoiceCount.item_id == Food.id))\
+            .outerjoin(Side, db.and_(ChoiceCount.kind == 'side', ChoiceCount.item_id == Side.id))\
+            .outerjoin(Drink, db.and_(
+                ChoiceCount.kind == 'drink', ChoiceCount.item_id == Drink.id
+            ))\
+            .filter(ChoiceCount.meal_id == meal_id, ChoiceCount.count > 0)\
+            .order_by(ChoiceCount.count.desc(), label)
+
+        tally = {'foods': [], 'sides': [], 'drinks': []}
+
+        for kind, item_id, item_label, count in rows:
+            tally[f'{kind}s'].append({
+                'id': item_id or None,
+                'label': 'Other' if not item_id else item_label or 'Deleted item',
+                'count': count
+            })
+
+        return tally
+
+class MealArchive(db.Model):
+    """A past meal moved out of the live tables along with its menu and responses.
+
+    The archived rows are kept as gzip-compressed JSON in data, which is only
+    loaded when the meal is restored. The other columns summarize the meal for
+    the archive list.
+    """
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    # The meal's id before it was archived (restored meals get a new id)
+    meal_id = db.Column(db.Integer, nullable=False)
+    meal_type_name = db.Column(db.String(64))
+    restaurant = db.Column(db.String(128))
+    date = db.Column(db.Date, nullable=False, index=True)
+    response_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+
+    def __repr__(self):
+        return f"<MealArchive: {self.id}, {self.meal_type_name} on {self.date}>"
+
+# One response per person per meal; resubmitting replaces the earlier response
+db.Index(
+    'uq_response_meal_id_email',
+    Response.meal_id,
+    db.func.lower(Response.email),
+    unique=True
+)
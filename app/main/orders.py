@@ -0,0 +1,227 @@
+"""Validating and recording meal responses."""
+
+import csv
+import io
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+from app import db
+from app.main.forms import ResponseForm
+from app.main.models import Response
+from app.main.counters import count_deltas, apply_deltas, replaced_responses, lock_meals
+
+# Columns accepted for each response in a bulk submission
+RESPONSE_FIELDS = [
+    'first_name',
+    'last_name',
+    'email',
+    'food',
+    'food_other',
+    'side',
+    'side_other',
+    'drink',
+    'drink_other',
+    'note'
+]
+
+# Rows per INSERT statement. Keeps each statement under SQLite's historical
+# limit of 999 bound parameters.
+INSERT_CHUNK_ROWS = 75
+
+def response_row(form, meal_id):
+    """Build a response table row from a validated ResponseForm."""
+
+    return {
+        'meal_id': meal_id,
+        'first_name': form.first_name.data,
+        'last_name': form.last_name.data,
+        'email': form.email.data,
+        'food_id': form.food.data or None,
+        'side_id': form.side.data or None,
+        'drink_id': form.drink.data or None,
+        'food_other': form.food_other.data,
+        'side_other': form.side_other.data,
+        'drink_other': form.drink_other.data,
+        'note': form.note.data
+    }
+
+def dedupe_responses(rows):
+    """Keep only the last row for each meal and (case-insensitive) email.
+
+    Rows without an email are all kept.
+    """
+
+    latest = {}
+    for index, row in enumerate(rows):
+        email = row.get('email')
+        key = (str(row['meal_id']), email.lower()) if email else index
+        latest.pop(key, None)
+        latest[key] = row
+
+    return list(latest.values())
+
+def conflict_insert(dialect):
+    """Get the dialect's INSERT construct supporting ON CONFLICT, or None."""
+
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    return insert
+
+def _upsert(table, rows):
+    """Build an INSERT that replaces existing responses from the same email.
+
+    Uses ON CONFLICT on SQLite and Postgres; other databases get a plain INSERT.
+    """
+
+    insert = conflict_insert(db.engine.dialect.name)
+
+    if insert is None:
+        return table.insert().values(rows)
+
+    statement = insert(table).values(rows)
+
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.meal_id, db.func.lower(table.c.email)],
+        set_={
+            column: statement.excluded[column] for column in rows[0] if column != 'meal_id'
+        }
+    )
+
+def _upsert_returning(table, rows):
+    """Upsert rows on Postgres, returning the stored responses that were replaced.
+
+    Which rows replace an existing response is only known once they're
+    written: a response committed by a concurrent request after any earlier
+    check is still replaced by ON CONFLICT. So rows are first inserted with
+    ON CONFLICT DO NOTHING, which returns the ones that went in. The existing
+    responses the others conflicted with are then read and locked, and those
+    rows upserted; RETURNING (xmax = 0) tells which of them still replaced
+    one rather than being inserted (if it was deleted in between).
+    """
+
+    key = db.func.lower(table.c.email)
+    statement = conflict_insert('postgresql')(table).values(rows)
+    inserted = {
+        (row.meal_id, row.key) for row in db.session.execute(
+            statement.on_conflict_do_nothing(index_elements=[table.c.meal_id, key])\
+                .returning(table.c.meal_id, key.label('key'))
+        )
+    }
+
+    conflicting = [
+        row for row in rows \
+            if row.get('email') and (int(row['meal_id']), row['email'].lower()) not in inserted
+    ]
+
+    if not conflicting:
+        return []
+
+    stored = replaced_responses(conflicting)
+    replaced = {
+        (row.meal_id, row.key) for row in db.session.execute(
+            _upsert(table, conflicting).returning(
+                table.c.meal_id,
+                key.label('key'),
+                db.literal_column('xmax = 0').label('inserted')
+            )
+        ) if not row.inserted
+    }
+
+    return [row for row in stored if (row['meal_id'], row['key']) in replaced]
+
+def insert_responses(rows):
+    """Record response rows with multi-row INSERT statements.
+
+    A row whose email already has a response for the meal replaces that
+    response, and takes the time of the replacement as its timestamp. The
+    meals' response counters are adjusted to match, counting only the
+    responses that were really replaced, even when requests for the same
+    email race. Doesn't commit; the caller owns the transaction.
+    """
+
+    table = Response.__table__
+    now = datetime.utcnow()
+    rows = [
+        row if row.get('timestamp') else dict(row, timestamp=now) \
+            for row in dedupe_responses(rows)
+    ]
+    chunks = [rows[start:start + INSERT_CHUNK_ROWS] \
+        for start in range(0, len(rows), INSERT_CHUNK_ROWS)]
+
+    if db.engine.dialect.name == 'postgresql':
+        replaced = [row for chunk in chunks for row in _upsert_returning(table, chunk)]
+    else:
+        if db.engine.dialect.name == 'sqlite':
+            # SQLite has one writer at a time, so once this transaction holds
+            # the write lock the responses read next can't change under it
+            lock_meals(db.session.connection(), {int(row['meal_id']) for row in rows})
+
+        replaced = replaced_responses(rows)
+
+        for chunk in chunks:
+            db.session.execute(_upsert(table, chunk))
+
+    apply_deltas(db.session.connection(), *count_deltas(added=rows, removed=replaced))
+
+def parse_bulk(request):
+    """Get a list of response dicts from a bulk submission request.
+
+    Accepts a JSON list (optionally wrapped as {"responses": [...]}), a CSV
+    request body, or a CSV file uploaded as "file". CSV files need a header row
+    naming the columns in RESPONSE_FIELDS.
+    """
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('responses')
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON list of responses.')
+        return data
+
+    if 'file' in request.files:
+        text = request.files['file'].read().decode('utf-8-sig')
+    else:
+        text = request.get_data(as_text=True)
+
+    return list(csv.DictReader(io.StringIO(text)))
+
+def validate_bulk(menu, records):
+    """Validate many responses against a meal's menu in one pass.
+
+    Food, side, and drink may be given as ids or as menu labels. Returns a tuple
+    of (rows, errors) where rows are ready for insert_responses() and errors is
+    a list of {'row': index, 'errors': {field: [messages]}} dicts.
+    """
+
+    rows = []
+    errors = []
+
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'row': index, 'errors': {'row': ['Expected an object.']}})
+            continue
+
+        formdata = MultiDict({
+            field: str(record[field]) for field in RESPONSE_FIELDS \
+                if record.get(field) not in (None, '')
+        })
+        formdata['meal_id'] = str(menu.meal_id)
+
+        label_errors = menu.resolve_labels(formdata)
+
+        form = ResponseForm(formdata=formdata, meta={'csrf': False})
+        valid = form.validate() and form.validate_menu(menu)
+
+        if valid and not label_errors:
+            rows.append(response_row(form, menu.meal_id))
+        else:
+            field_errors = dict(form.errors)
+            field_errors.update(label_errors)
+            errors.append({'row': index, 'errors': field_errors})
+
+    return rows, errors
@@ -3,168 +3,296 @@
 import re
 import csv
 import io
+import itertools
+import time
+from datetime import date, timedelta
 from flask import render_template, flash, redirect, url_for, jsonify,\
-    make_response
+    current_app, stream_with_context, request
 from flask_login import login_required
 from app import db
+from app.instrumentation import query_budget
 from app.main import bp
-from app.main.models import Meal, Drink, Side, Food, MealType, Response
+from app.main.models import Meal, Drink, Side, Food, MealType, Response, MealArchive,\
+    MealTemplate, meal_drink, meal_food, food_side, meal_template_drink, meal_template_food,\
+    sync_association, bump_meal_versions, registration_is_open
+from app.main.menu import load_menu, side_options
+from app.main.snapshots import open_meals, invalidate_open_meals
+from app.main.orders import response_row, insert_responses, parse_bulk, validate_bulk
+from app.main.submissions import submission_queue
+from app.main.fragments import cached_fragment, static_form, with_csrf_token
+from app.main.archive import archive_meals, restore_archive
+from app.main.live import FeedFull, change_feed, format_event
+from app.main.counters import delete_responses
+from app.main.catalog import parse_catalog, import_catalog
+from app.main.series import generate_series, next_series_start, taken_dates, template_from_meal
 from app.main.forms import DrinkForm, SideForm, FoodForm, MealTypeForm,\
-    DeleteForm, MealForm, MealDeleteForm, ResponseForm
+    DeleteForm, MealForm, MealDeleteForm, ResponseForm, ArchiveForm, ArchiveRestoreForm,\
+    CatalogImportForm, MealTemplateForm, MealTemplateNameForm, MealTemplateDeleteForm, SeriesForm
 import app
 import app.main.forms
 
+# Column headings for the responses CSV export
+CSV_HEADER = [
+    'First Name',
+    'Last Name',
+    'Email',
+    'Food',
+    'Side',
+    'Drink',
+    'Note',
+    'Timestamp'
+]
+
 @bp.route('/')
 @bp.route('/index')
+@query_budget(3)
 def index():
-    meals = Meal.query.filter_by(registration_open=True).order_by(Meal.date).all()
+    meals = open_meals()
+
+    content = cached_fragment(
+        ('index',) + tuple((meal.id, meal.version) for meal in meals),
+        lambda: render_template('index_content.html', meals=meals)
+    )
 
-    return render_template('index.html', title='Meal Sign-up', meals=meals)
+    return render_template('index.html', title='Meal Sign-up', content=content)
 
 @bp.route('/respond/<meal_id>', methods=['GET', 'POST'])
+@query_budget(8)
 def respond(meal_id):
-    meal = Meal.query.get(meal_id)
-    form = ResponseForm()
+    if request.method == 'GET':
+        return respond_page(meal_id)
 
-    foods = meal.foods.all()
+    menu = load_menu(meal_id)
 
-    form.food.choices = [
-        (food.id, f'{food.label} {f"({food.description})" if food.description else ""}') \
-            for food in foods
-    ]
-    form.food.choices.append(("0", "Other"))
+    if not menu:
+        flash('Could not find that meal!', 'danger')
+        return redirect(url_for('main.index'))
 
-    form.drink.choices = [(drink.id, drink.label)\
-        for drink in meal.drinks.order_by(Drink.label).all()]
-    form.drink.choices.append(("0", "Other"))
+    if not menu.is_open():
+        flash('Registration for that meal is closed.', 'danger')
+        return redirect(url_for('main.index'))
 
-    form.side.choices = [(side.id, side.label)\
-        for side in foods[0].sides.order_by(Side.label).all()]
-    # Can only get "other" side if we have choice of at least one side
-    if form.side.choices:
-        form.side.choices.append(("0", "Other"))
+    form = ResponseForm()
+    form.apply_menu(menu)
 
-    if form.validate_on_submit():
-        response = Response(
-            first_name=form.first_name.data,
-            last_name=form.last_name.data,
-            email=form.email.data,
-            food_other=form.food_other.data,
-            drink_other=form.drink_other.data,
-            side_other=form.side_other.data,
-            note=form.note.data
-        )
+    if form.validate_on_submit() and form.validate_menu(menu):
+        row = response_row(form, menu.meal_id)
 
-        if form.food.data:
-            response.food_id = form.food.data
-        if form.side.data:
-            response.side_id = form.side.data
-        if form.drink.data:
-            response.drink_id = form.drink.data
+        if current_app.config['RESPONSE_QUEUE_ENABLED']:
+            if not submission_queue().submit(row):
+                flash('We\'re receiving a lot of orders right now. '
+                      'Please try submitting again in a moment.', 'danger')
+                content = render_template('respond_content.html', menu=menu, form=form)
+                return render_template('respond.html', content=content), 503
 
-        response.meal = Meal.query.get(form.meal_id.data)
+            flash('Your order was received and will be saved shortly!', 'success')
+            return redirect(url_for('main.index'))
 
-        db.session.add(response)
+        insert_responses([row])
         db.session.commit()
 
         flash('Your order was submitted successfully!', 'success')
         return redirect(url_for('main.index'))
 
-    else:
+    form.meal_id.data = meal_id
+    content = render_template('respond_content.html', menu=menu, form=form)
+
+    return render_template('respond.html', content=content)
+
+def respond_page(meal_id):
+    """Show the sign-up form for a meal, from the fragment cache when possible."""
+
+    meal = db.session.query(Meal.version, Meal.registration_open, Meal.registration_close)\
+        .filter(Meal.id == meal_id).first()
+
+    if not meal:
+        flash('Could not find that meal!', 'danger')
+        return redirect(url_for('main.index'))
+
+    if not registration_is_open(meal.registration_open, meal.registration_close):
+        flash('Registration for that meal is closed.', 'danger')
+        return redirect(url_for('main.index'))
+
+    def render():
+        menu = load_menu(meal_id)
+
+        form = ResponseForm()
+        form.apply_menu(menu)
         form.meal_id.data = meal_id
 
-    return render_template('respond.html', meal=meal, form=form)
+        return render_template('respond_content.html', menu=menu, form=static_form(form))
+
+    content = cached_fragment(('respond', meal_id, meal.version), render)
+
+    return render_template('respond.html', content=with_csrf_token(content))
+
+@bp.route('/respond/<meal_id>/bulk', methods=['POST'])
+@query_budget(8)
+def respond_bulk(meal_id):
+    """Submit many responses for a meal at once as JSON or CSV."""
+
+    menu = load_menu(meal_id)
+
+    if not menu:
+        return jsonify({'errors': ['Could not find that meal!']}), 404
+
+    if not menu.is_open():
+        return jsonify({'errors': ['Registration for that meal is closed.']}), 409
+
+    try:
+        records = parse_bulk(request)
+    except (ValueError, csv.Error, UnicodeDecodeError) as error:
+        return jsonify({'errors': [str(error)]}), 400
+
+    limit = current_app.config['BULK_RESPONSE_LIMIT']
+    if len(records) > limit:
+        return jsonify({'errors': [f'At most {limit} responses can be submitted at once.']}), 413
+
+    rows, errors = validate_bulk(menu, records)
+
+    if errors:
+        return jsonify({'errors': errors}), 400
+
+    insert_responses(rows)
+    db.session.commit()
+
+    return jsonify({'created': len(rows)}), 201
 
 @bp.route('/responses/<meal_id>', methods=['GET'])
+@query_budget(2)
 def responses(meal_id):
 
-    meal = Meal.query.get(meal_id)
+    meal = db.session.query(Meal.date, MealType.name)\
+        .outerjoin(MealType, Meal.meal_type_id == MealType.id)\
+        .filter(Meal.id == meal_id).first()
 
     if meal:
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        rows = Response.export_query(meal_id).yield_per(batch_size)
 
-        csv_io = io.StringIO()
-        writer = csv.writer(csv_io)
-
-        writer.writerow(
-            [
-                'First Name',
-                'Last Name',
-                'Email',
-                'Food',
-                'Side',
-                'Drink',
-                'Note',
-                'Timestamp'
-            ]
+        response = current_app.response_class(
+            stream_with_context(generate_csv(CSV_HEADER, rows)),
+            mimetype='text/csv'
         )
+        response.headers['Content-Disposition'] =\
+            f'attachment; filename={meal.date} {meal.name}.csv'
 
-        for entry in meal.responses:
-            cur = []
+        return response
 
-            cur.append(entry.first_name)
-            cur.append(entry.last_name)
-            cur.append(entry.email)
+    flash('Could not find that meal!', 'danger')
+    return redirect(url_for('main.meal_list'))
 
-            if entry.food:
-                cur.append(entry.food.label)
-            else:
-                cur.append(entry.food_other)
+@bp.route('/tally/<meal_id>')
+@login_required
+@query_budget(6)
+def tally(meal_id):
 
-            if entry.side:
-                cur.append(entry.side.label)
-            else:
-                cur.append(entry.side_other)
+    meal = Meal.query.get(meal_id)
 
-            if entry.drink:
-                cur.append(entry.drink.label)
-            else:
-                cur.append(entry.drink_other)
+    if meal:
+        return render_template('tally.html', meal=meal, tally=Response.tally(meal.id),
+                               title='Order Summary')
 
-            cur.append(entry.note)
-            cur.append(entry.timestamp)
+    flash('Could not find that meal!', 'danger')
+    return redirect(url_for('main.meal_list'))
 
-            writer.writerow(cur)
+@bp.route('/tally/<meal_id>/json')
+@login_required
+@query_budget(5)
+def tally_json(meal_id):
 
-        response = make_response(csv_io.getvalue())
-        response.headers['Content-type'] = 'text/csv'
-        response.headers['Content-Disposition'] =\
-            f'attachment; filename={meal.date} {meal.meal_type.name}.csv'
+    if db.session.query(Meal.id).filter(Meal.id == meal_id).scalar() is None:
+        return jsonify({}), 404
 
-        return response
+    return jsonify(Response.tally(meal_id))
+
+@bp.route('/live/<meal_id>')
+@login_required
+def live(meal_id):
+    """Show a dashboard of a meal's signups as they come in."""
+
+    meal = Meal.query.get(meal_id)
+
+    if meal:
+        return render_template('live.html', meal=meal, title='Live Signups')
 
     flash('Could not find that meal!', 'danger')
     return redirect(url_for('main.meal_list'))
 
+@bp.route('/live/<meal_id>/events')
+@login_required
+@query_budget(2)
+def live_events(meal_id):
+    """Stream a meal's tally and new responses as Server-Sent Events."""
+
+    if db.session.query(Meal.id).filter(Meal.id == meal_id).scalar() is None:
+        return jsonify({}), 404
+
+    config = current_app.config
+    feed = change_feed()
+
+    try:
+        subscription = feed.subscribe(int(meal_id))
+    except FeedFull:
+        return jsonify({}), 503, {'Retry-After': int(config['LIVE_KEEPALIVE'])}
+
+    def stream():
+        deadline = time.monotonic() + config['LIVE_STREAM_MAX_AGE']
+
+        try:
+            yield f"retry: {int(config['LIVE_POLL_INTERVAL'] * 1000)}\n\n"
+
+            while not subscription.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+
+                event = subscription.get(min(config['LIVE_KEEPALIVE'], remaining))
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+
+                yield format_event(event)
+
+                if event['event'] == 'closed':
+                    return
+        finally:
+            feed.unsubscribe(subscription)
+
+    response = current_app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+
+    return response
+
 @bp.route('/sides/<food_id>')
+@query_budget(2)
 def sides(food_id):
 
-    food = Food.query.get(food_id)
+    version = db.session.query(Food.version).filter(Food.id == food_id).scalar()
+
+    if version is None:
+        return jsonify({'sides': []}), 404
 
-    side_list = [
-        {
-            'id': side.id,
-            'label': side.label,
-            'description': side.description
-        } for side in food.sides.order_by(Side.label).all()
-    ]
+    def build():
+        side_list = side_options(
+            Side.query.join(food_side, food_side.c.side_id == Side.id)\
+                .filter(food_side.c.food_id == food_id).order_by(Side.label).all()
+        )
 
-    # Can only get "other" side if we have at least one side
-    if side_list:
-        side_list.append({
-            'id': 0,
-            'label': 'Other',
-            'description': 'Choose another side.'
-        })
+        return {'sides': side_list}
 
-    return jsonify({'sides': side_list})
+    return conditional_json(f'food-{food_id}-{version}', build)
 
 # Meal Management 
 # region
 @bp.route('/meal_list')
 @login_required
+@query_budget(3)
 def meal_list():
     form = MealDeleteForm()
-    meals = Meal.query.order_by(Meal.date).all()
+    meals = Meal.query.options(db.joinedload(Meal.meal_type)).order_by(Meal.date).all()
 
     return render_template('meal_list.html', meals=meals, title='Meals List', form=form)
 
@@ -189,19 +317,21 @@ def meal_edit(meal_id=None):
             meal = Meal(
                 restaurant=form.restaurant.data,
                 date=form.date.data,
-                registration_open=form.registration_open.data
+                registration_open=form.registration_open.data,
+                registration_close=form.registration_close.data
             )
 
             meal_type = MealType.query.get(form.meal_type.data)
             meal.meal_type = meal_type
 
-            for drink_id in form.drinks.data: 
-                meal.drinks.append(Drink.query.get(drink_id))
-            for food_id in form.foods.data: 
-                meal.foods.append(Food.query.get(food_id))
-
             db.session.add(meal)
+            db.session.flush()
+
+            sync_association(meal_drink, meal.id, Drink, form.drinks.data)
+            sync_association(meal_food, meal.id, Food, form.foods.data)
+
             db.session.commit()
+            invalidate_open_meals()
 
             flash(f'{meal_type.name} for {meal.date} was successfully created!', 'success')
             return redirect(url_for('main.meal_list'))
@@ -213,25 +343,24 @@ def meal_edit(meal_id=None):
         meal = Meal.query.get(meal_id)
 
         if form.validate_on_submit():
+            # A template has one meal per date, so moving onto another's leaves the series
+            if meal.template_id is not None and form.date.data != meal.date and \
+                    taken_dates(meal.template_id, [form.date.data]):
+                meal.template_id = None
+
             meal.meal_type = MealType.query.get(form.meal_type.data)
             meal.restaurant = form.restaurant.data
             meal.date = form.date.data
 
-            for drink in meal.drinks.all():
-                meal.drinks.remove(drink)
-
-            for drink_id in form.drinks.data:
-                meal.drinks.append(Drink.query.get(drink_id))
-
-            for food in meal.foods.all():
-                meal.foods.remove(food)
-
-            for food_id in form.foods.data:
-                meal.foods.append(Food.query.get(food_id))
+            sync_association(meal_drink, meal.id, Drink, form.drinks.data)
+            sync_association(meal_food, meal.id, Food, form.foods.data)
 
             meal.registration_open = form.registration_open.data
+            meal.registration_close = form.registration_close.data
+            meal.bump_version()
 
             db.session.commit()
+            invalidate_open_meals()
 
             flash(f'Successfully updated {meal.meal_type.name} on {meal.date}', 'success')
             return redirect(url_for('main.meal_list'))
@@ -244,6 +373,7 @@ def meal_edit(meal_id=None):
                 form.drinks.data = [drink.id for drink in meal.drinks]
                 form.foods.data = [food.id for food in meal.foods]
                 form.registration_open.data = meal.registration_open
+                form.registration_close.data = meal.registration_close
 
             else:
                 flash('You attempted to edit a meal that does not exist.', 'danger')
@@ -263,8 +393,10 @@ def meal_delete():
 
         if meal:
             meal_type_name = meal.meal_type.name
+            delete_responses(meal.id)
             db.session.delete(meal)
             db.session.commit()
+            invalidate_open_meals()
             flash(f'{meal_type_name} on {meal.date} deleted!', 'success')
         else:
             flash('Could not find meal to delete.', 'danger')
@@ -273,6 +405,202 @@ def meal_delete():
     
     return redirect(url_for('main.index'))
 
+@bp.route('/archive_list')
+@login_required
+def archive_list():
+    """List archived meals, with a form for archiving more."""
+
+    form = ArchiveForm()
+    form.before.data = date.today() - timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+
+    archives = MealArchive.query.order_by(MealArchive.date.desc(), MealArchive.id.desc()).all()
+
+    return render_template('archive_list.html', archives=archives, form=form,
+                           restore_form=ArchiveRestoreForm(), title='Archived Meals')
+
+@bp.route('/meal_archive', methods=['POST'])
+@login_required
+def meal_archive():
+    """Archive meals dated before the submitted day."""
+
+    form = ArchiveForm()
+
+    if form.validate_on_submit():
+        count = archive_meals(form.before.data, current_app.config['ARCHIVE_BATCH_MEALS'])
+        flash(f'Archived {count} meals dated before {form.before.data}.', 'success')
+    else:
+        flash('Choose a day to archive meals before.', 'danger')
+
+    return redirect(url_for('main.archive_list'))
+
+@bp.route('/archive_restore', methods=['POST'])
+@login_required
+def archive_restore():
+    """Move an archived meal back into the live tables."""
+
+    form = ArchiveRestoreForm()
+
+    if form.validate_on_submit():
+        archive = MealArchive.query.get(form.archive_id.data)
+
+        if archive:
+            meal = restore_archive(archive)
+            db.session.commit()
+            invalidate_open_meals()
+            flash(f'{archive.meal_type_name} on {meal.date} restored!', 'success')
+            return redirect(url_for('main.meal_list'))
+
+        flash('Could not find that archived meal.', 'danger')
+        return redirect(url_for('main.archive_list'))
+
+    return redirect(url_for('main.index'))
+
+@bp.route('/template_list')
+@login_required
+def template_list():
+    """List meal templates."""
+
+    templates = MealTemplate.query.options(db.joinedload(MealTemplate.meal_type))\
+        .order_by(MealTemplate.name).all()
+
+    return render_template('template_list.html', templates=templates,
+                           form=MealTemplateDeleteForm(), title='Meal Templates')
+
+@bp.route('/template_edit/<template_id>', methods=['GET', 'POST'])
+@bp.route('/template_edit', methods=['GET', 'POST'])
+@login_required
+def template_edit(template_id=None):
+    """Create and edit meal templates."""
+
+    form = MealTemplateForm()
+    form.meal_type.choices = [(meal_type.id, meal_type.name) for meal_type in \
+        MealType.query.order_by(MealType.name).all()]
+    form.drinks.choices = [(drink.id, drink.label) for drink in \
+        Drink.query.order_by(Drink.label).all()]
+    form.foods.choices = [(food.id, food.label) for food in \
+        Food.query.order_by(Food.label).all()]
+
+    if template_id:
+        template = MealTemplate.query.get(template_id)
+
+        if not template:
+            flash('You attempted to edit a meal template that does not exist.', 'danger')
+            return redirect(url_for('main.template_list'))
+    else:
+        template = MealTemplate()
+
+    if form.validate_on_submit():
+        template.name = form.name.data
+        template.meal_type_id = form.meal_type.data
+        template.restaurant = form.restaurant.data
+        template.interval_days = form.interval_days.data
+        template.registration_open_hours = form.registration_open_hours.data
+        template.registration_close_hours = form.registration_close_hours.data
+
+        db.session.add(template)
+        db.session.flush()
+
+        sync_association(meal_template_drink, template.id, Drink, form.drinks.data)
+        sync_association(meal_template_food, template.id, Food, form.foods.data)
+
+        db.session.commit()
+
+        flash(f'Saved the {template.name} template!', 'success')
+        return redirect(url_for('main.template_list'))
+
+    if template_id and request.method == 'GET':
+        form.name.data = template.name
+        form.meal_type.data = template.meal_type_id
+        form.restaurant.data = template.restaurant
+        form.interval_days.data = template.interval_days
+        form.drinks.data = [drink.id for drink in template.drinks]
+        form.foods.data = [food.id for food in template.foods]
+        form.registration_open_hours.data = template.registration_open_hours
+        form.registration_close_hours.data = template.registration_close_hours
+
+    title_message = 'Edit' if template_id else 'Create'
+
+    return render_template('generic_form.html', form=form, title=f'{title_message} Meal Template')
+
+@bp.route('/template_from_meal/<meal_id>', methods=['GET', 'POST'])
+@login_required
+def template_from_meal_route(meal_id):
+    """Save a meal's type, restaurant, menu, and registration window as a template."""
+
+    meal = Meal.query.get(meal_id)
+
+    if not meal:
+        flash('Could not find that meal.', 'danger')
+        return redirect(url_for('main.meal_list'))
+
+    form = MealTemplateNameForm()
+
+    if form.validate_on_submit():
+        template = template_from_meal(meal, form.name.data)
+        db.session.commit()
+
+        flash(f'Saved the {template.name} template!', 'success')
+        return redirect(url_for('main.template_edit', template_id=template.id))
+
+    if request.method == 'GET' and meal.meal_type:
+        form.name.data = meal.meal_type.name
+
+    return render_template('generic_form.html', form=form, title='Save Meal as Template')
+
+@bp.route('/template_generate/<template_id>', methods=['GET', 'POST'])
+@login_required
+def template_generate(template_id):
+    """Create a series of future meals from a template."""
+
+    template = MealTemplate.query.get(template_id)
+
+    if not template:
+        flash('Could not find that meal template.', 'danger')
+        return redirect(url_for('main.template_list'))
+
+    form = SeriesForm()
+
+    if form.validate_on_submit():
+        dates = generate_series(template, form.start.data, form.count.data,
+                                form.interval_days.data)
+        db.session.commit()
+        invalidate_open_meals()
+
+        skipped = form.count.data - len(dates)
+        message = f'Created {len(dates)} meals from the {template.name} template.'
+        if skipped:
+            message += f' Skipped {skipped} dates that already had one.'
+        flash(message, 'success')
+
+        return redirect(url_for('main.meal_list'))
+
+    if request.method == 'GET':
+        form.start.data = next_series_start(template)
+
+    return render_template('generic_form.html', form=form,
+                           title=f'Generate Meals from {template.name}')
+
+@bp.route('/template_delete', methods=['POST'])
+@login_required
+def template_delete():
+    """Delete a meal template (meals generated from it are kept)."""
+
+    form = MealTemplateDeleteForm()
+
+    if form.validate_on_submit():
+        template = MealTemplate.query.get(form.template_id.data)
+
+        if template:
+            db.session.delete(template)
+            db.session.commit()
+            flash(f'{template.name} template deleted!', 'success')
+        else:
+            flash('Could not find the meal template to delete.', 'danger')
+
+        return redirect(url_for('main.template_list'))
+
+    return redirect(url_for('main.index'))
+
 # endregion
 
 # Item management (sides, drinks, foods, etc.)
@@ -335,12 +663,13 @@ def item_edit(item_type, item_id=None):
                     description=form.description.data
                 )
 
+            db.session.add(datum)
+
             # Handle model-specific choice assignment here
             if model == Food:
-                for side_id in form.sides.data:
-                    datum.sides.append(Side.query.get(side_id))
+                db.session.flush()
+                sync_association(food_side, datum.id, Side, form.sides.data)
 
-            db.session.add(datum)
             db.session.commit()
 
             flash(f'{datum.name if model == MealType else datum.label} was created!', 'success')
@@ -376,13 +705,19 @@ def item_edit(item_type, item_id=None):
                 datum.description = form.description.data
 
             if model == Food:
-                for side in datum.sides.all():
-                    datum.sides.remove(side)
-                for side_id in form.sides.data:
-                    datum.sides.append(Side.query.get(side_id))
+                sync_association(food_side, datum.id, Side, form.sides.data)
+                datum.bump_version()
+            elif model == Side:
+                datum.bump_food_versions()
+
+            bump_meal_versions(datum)
 
             db.session.commit()
 
+            # Meal type names are shown in the open meals list
+            if model == MealType:
+                invalidate_open_meals()
+
             flash(f'{datum.name if model == MealType else datum.label} updated!', 'success')
             return redirect(url_for('main.item_list', item_type=item_type))
 
@@ -409,8 +744,17 @@ def item_delete():
         datum = model.query.get(item_id)
 
         if datum:
+            # Foods lose this side once it's gone, so their side lists change
+            if model == Side:
+                datum.bump_food_versions()
+
+            bump_meal_versions(datum)
+
             db.session.delete(datum)
             db.session.commit()
+
+            if model == MealType:
+                invalidate_open_meals()
             flash(f'{datum.name if model == MealType else datum.label} deleted!', 'success')
         else:
             flash('Could not find the specified item.', 'danger')
@@ -418,6 +762,38 @@ def item_delete():
         return redirect(url_for('main.item_list', item_type=item_type.lower()))
 
     return redirect(url_for('main.index'))
+
+@bp.route('/catalog_import', methods=['GET', 'POST'])
+@login_required
+def catalog_import():
+    """Create and update foods, sides, and drinks from an uploaded catalog."""
+
+    form = CatalogImportForm()
+    plan = None
+    errors = []
+
+    if form.validate_on_submit():
+        upload = form.catalog.data
+        file_format = 'json' if upload.filename.lower().endswith('.json') else 'csv'
+
+        try:
+            records = parse_catalog(upload.read().decode('utf-8-sig'), file_format)
+        except (ValueError, csv.Error, UnicodeDecodeError) as error:
+            flash(f'Could not read the catalog: {error}', 'danger')
+            return render_template('catalog_import.html', form=form, title='Import Catalog')
+
+        plan, errors = import_catalog(records, dry_run=form.dry_run.data)
+
+        if errors or plan.errors:
+            flash('The catalog has problems and was not imported.', 'danger')
+        elif form.dry_run.data:
+            flash('Dry run: nothing was changed.', 'info')
+        else:
+            db.session.commit()
+            flash('The catalog was imported!', 'success')
+
+    return render_template('catalog_import.html', form=form, plan=plan, errors=errors,
+                           title='Import Catalog')
 # endregion
 
 def to_type_case(item_type):
@@ -429,4 +805,32 @@ def to_type_case(item_type):
     # Handle underscores
     type_string = re.sub(r'_([a-z])', lambda match: f'{match.group(1).upper()}', type_string)
 
-    return type_string
\ No newline at end of file
+    return type_string
+
+def generate_csv(header, rows):
+    """Yield CSV-encoded lines for the header and each row, one at a time."""
+
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    for row in itertools.chain([header], rows):
+        writer.writerow(row)
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+
+def conditional_json(etag, build):
+    """Return JSON from build() with caching headers, or a 304 if the client's copy is current.
+
+    build() is only called when the client doesn't already have the given ETag.
+    """
+
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = current_app.config['MENU_CACHE_CONTROL']
+
+    return response
@@ -0,0 +1,159 @@
+"""Generating recurring meals from meal templates.
+
+A series is created with a fixed number of statements however many meals it
+has: one query for the dates the template already has meals on (those are
+skipped, so generating a series twice doesn't duplicate it), one executemany
+INSERT for the meals, and one INSERT ... SELECT each copying the template's
+drinks and foods into meal_drink and meal_food inside the database.
+
+A template has at most one meal per date (a unique index on meal template_id
+and date). On SQLite and Postgres the inserts are ON CONFLICT DO NOTHING, so
+a series generated twice at the same moment doesn't fail or copy a menu
+twice either.
+"""
+
+from datetime import date, timedelta
+from app import db
+from app.main.models import Meal, MealTemplate, meal_drink, meal_food, meal_template_drink,\
+    meal_template_food
+from app.main.orders import conflict_insert
+
+# Meal menu columns (meal id, item id) and the template menu columns (template
+# id, item id) they're copied from
+MENU_COLUMNS = [
+    (meal_drink.c.meal_id, meal_drink.c.drink_id,
+     meal_template_drink.c.template_id, meal_template_drink.c.drink_id),
+    (meal_food.c.meal_id, meal_food.c.food_id,
+     meal_template_food.c.template_id, meal_template_food.c.food_id)
+]
+
+def _insert_new(table, index_elements):
+    """Build an INSERT that skips rows already present, where the database supports it."""
+
+    insert = conflict_insert(db.engine.dialect.name)
+
+    if insert is None:
+        return table.insert()
+
+    return insert(table).on_conflict_do_nothing(index_elements=index_elements)
+
+def series_dates(start, count, interval_days):
+    """Get count dates, interval_days apart, beginning with start."""
+
+    return [start + timedelta(days=interval_days * i) for i in range(count)]
+
+def next_series_start(template):
+    """Get the date a new series from a template should start on.
+
+    That's one interval after the template's latest meal, or today if it has
+    none (or its latest meal is in the past).
+    """
+
+    latest = db.session.query(db.func.max(Meal.date))\
+        .filter(Meal.template_id == template.id).scalar()
+    today = date.today()
+
+    if latest is None:
+        return today
+
+    return max(today, latest + timedelta(days=template.interval_days))
+
+def taken_dates(template_id, dates):
+    """Get the set of dates, out of dates, that already have a meal from a template."""
+
+    return {
+        row[0] for row in db.session.query(Meal.date)\
+            .filter(Meal.template_id == template_id, Meal.date.in_(dates))
+    }
+
+def copy_menu(template_id, meal_ids):
+    """Copy a template's drinks and foods onto meals with INSERT ... SELECT.
+
+    meal_ids is a query selecting the ids of meals that don't have a menu yet.
+    Doesn't commit.
+    """
+
+    for meal_column, item_column, template_column, template_item_column in MENU_COLUMNS:
+        db.session.execute(
+            _insert_new(meal_column.table, [meal_column, item_column]).from_select(
+                [meal_column.name, item_column.name],
+                db.select([Meal.id, template_item_column])\
+                    .select_from(Meal.__table__.join(
+                        template_column.table, template_column == Meal.template_id
+                    ))\
+                    .where(template_column == template_id)\
+                    .where(Meal.id.in_(meal_ids))
+            )
+        )
+
+def generate_series(template, start, count, interval_days=None):
+    """Create count meals from a template, interval_days apart (default: the template's).
+
+    Dates that already have a meal from the template are skipped. Returns the
+    dates of the meals created (a date another request fills at the same
+    moment may be reported by both). Doesn't commit.
+    """
+
+    interval_days = interval_days or template.interval_days
+    dates = series_dates(start, count, interval_days)
+
+    taken = taken_dates(template.id, dates)
+    dates = [meal_date for meal_date in dates if meal_date not in taken]
+
+    if not dates:
+        return []
+
+    rows = []
+    for meal_date in dates:
+        registration_open, registration_close = template.registration_window(meal_date)
+        rows.append({
+            'template_id': template.id,
+            'meal_type_id': template.meal_type_id,
+            'restaurant': template.restaurant,
+            'date': meal_date,
+            'registration_open': registration_open,
+            'registration_close': registration_close
+        })
+
+    db.session.execute(_insert_new(Meal.__table__, [Meal.template_id, Meal.date]), rows)
+
+    copy_menu(
+        template.id,
+        db.session.query(Meal.id).filter(Meal.template_id == template.id, Meal.date.in_(dates))
+    )
+
+    return dates
+
+def template_from_meal(meal, name):
+    """Create a template with a meal's type, restaurant, menu, and registration window.
+
+    The menu is copied with INSERT ... SELECT. Doesn't commit.
+    """
+
+    template = MealTemplate(
+        name=name,
+        meal_type_id=meal.meal_type_id,
+        restaurant=meal.restaurant
+    )
+
+    if meal.registration_open and meal.registration_close:
+        start = MealTemplate.registration_start(meal.date)
+        template.registration_open_hours = round(
+            (start - meal.registration_open).total_seconds() / 3600
+        )
+        template.registration_close_hours = round(
+            (start - meal.registration_close).total_seconds() / 3600
+        )
+
+    db.session.add(template)
+    db.session.flush()
+
+    for meal_column, item_column, template_column, template_item_column in MENU_COLUMNS:
+        db.session.execute(
+            template_column.table.insert().from_select(
+                [template_column.name, template_item_column.name],
+                db.select([db.literal(template.id), item_column]).where(meal_column == meal.id)
+            )
+        )
+
+    return template
@@ -0,0 +1,95 @@
+"""In-process snapshots of frequently read, rarely changed data."""
+
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from app.main.models import Meal
+
+# A meal that's open for registration, detached from any database session
+OpenMeal = namedtuple('OpenMeal', [
+    'id',
+    'meal_type',
+    'restaurant',
+    'date',
+    'registration_close',
+    'version'
+])
+
+class OpenMealsSnapshot():
+    """The list of open meals, cached until the next registration boundary.
+
+    The list can only change when a meal opens or closes, or when an admin edits
+    meals. The snapshot expires at the earliest upcoming opening or closing time
+    and is invalidated by meal edits in this process. max_age bounds how long an
+    edit made by another worker process can go unnoticed.
+    """
+
+    def __init__(self, max_age):
+        self.max_age = timedelta(seconds=max_age)
+        self._lock = threading.Lock()
+        self._meals = None
+        self._expires = None
+        self._generation = 0
+
+    def get(self):
+        """Get the open meals, refreshing the snapshot if it has expired."""
+
+        now = datetime.utcnow()
+
+        with self._lock:
+            if self._meals is not None and now < self._expires:
+                return self._meals
+            generation = self._generation
+
+        meals = tuple(
+            OpenMeal(
+                id=meal.id,
+                meal_type=meal.meal_type.name if meal.meal_type else None,
+                restaurant=meal.restaurant,
+                date=meal.date,
+                registration_close=meal.registration_close,
+                version=meal.version
+            ) for meal in Meal.get_open_meals()
+        )
+
+        boundaries = [meal.registration_close for meal in meals]
+        boundaries.append(Meal.get_next_opening())
+        boundaries.append(now + self.max_age)
+
+        # Don't store the result if the snapshot was invalidated while we queried
+        with self._lock:
+            if generation == self._generation:
+                self._meals = meals
+                self._expires = min(boundary for boundary in boundaries if boundary)
+
+        return meals
+
+    def invalidate(self):
+        """Drop the snapshot so the next read rebuilds it."""
+
+        with self._lock:
+            self._meals = None
+            self._expires = None
+            self._generation += 1
+
+def _open_meals_snapshot():
+    """Get the current app's open meals snapshot, creating it on first use."""
+
+    snapshot = current_app.extensions.get('open_meals_snapshot')
+
+    if snapshot is None:
+        snapshot = OpenMealsSnapshot(current_app.config['OPEN_MEALS_MAX_AGE'])
+        current_app.extensions['open_meals_snapshot'] = snapshot
+
+    return snapshot
+
+def open_meals():
+    """Get the meals currently open for registration as OpenMeal tuples."""
+
+    return _open_meals_snapshot().get()
+
+def invalidate_open_meals():
+    """Discard the open meals snapshot after meals have been edited."""
+
+    _open_meals_snapshot().invalidate()
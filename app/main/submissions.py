@@ -0,0 +1,409 @@
+"""Write-coalescing queue for response submissions.
+
+When RESPONSE_QUEUE_ENABLED is set, validated responses are handed to an
+in-process queue instead of being committed by the request. A background
+thread inserts whatever has accumulated every RESPONSE_QUEUE_FLUSH_MS
+milliseconds (or as soon as RESPONSE_QUEUE_BATCH_ROWS are waiting) in a single
+transaction, so a rush of submissions becomes a handful of writes.
+
+Backpressure: at most RESPONSE_QUEUE_MAX_PENDING rows may wait; submitters
+beyond that are turned away rather than queued indefinitely.
+
+Durability: if RESPONSE_QUEUE_JOURNAL_DIR is set, each row is appended to a
+per-process journal before it's acknowledged, and a checkpoint is appended
+after each committed batch. Transient database errors (such as a locked
+SQLite database) are retried with backoff, and rows that still couldn't be
+written go back on the queue. Checkpoints only cover the rows actually
+written, so a row that's never written stays in the journal for replay.
+
+Journals are named after their process's PID, start time, and a random token,
+so a process only ever truncates or removes the journal it created. Journals
+whose process is gone (including ones from an earlier process that had the
+same PID) are replayed by the next queue to start, before it takes the submit
+lock.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.main.orders import insert_responses
+from app.processes import is_alive, parse_process_key, process_key
+
+logger = logging.getLogger(__name__)
+
+# Journal file name prefix; files are named journal-<pid>-<start time>-<token>.jsonl
+JOURNAL_PREFIX = 'journal-'
+
+# How often (seconds) a submitter checks a full queue for room
+SUBMIT_POLL_SECONDS = 0.01
+
+# Attempts at a write failing with a transient error, and the delay (seconds)
+# before the first retry, doubled for each one after
+WRITE_ATTEMPTS = 4
+WRITE_BACKOFF_SECONDS = 0.05
+
+class SubmissionQueue():
+    """Batches response rows into periodic multi-row inserts."""
+
+    def __init__(self, app, batch_rows=100, flush_ms=200, max_pending=2000,
+                 submit_timeout=0.5, journal_dir=None, fsync=True):
+        self.app = app
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_ms / 1000
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+        self.journal_dir = journal_dir
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._pid = None
+        self._prepare_lock = threading.Lock()
+        self._prepared_pid = None
+        self._journal_name = None
+
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+
+        atexit.register(self.close)
+
+    def _start(self):
+        """Start (or, after a fork, restart) the flusher for this process.
+
+        Threads don't survive fork, so each worker starts its own on first use.
+        Caller holds the lock.
+        """
+
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._sequence = 0
+        # Every row up to _written_through has been written, and so have those
+        # in _written beyond it
+        self._written_through = 0
+        self._written = set()
+        self._journal = None
+        self._closed = False
+
+        if self.journal_dir:
+            self._journal = open(self._journal_path(), 'a')
+
+        self._thread = threading.Thread(
+            target=self._run, name='response-queue-flusher', daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, row):
+        """Queue a validated response row.
+
+        Returns False if the queue is full (the caller should ask the submitter
+        to try again) and True once the row has been accepted.
+        """
+
+        row = dict(row, timestamp=row.get('timestamp') or datetime.utcnow())
+        deadline = time.monotonic() + self.submit_timeout
+
+        if self._prepared_pid != os.getpid():
+            self._prepare()
+
+        # The lock is only held to queue and journal the row, never while waiting
+        # for room, so a full queue doesn't line submitters (or the flusher's
+        # checkpoints) up behind each other
+        while True:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+                try:
+                    self._queue.put_nowait((self._sequence + 1, row))
+                except queue.Full:
+                    pass
+                else:
+                    self._sequence += 1
+
+                    if self._journal:
+                        self._journal_write({'seq': self._sequence, 'row': _serialize(row)})
+
+                    return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            time.sleep(min(remaining, SUBMIT_POLL_SECONDS))
+
+    def _prepare(self):
+        """Name this process's journal and replay the journals of dead processes.
+
+        Runs once per process, before the submit lock is first taken, so the
+        replayed rows are written without holding it.
+        """
+
+        with self._prepare_lock:
+            if self._prepared_pid == os.getpid():
+                return
+
+            self._journal_name = f'{JOURNAL_PREFIX}{process_key()}-{uuid.uuid4().hex[:8]}.jsonl'
+
+            if self.journal_dir:
+                self._replay_orphaned_journals()
+
+            self._prepared_pid = os.getpid()
+
+    def pending(self):
+        """Get the number of rows waiting to be written."""
+
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued row has been written (or timeout passes)."""
+
+        if self._pid == os.getpid():
+            deadline = time.monotonic() + timeout
+            while self._queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+    def close(self):
+        """Write out anything still queued and stop the flusher."""
+
+        if self._pid == os.getpid() and not self._closed:
+            self.flush()
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+
+            # Keep the journal for replay if anything is still unwritten
+            if self._journal:
+                self._journal.close()
+                if self._written_through == self._sequence:
+                    os.remove(self._journal_path())
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            # Gather more rows until the batch is full or the flush interval passes
+            batch = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+
+            written = set()
+            try:
+                written = self._write(batch)
+                self._checkpoint(written)
+            finally:
+                self._requeue([item for item in batch if item[0] not in written])
+
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _checkpoint(self, written):
+        """Record written rows, and checkpoint the journal up to the ones written so far."""
+
+        with self._lock:
+            self._written.update(written)
+            while self._written_through + 1 in self._written:
+                self._written_through += 1
+                self._written.discard(self._written_through)
+
+            if self._journal and written:
+                entry = {'committed': self._written_through}
+                if self._written:
+                    entry['written'] = sorted(self._written)
+                self._journal_write(entry)
+
+                if self._written_through == self._sequence:
+                    self._journal.truncate(0)
+
+    def _requeue(self, items):
+        """Queue rows a transient error kept from being written to be tried again."""
+
+        for item in items:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                logger.warning('No room to retry queued response %d; it stays in the journal',
+                               item[0])
+
+    def _write(self, items):
+        """Insert (seq, row) items, returning the seqs of those that are done.
+
+        The rows are inserted in one transaction, falling back to one at a time
+        if that fails. Transient errors are retried with backoff; rows that still
+        fail with one aren't done, so they stay in the journal. Rows failing for
+        any other reason are logged and dropped.
+        """
+
+        with self.app.app_context():
+            try:
+                _insert_with_retries([row for _, row in items])
+                return {seq for seq, _ in items}
+            except OperationalError:
+                logger.exception('Batch of %d queued responses failed; will retry', len(items))
+                return set()
+            except Exception: #pylint: disable=broad-except
+                logger.exception('Batch of %d queued responses failed; retrying singly',
+                                 len(items))
+
+            done = set()
+            for seq, row in items:
+                try:
+                    _insert_with_retries([row])
+                except OperationalError:
+                    logger.exception('Queued response %d failed; will retry', seq)
+                    continue
+                except Exception: #pylint: disable=broad-except
+                    logger.exception('Dropping queued response: %r', row)
+
+                done.add(seq)
+
+            return done
+
+    def _journal_path(self):
+        return os.path.join(self.journal_dir, self._journal_name)
+
+    def _journal_write(self, entry):
+        """Append an entry to this process's journal. Caller holds the lock."""
+
+        self._journal.write(json.dumps(entry) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _replay_orphaned_journals(self):
+        """Insert rows from journals of dead processes that were never committed."""
+
+        for name in os.listdir(self.journal_dir):
+            if not name.startswith(JOURNAL_PREFIX) or not name.endswith('.jsonl'):
+                continue
+
+            # Never replay this process's own journal
+            if name == self._journal_name:
+                continue
+
+            try:
+                pid, started = _journal_owner(name)
+            except ValueError:
+                continue
+
+            # A journal with this process's PID was left by an earlier process
+            if pid != os.getpid() and is_alive(pid, started):
+                continue
+
+            # Claim the journal so only one process replays it
+            path = os.path.join(self.journal_dir, name)
+            claimed = f'{path}.replay-{os.getpid()}'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+
+            rows = {}
+            committed = 0
+            written = set()
+            with open(claimed) as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        continue
+                    if 'committed' in entry:
+                        committed = max(committed, entry['committed'])
+                        written.update(entry.get('written', ()))
+                    else:
+                        rows[entry['seq']] = _deserialize(entry['row'])
+
+            pending = [
+                (seq, row) for seq, row in sorted(rows.items()) \
+                    if seq > committed and seq not in written
+            ]
+            if pending:
+                logger.warning('Replaying %d queued responses from process %d',
+                               len(pending), pid)
+                written.update(self._write(pending))
+
+            if all(seq in written for seq, _ in pending):
+                os.remove(claimed)
+                continue
+
+            # Leave what's still unwritten for the next process to replay
+            with open(claimed, 'a') as journal:
+                journal.write(json.dumps({'committed': committed, 'written': sorted(written)}))
+                journal.write('\n')
+            os.rename(claimed, path)
+
+def _journal_owner(name):
+    """Get the (pid, start time or None) of the process that wrote a journal."""
+
+    parts = name[len(JOURNAL_PREFIX):-len('.jsonl')].split('-')
+
+    # journal-<pid>.jsonl, from before journals were keyed by start time
+    if len(parts) == 1:
+        return int(parts[0]), None
+
+    return parse_process_key(f'{parts[0]}-{parts[1]}')
+
+def _insert_with_retries(rows):
+    """Insert rows and commit, retrying transient errors (OperationalError) with backoff."""
+
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            insert_responses(rows)
+            db.session.commit()
+            return
+        except OperationalError:
+            db.session.rollback()
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+            time.sleep(WRITE_BACKOFF_SECONDS * 2 ** attempt)
+        except Exception:
+            db.session.rollback()
+            raise
+
+def _serialize(row):
+    return dict(row, timestamp=row['timestamp'].isoformat())
+
+def _deserialize(row):
+    return dict(row, timestamp=datetime.fromisoformat(row['timestamp']))
+
+def submission_queue():
+    """Get the current app's submission queue, creating it on first use."""
+
+    submissions = current_app.extensions.get('submission_queue')
+
+    if submissions is None:
+        config = current_app.config
+        submissions = SubmissionQueue(
+            current_app._get_current_object(), #pylint: disable=protected-access
+            batch_rows=config['RESPONSE_QUEUE_BATCH_ROWS'],
+            flush_ms=config['RESPONSE_QUEUE_FLUSH_MS'],
+            max_pending=config['RESPONSE_QUEUE_MAX_PENDING'],
+            submit_timeout=config['RESPONSE_QUEUE_SUBMIT_TIMEOUT'],
+            journal_dir=config['RESPONSE_QUEUE_JOURNAL_DIR'],
+            fsync=config['RESPONSE_QUEUE_FSYNC']
+        )
+        current_app.extensions['submission_queue'] = submissions
+
+    return submissions
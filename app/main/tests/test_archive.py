@@ -0,0 +1,228 @@
+"""Test archiving and restoring past meals."""
+
+import unittest
+from datetime import datetime, timedelta
+from app import db
+from app.main.archive import archive_meals, restore_archive, unpack
+from app.main.models import MealType, Meal, Drink, Food, Side, Response, MealArchive,\
+    MealTemplate, meal_drink, meal_food
+from app.tests.test_utils import ModelTestMixin, RouteTestMixin, StatementCounter
+
+class ArchiveTestMixin():
+    """Creates past meals, each with a menu and a few responses."""
+
+    def add_meal(self, days_ago, responses=3, open_days=None):
+        """Add a meal dated days_ago, closed the day before unless open_days is given."""
+
+        now = datetime.utcnow()
+        date = (now - timedelta(days=days_ago)).date()
+        close = now + timedelta(days=open_days) if open_days else now - timedelta(days=days_ago + 1)
+
+        meal = Meal(
+            meal_type=self.lunch,
+            restaurant='Burger Barn',
+            date=date,
+            registration_open=close - timedelta(days=7),
+            registration_close=close
+        )
+        meal.drinks.append(self.tea)
+        meal.foods.append(self.burger)
+        db.session.add(meal)
+
+        for i in range(responses):
+            db.session.add(Response(
+                first_name=f'First{i}',
+                last_name=f'Last{i}',
+                email=f'person{i}@example.com',
+                meal=meal,
+                food=self.burger,
+                side=self.fries,
+                drink=self.tea if i % 2 else None,
+                drink_other=None if i % 2 else 'Water',
+                note=f'Note {i}'
+            ))
+
+        db.session.commit()
+
+        return meal.id
+
+    def setUp(self):
+        """Create the menu items."""
+
+        super().setUp()
+
+        self.lunch = MealType(name='Lunch')
+        self.tea = Drink(label='Tea')
+        self.fries = Side(label='Fries')
+        self.burger = Food(label='Hamburger')
+        self.burger.sides.append(self.fries)
+
+        db.session.add_all([self.lunch, self.tea, self.fries, self.burger])
+        db.session.commit()
+
+class TestArchive(ArchiveTestMixin, ModelTestMixin, unittest.TestCase):
+    """Tests for moving meals to and from the archive."""
+
+    def test_archive_meals(self):
+        """Past, closed meals move to the archive; recent and open meals stay."""
+
+        old_id = self.add_meal(400)
+        recent_id = self.add_meal(10)
+        open_id = self.add_meal(400, open_days=1)
+
+        cutoff = (datetime.utcnow() - timedelta(days=180)).date()
+        self.assertEqual(1, archive_meals(cutoff))
+
+        self.assertIsNone(Meal.query.get(old_id))
+        self.assertEqual({recent_id, open_id}, {meal.id for meal in Meal.query})
+        self.assertEqual(0, Response.query.filter_by(meal_id=old_id).count())
+        self.assertEqual(0, db.session.query(meal_drink).filter_by(meal_id=old_id).count())
+        self.assertEqual(0, db.session.query(meal_food).filter_by(meal_id=old_id).count())
+
+        archive = MealArchive.query.one()
+        self.assertEqual(old_id, archive.meal_id)
+        self.assertEqual('Lunch', archive.meal_type_name)
+        self.assertEqual('Burger Barn', archive.restaurant)
+        self.assertEqual(3, archive.response_count)
+
+        payload = unpack(archive.data)
+        self.assertEqual([self.tea.id], payload['drinks'])
+        self.assertEqual(['Note 0', 'Note 1', 'Note 2'],
+                         [row['note'] for row in payload['responses']])
+
+    def test_archive_batches(self):
+        """Each batch of meals is archived with the same number of statements."""
+
+        for days_ago in range(400, 410):
+            self.add_meal(days_ago)
+
+        cutoff = (datetime.utcnow() - timedelta(days=180)).date()
+
+        with StatementCounter() as small:
+            archive_meals(cutoff, batch_size=10)
+
+        for days_ago in range(400, 450):
+            self.add_meal(days_ago)
+
+        with StatementCounter() as large:
+            archive_meals(cutoff, batch_size=50)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(60, MealArchive.query.count())
+        self.assertEqual(0, Meal.query.count())
+        self.assertEqual(0, Response.query.count())
+
+    def test_restore(self):
+        """A restored meal gets a new id with its menu and responses intact."""
+
+        old_id = self.add_meal(400)
+        before = Response.tally(old_id)
+        self.add_meal(10)
+
+        archive_meals((datetime.utcnow() - timedelta(days=180)).date())
+        meal = restore_archive(MealArchive.query.one())
+        db.session.commit()
+
+        self.assertEqual(0, MealArchive.query.count())
+        self.assertEqual('Lunch', meal.meal_type.name)
+        self.assertEqual([self.tea.id], [drink.id for drink in meal.drinks])
+        self.assertEqual([self.burger.id], [food.id for food in meal.foods])
+        self.assertEqual(before, Response.tally(meal.id))
+        self.assertEqual(3, meal.responses.count())
+        self.assertEqual(3, meal.response_count)
+        self.assertIsNotNone(meal.responses.first().timestamp)
+
+    def test_restore_template(self):
+        """A restored meal rejoins its template's series if the template and date are free."""
+
+        template = MealTemplate(name='Lunch Series', meal_type=self.lunch)
+        db.session.add(template)
+        meal_ids = [self.add_meal(400), self.add_meal(500)]
+        Meal.query.update({Meal.template_id: template.id})
+        db.session.commit()
+
+        archive_meals((datetime.utcnow() - timedelta(days=180)).date())
+        archives = MealArchive.query.order_by(MealArchive.meal_id).all()
+        self.assertEqual(meal_ids, [archive.meal_id for archive in archives])
+        self.assertEqual(template.id, unpack(archives[0].data)['meal']['template_id'])
+
+        restored = restore_archive(archives[0])
+        db.session.commit()
+        self.assertEqual(template.id, restored.template_id)
+
+        # The template has generated another meal on the second one's date since
+        db.session.add(Meal(meal_type=self.lunch, template_id=template.id,
+                            date=(datetime.utcnow() - timedelta(days=500)).date()))
+        db.session.commit()
+
+        self.assertIsNone(restore_archive(archives[1]).template_id)
+
+    def test_restore_deleted_items(self):
+        """Items deleted since archiving leave the menu; responses keep their labels."""
+
+        self.add_meal(400)
+        archive_meals((datetime.utcnow() - timedelta(days=180)).date())
+
+        db.session.delete(self.tea)
+        db.session.delete(self.lunch)
+        db.session.commit()
+
+        meal = restore_archive(MealArchive.query.one())
+        db.session.commit()
+
+        self.assertEqual('Lunch', meal.meal_type.name)
+        self.assertEqual(0, meal.drinks.count())
+
+        drinks = {row['label']: row['count'] for row in Response.tally(meal.id)['drinks']}
+        self.assertEqual({'Tea': 1, 'Water': 2}, drinks)
+
+class TestArchiveCommands(ArchiveTestMixin, ModelTestMixin, unittest.TestCase):
+    """Tests for the archive-meals and restore-meal commands."""
+
+    def test_archive_and_restore(self):
+        """Meals are archived by age and restored by archive id."""
+
+        self.add_meal(400)
+        self.add_meal(10)
+        runner = self.app.test_cli_runner()
+
+        result = runner.invoke(args=['archive-meals', '--days', '30', '--dry-run'])
+        self.assertIn('1 meals', result.output)
+        self.assertEqual(2, Meal.query.count())
+
+        result = runner.invoke(args=['archive-meals', '--days', '30'])
+        self.assertIn('Archived 1 meals', result.output)
+        self.assertEqual(1, Meal.query.count())
+
+        archive_id = MealArchive.query.one().id
+        result = runner.invoke(args=['restore-meal', str(archive_id)])
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(2, Meal.query.count())
+
+        result = runner.invoke(args=['restore-meal', str(archive_id)])
+        self.assertNotEqual(0, result.exit_code)
+
+class TestArchiveRoutes(ArchiveTestMixin, RouteTestMixin, unittest.TestCase):
+    """Tests for the archive admin pages."""
+
+    def test_archive_and_restore(self):
+        """Admins archive meals before a day and restore them from the archive list."""
+
+        self.add_meal(400)
+        self.login_admin()
+
+        before = (datetime.utcnow() - timedelta(days=30)).date().isoformat()
+        result = self.client.post('/meal_archive', data={'before': before},
+                                  follow_redirects=True)
+
+        self.assertIn(b'Archived 1 meals', result.data)
+        self.assertIn(b'Burger Barn', result.data)
+        self.assertEqual(0, Meal.query.count())
+
+        archive_id = MealArchive.query.one().id
+        result = self.client.post('/archive_restore', data={'archive_id': archive_id},
+                                  follow_redirects=True)
+
+        self.assertIn(b'restored', result.data)
+        self.assertEqual(1, Meal.query.count())
+        self.assertEqual(0, MealArchive.query.count())
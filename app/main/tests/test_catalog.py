@@ -0,0 +1,199 @@
+"""Test importing foods, sides, and drinks from a catalog."""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from app import db
+from app.main.catalog import parse_catalog, import_catalog
+from app.main.models import MealType, Meal, Drink, Food, Side
+from app.tests.test_utils import ModelTestMixin, RouteTestMixin, StatementCounter
+
+CSV_CATALOG = '\n'.join([
+    'type,label,description,sides',
+    'food,Hamburger,Beef on a bun.,Fries;Onion Rings',
+    'food,Chicken,,Rice',
+    'side,Fries,,',
+    'side,Onion Rings,Battered.,',
+    'side,Rice,,',
+    'drink,Tea,Sweet.,'
+])
+
+class CatalogTestMixin():
+    """Creates a meal with a food, a side, and a drink already on its menu."""
+
+    def setUp(self):
+        """Create the existing items."""
+
+        super().setUp()
+
+        burger = Food(label='hamburger')
+        fries = Side(label='Fries')
+        burger.sides.append(fries)
+        tea = Drink(label='Tea', description='Sweet.')
+        meal = Meal(meal_type=MealType(name='Lunch'),
+                    date=datetime.utcnow().date() + timedelta(days=1))
+        meal.foods.append(burger)
+        meal.drinks.append(tea)
+
+        db.session.add_all([burger, fries, tea, meal])
+        db.session.commit()
+
+        self.burger_id = burger.id
+        self.meal_id = meal.id
+
+class TestCatalog(CatalogTestMixin, ModelTestMixin, unittest.TestCase):
+    """Tests for planning and applying catalog imports."""
+
+    def test_parse(self):
+        """CSV and JSON catalogs are read into the same records."""
+
+        from_csv = parse_catalog(CSV_CATALOG, 'csv')
+        from_json = parse_catalog(json.dumps({
+            'foods': [{'label': 'Hamburger', 'description': 'Beef on a bun.',
+                       'sides': ['Fries', 'Onion Rings']}],
+        }), 'json')
+
+        self.assertEqual(['Fries', 'Onion Rings'], from_csv[0]['sides'])
+        self.assertIsNone(from_csv[2]['sides'])
+        self.assertEqual('food', from_json[0]['type'])
+        self.assertEqual(from_csv[0]['sides'], from_json[0]['sides'])
+
+        with self.assertRaises(ValueError):
+            parse_catalog('[1, 2]', 'json')
+
+    def test_dry_run(self):
+        """A dry run reports the differences without writing anything."""
+
+        plan, errors = import_catalog(parse_catalog(CSV_CATALOG, 'csv'), dry_run=True)
+
+        self.assertEqual([], errors)
+        self.assertEqual([], plan.errors)
+        self.assertEqual(['Chicken'], plan.created['food'])
+        self.assertEqual(['Hamburger'], plan.updated['food'])
+        self.assertEqual(['Onion Rings', 'Rice'], plan.created['side'])
+        self.assertEqual(1, plan.unchanged['side'])
+        self.assertEqual(1, plan.unchanged['drink'])
+        self.assertEqual((['Onion Rings'], []), plan.links['Hamburger'])
+        self.assertEqual((['Rice'], []), plan.links['Chicken'])
+        self.assertIn('+ food Chicken', plan.details())
+
+        self.assertEqual(1, Food.query.count())
+        self.assertEqual(1, Side.query.count())
+
+    def test_import(self):
+        """Items are upserted and side links synced, bumping the affected versions."""
+
+        import_catalog(parse_catalog(CSV_CATALOG, 'csv'))
+        db.session.commit()
+
+        burger = Food.query.get(self.burger_id)
+        self.assertEqual('Hamburger', burger.label)
+        self.assertEqual('Beef on a bun.', burger.description)
+        self.assertEqual(['Fries', 'Onion Rings'],
+                         sorted(side.label for side in burger.sides))
+        self.assertEqual(2, burger.version)
+        self.assertEqual(2, Meal.query.get(self.meal_id).version)
+
+        chicken = Food.query.filter_by(label='Chicken').one()
+        self.assertEqual(['Rice'], [side.label for side in chicken.sides])
+        self.assertEqual(1, Drink.query.count())
+
+        # Importing the same catalog again changes nothing
+        plan, _ = import_catalog(parse_catalog(CSV_CATALOG, 'csv'))
+        self.assertFalse(plan.changed)
+
+    def test_removed_sides(self):
+        """A food listing sides loses the sides it no longer lists."""
+
+        plan, _ = import_catalog([{'type': 'food', 'label': 'hamburger', 'sides': []}])
+        db.session.commit()
+
+        self.assertEqual(([], ['Fries']), plan.links['hamburger'])
+        self.assertEqual(0, Food.query.get(self.burger_id).sides.count())
+
+    def test_errors(self):
+        """Invalid rows and unknown sides keep the whole catalog from being imported."""
+
+        plan, errors = import_catalog([
+            {'type': 'dessert', 'label': 'Pie'},
+            {'type': 'side', 'label': ''},
+            {'type': 'drink', 'label': 'Tea', 'sides': ['Lemon']},
+            {'type': 'food', 'label': 'Pizza', 'sides': ['Breadsticks']},
+            {'type': 'food', 'label': 'pizza'}
+        ])
+
+        self.assertEqual([0, 1, 2, 4], [error['row'] for error in errors])
+        self.assertEqual(1, len(plan.errors))
+        self.assertEqual(1, Food.query.count())
+
+    def test_bulk_statements(self):
+        """Catalogs are imported with a number of statements independent of their size.
+
+        (Up to the chunk sizes for IN lists and association inserts.)
+        """
+
+        def catalog(size):
+            return [{'type': 'side', 'label': f'Side {i}'} for i in range(size)] + \
+                [{'type': 'food', 'label': f'Food {i}', 'sides': [f'Side {i}', 'Fries']}
+                 for i in range(size)] + \
+                [{'type': 'drink', 'label': f'Drink {i}'} for i in range(size)]
+
+        with StatementCounter() as small:
+            import_catalog(catalog(20))
+        db.session.rollback()
+
+        with StatementCounter() as large:
+            import_catalog(catalog(150))
+        db.session.commit()
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(151, Food.query.count())
+        self.assertEqual(2, Food.query.filter_by(label='Food 149').one().sides.count())
+
+class TestCatalogImport(CatalogTestMixin, RouteTestMixin, unittest.TestCase):
+    """Tests for the catalog upload page and command."""
+
+    def test_upload(self):
+        """A dry run shows the changes; a real import saves them."""
+
+        self.login_admin()
+
+        def upload(dry_run):
+            data = {'catalog': (io.BytesIO(CSV_CATALOG.encode()), 'catalog.csv')}
+            if dry_run:
+                data['dry_run'] = 'y'
+            return self.client.post('/catalog_import', data=data,
+                                    content_type='multipart/form-data')
+
+        result = upload(dry_run=True)
+        self.assertIn(b'Dry run', result.data)
+        self.assertIn(b'+ food Chicken', result.data)
+        self.assertEqual(1, Food.query.count())
+
+        result = upload(dry_run=False)
+        self.assertIn(b'imported', result.data)
+        self.assertEqual(2, Food.query.count())
+
+    def test_command(self):
+        """The import-catalog command reads CSV and JSON files."""
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'catalog.json')
+        with open(path, 'w') as catalog:
+            json.dump({'drinks': [{'label': 'Lemonade'}, {'label': 'Coffee'}]}, catalog)
+
+        runner = self.app.test_cli_runner()
+
+        result = runner.invoke(args=['import-catalog', path, '--dry-run'])
+        self.assertIn('Drinks: 2 new', result.output)
+        self.assertEqual(1, Drink.query.count())
+
+        result = runner.invoke(args=['import-catalog', path])
+        self.assertEqual(0, result.exit_code)
+        self.assertEqual(3, Drink.query.count())
+
+        os.remove(path)
+        os.rmdir(directory)
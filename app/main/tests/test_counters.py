@@ -0,0 +1,302 @@
+"""Test the per-meal response counters."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from app import create_app, db
+from app.main import counters
+from app.main.counters import recount
+from app.main.models import MealType, Meal, Drink, Food, Side, Response, ChoiceCount
+from app.main.orders import insert_responses
+from app.tests.test_utils import ModelTestConfig, ModelTestMixin, RouteTestMixin,\
+    StatementCounter
+
+class CounterTestMixin():
+    """Creates a meal with a small menu."""
+
+    def setUp(self):
+        """Create the meal and its menu."""
+
+        super().setUp()
+
+        self.burger = Food(label='Hamburger')
+        self.chicken = Food(label='Chicken')
+        self.fries = Side(label='Fries')
+        self.tea = Drink(label='Tea')
+        self.meal = Meal(
+            meal_type=MealType(name='Lunch'),
+            date=datetime.utcnow().date() + timedelta(days=1)
+        )
+
+        db.session.add_all([self.burger, self.chicken, self.fries, self.tea, self.meal])
+        db.session.commit()
+
+        self.meal_id = self.meal.id
+
+    def assert_counts(self, responses, foods, sides=None, drinks=None):
+        """Check the meal's counters."""
+
+        counts = ChoiceCount.for_meal(self.meal_id)
+
+        self.assertEqual(responses, Meal.query.get(self.meal_id).response_count)
+        self.assertEqual(foods, counts['food'])
+        self.assertEqual(sides or {}, counts['side'])
+        self.assertEqual(drinks or {}, counts['drink'])
+
+class TestCounters(CounterTestMixin, ModelTestMixin, unittest.TestCase):
+    """Counters follow responses written through insert_responses() and the ORM."""
+
+    def row(self, email, food=None, food_other=None, side=None):
+        """Build a response row."""
+
+        return {
+            'meal_id': self.meal_id,
+            'first_name': 'First',
+            'last_name': 'Last',
+            'email': email,
+            'food_id': food.id if food else None,
+            'food_other': food_other,
+            'side_id': side.id if side else None
+        }
+
+    def test_insert_responses(self):
+        """Inserted rows are counted; replaced rows move their choices."""
+
+        insert_responses([
+            self.row('a@example.com', self.burger, side=self.fries),
+            self.row('b@example.com', self.burger),
+            self.row('c@example.com', food_other='Steak'),
+            self.row(None, self.chicken)
+        ])
+        db.session.commit()
+
+        self.assert_counts(4, {self.burger.id: 2, self.chicken.id: 1, 0: 1},
+                           sides={self.fries.id: 1})
+
+        insert_responses([
+            self.row('A@example.com', self.chicken),
+            self.row('d@example.com', food_other='Soup')
+        ])
+        db.session.commit()
+
+        self.assert_counts(5, {self.burger.id: 1, self.chicken.id: 2, 0: 2})
+
+    def test_orm_writes(self):
+        """Responses added, changed, and deleted through the ORM are counted."""
+
+        response = Response(first_name='First', last_name='Last', meal_id=self.meal_id,
+                            food=self.burger, drink=self.tea)
+        db.session.add(response)
+        db.session.commit()
+
+        self.assert_counts(1, {self.burger.id: 1}, drinks={self.tea.id: 1})
+
+        response.food = None
+        response.food_other = 'Steak'
+        response.note = 'Medium rare'
+        db.session.commit()
+
+        self.assert_counts(1, {0: 1}, drinks={self.tea.id: 1})
+
+        db.session.delete(Response.query.one())
+        db.session.commit()
+
+        self.assert_counts(0, {})
+
+    def test_meal_delete(self):
+        """Deleting a meal deletes its choice counts."""
+
+        insert_responses([self.row('a@example.com', self.burger)])
+        db.session.commit()
+
+        db.session.delete(Meal.query.get(self.meal_id))
+        db.session.commit()
+
+        self.assertEqual(0, ChoiceCount.query.count())
+
+    def test_recount(self):
+        """Drifted counters are rebuilt from the responses."""
+
+        insert_responses([
+            self.row('a@example.com', self.burger, side=self.fries),
+            self.row('b@example.com', food_other='Steak'),
+            self.row('c@example.com', food_other='')
+        ])
+        db.session.commit()
+
+        Meal.query.update({Meal.response_count: 42})
+        ChoiceCount.query.update({ChoiceCount.count: 7})
+        db.session.add(ChoiceCount(meal_id=self.meal_id, kind='drink', item_id=1, count=3))
+        db.session.commit()
+
+        recount([self.meal_id])
+        db.session.commit()
+
+        self.assert_counts(3, {self.burger.id: 1, 0: 1}, sides={self.fries.id: 1})
+
+    def test_recount_command(self):
+        """The recount-responses command rebuilds every meal's counters."""
+
+        insert_responses([self.row('a@example.com', self.burger)])
+        Meal.query.update({Meal.response_count: 0})
+        db.session.commit()
+        burger_id = self.burger.id
+
+        result = self.app.test_cli_runner().invoke(args=['recount-responses'])
+
+        self.assertEqual(0, result.exit_code)
+        self.assert_counts(1, {burger_id: 1})
+
+class TestConcurrentCounters(unittest.TestCase):
+    """Counters stay right when requests for the same email race."""
+
+    def setUp(self):
+        """Create an app using an SQLite file shared by several threads."""
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+        class FileConfig(ModelTestConfig):
+            """App config using an SQLite file."""
+
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp_dir, 'test.db')}"
+
+        self.app = create_app(FileConfig)
+
+        with self.app.app_context():
+            db.create_all()
+            meal = Meal(meal_type=MealType(name='Lunch'), date=datetime.utcnow().date())
+            db.session.add(meal)
+            db.session.commit()
+            self.meal_id = meal.id
+
+    def tearDown(self):
+        """Remove the database file."""
+
+        with self.app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_racing_first_responses(self):
+        """Two first responses from one email count once, however they interleave."""
+
+        read = counters.replaced_responses
+
+        def slow_read(rows):
+            # Give the other request time to write between this one's read and upsert
+            stored = read(rows)
+            time.sleep(0.2)
+            return stored
+
+        def respond(food_other):
+            with self.app.app_context():
+                insert_responses([{
+                    'meal_id': self.meal_id,
+                    'first_name': 'First',
+                    'last_name': 'Last',
+                    'email': 'same@example.com',
+                    'food_other': food_other
+                }])
+                db.session.commit()
+
+        with mock.patch('app.main.orders.replaced_responses', slow_read):
+            threads = [threading.Thread(target=respond, args=(food,)) for food in ['A', 'B']]
+            for thread in threads:
+                thread.start()
+                time.sleep(0.05)
+            for thread in threads:
+                thread.join()
+
+        with self.app.app_context():
+            self.assertEqual(1, Response.query.count())
+            self.assertEqual(1, Meal.query.get(self.meal_id).response_count)
+            self.assertEqual({0: 1}, ChoiceCount.for_meal(self.meal_id)['food'])
+
+class TestCounterRoutes(CounterTestMixin, RouteTestMixin, unittest.TestCase):
+    """The meal list shows counts without counting responses."""
+
+    def test_meal_list(self):
+        """Signup counts come from the meal rows."""
+
+        insert_responses([{
+            'meal_id': self.meal_id,
+            'first_name': 'First',
+            'last_name': 'Last',
+            'email': f'person{i}@example.com',
+            'food_id': self.burger.id
+        } for i in range(12)])
+        db.session.commit()
+
+        self.login_admin()
+
+        with StatementCounter() as statements:
+            result = self.client.get('/meal_list')
+
+        self.assertIn(b'<span class="badge">12</span>', result.data)
+        self.assertFalse(any(
+            'count(' in statement.lower() for statement in statements.statements
+        ))
+
+    def test_meal_delete_foreign_keys(self):
+        """Meals with (even emptied) choice counts delete with foreign keys enforced."""
+
+        def respond(email, food_id):
+            insert_responses([{
+                'meal_id': self.meal_id,
+                'first_name': 'First',
+                'last_name': 'Last',
+                'email': email,
+                'food_id': food_id
+            }])
+            db.session.commit()
+
+        respond('a@example.com', self.burger.id)
+        db.session.delete(Response.query.one())
+        db.session.commit()
+
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA foreign_keys = ON')
+
+        respond('b@example.com', self.chicken.id)
+        self.login_admin()
+
+        result = self.client.post('/meal_delete', data={'meal_id': self.meal_id},
+                                  follow_redirects=True)
+
+        self.assertIn(b'deleted!', result.data)
+        self.assertIsNone(Meal.query.get(self.meal_id))
+        self.assertEqual(0, ChoiceCount.query.count())
+        self.assertEqual(0, Response.query.count())
+
+    def test_meal_delete_statements(self):
+        """Deleting a meal takes the same statements however many responses it has."""
+
+        def delete(responses):
+            meal = Meal(meal_type=MealType.query.first(), date=self.meal.date)
+            db.session.add(meal)
+            db.session.commit()
+            insert_responses([{
+                'meal_id': meal.id,
+                'first_name': 'First',
+                'last_name': 'Last',
+                'email': f'person{i}@example.com',
+                'food_id': self.burger.id
+            } for i in range(responses)])
+            db.session.commit()
+
+            with StatementCounter() as statements:
+                self.client.post('/meal_delete', data={'meal_id': meal.id})
+
+            self.assertIsNone(Meal.query.get(meal.id))
+            return len(statements)
+
+        # The first request also loads the signed-in admin
+        self.login_admin()
+        delete(0)
+
+        self.assertEqual(delete(1), delete(12))
+        self.assertEqual(0, Response.query.count())
@@ -0,0 +1,32 @@
+"""Test the rendered fragment cache."""
+
+import unittest
+from app.main.fragments import FragmentCache
+
+class TestFragmentCache(unittest.TestCase):
+    """Fragments are reused until evicted or expired."""
+
+    def test_lru_eviction(self):
+        """The least recently used fragment is dropped when the cache is full."""
+
+        cache = FragmentCache(max_entries=2, max_age=60)
+        renders = []
+
+        def render(key):
+            renders.append(key)
+            return f'<p>{key}</p>'
+
+        for key in ['a', 'b', 'a', 'c', 'a', 'b']:
+            self.assertEqual(f'<p>{key}</p>', cache.get(key, lambda key=key: render(key)))
+
+        self.assertListEqual(['a', 'b', 'c', 'b'], renders)
+        self.assertEqual(2, len(cache))
+
+    def test_max_age(self):
+        """Fragments older than max_age are rendered again."""
+
+        cache = FragmentCache(max_entries=2, max_age=0)
+
+        cache.get('a', lambda: 'first')
+
+        self.assertEqual('second', cache.get('a', lambda: 'second'))
@@ -0,0 +1,234 @@
+"""Test the live signup dashboard and its change feed."""
+
+import unittest
+from datetime import datetime, timedelta
+from app import db
+from app.main.live import ChangeFeed, FeedFull, change_feed, format_event
+from app.main.models import MealType, Meal, Food
+from app.main.orders import insert_responses
+from app.tests.test_utils import ModelTestMixin, RouteTestMixin, StatementCounter
+
+class LiveTestMixin():
+    """Creates two meals to watch."""
+
+    def setUp(self):
+        """Create the meals."""
+
+        super().setUp()
+
+        burger = Food(label='Hamburger')
+        meals = [
+            Meal(meal_type=MealType(name=name), date=datetime.utcnow().date() + timedelta(days=1))
+            for name in ['Lunch', 'Dinner']
+        ]
+
+        db.session.add_all([burger] + meals)
+        db.session.commit()
+
+        self.burger_id = burger.id
+        self.meal_id, self.other_meal_id = [meal.id for meal in meals]
+
+    def respond(self, email, meal_id=None, food_other=None):
+        """Record a response choosing the hamburger (or an "other" food)."""
+
+        insert_responses([{
+            'meal_id': meal_id or self.meal_id,
+            'first_name': 'First',
+            'last_name': email.split('@')[0],
+            'email': email,
+            'food_id': None if food_other else self.burger_id,
+            'food_other': food_other
+        }])
+        db.session.commit()
+
+def drain(subscription):
+    """Get every event waiting for a subscription."""
+
+    events = []
+    event = subscription.get(0)
+    while event is not None:
+        events.append(event)
+        event = subscription.get(0)
+
+    return events
+
+class TestChangeFeed(LiveTestMixin, ModelTestMixin, unittest.TestCase):
+    """Tests for fanning out changes to subscribers."""
+
+    def setUp(self):
+        """Create a feed whose polling the tests drive themselves."""
+
+        super().setUp()
+
+        self.feed = ChangeFeed(self.app, interval=60, recent=5)
+
+    def test_events(self):
+        """Subscribers get a snapshot, then only what changed."""
+
+        self.respond('paul@example.com')
+        subscription = self.feed.subscribe(self.meal_id)
+
+        self.feed.poll()
+        events = drain(subscription)
+
+        self.assertEqual(['tally', 'response'], [event['event'] for event in events])
+        self.assertEqual(1, events[0]['data']['responses'])
+        self.assertEqual([{'id': self.burger_id, 'label': 'Hamburger', 'count': 1}],
+                         events[0]['data']['foods'])
+        self.assertEqual('paul', events[1]['data']['last_name'])
+        self.assertNotIn('email', events[1]['data'])
+
+        self.feed.poll()
+        self.assertEqual([], drain(subscription))
+
+        self.respond('sam@example.com')
+        self.respond('Paul@example.com', food_other='Steak')
+        self.feed.poll()
+        events = drain(subscription)
+
+        self.assertEqual(['tally', 'response', 'response'], [event['event'] for event in events])
+        self.assertEqual(2, events[0]['data']['responses'])
+        self.assertEqual(['sam', 'Paul'], [event['data']['last_name'] for event in events[1:]])
+        self.assertEqual('Steak', events[2]['data']['food'])
+
+    def test_shared_poll(self):
+        """One query checks every watched meal, however many subscribers there are."""
+
+        subscriptions = [self.feed.subscribe(meal_id) for meal_id in \
+            [self.meal_id, self.other_meal_id] * 10]
+        self.feed.poll()
+
+        self.respond('paul@example.com', meal_id=self.other_meal_id)
+
+        with StatementCounter() as statements:
+            self.feed.poll()
+
+        # The revision check, then the tally and recent responses of the changed meal
+        self.assertEqual(3, len(statements))
+
+        for subscription in subscriptions:
+            events = drain(subscription)
+            if subscription.meal_id == self.meal_id:
+                self.assertEqual(['tally'], [event['event'] for event in events])
+            else:
+                self.assertEqual(['tally', 'tally', 'response'],
+                                 [event['event'] for event in events])
+
+    def test_late_subscriber(self):
+        """A new subscriber to a watched meal gets the latest snapshot without a query."""
+
+        self.respond('paul@example.com')
+        self.respond('sam@example.com')
+        self.feed.subscribe(self.meal_id)
+        self.feed.poll()
+
+        with StatementCounter() as statements:
+            subscription = self.feed.subscribe(self.meal_id)
+
+        self.assertEqual(0, len(statements))
+        self.assertEqual(['tally', 'response', 'response'],
+                         [event['event'] for event in drain(subscription)])
+
+    def test_closed(self):
+        """Subscribers are told when a meal goes away."""
+
+        subscription = self.feed.subscribe(self.meal_id)
+        db.session.delete(Meal.query.get(self.meal_id))
+        db.session.commit()
+
+        self.feed.poll()
+
+        self.assertEqual(['closed'], [event['event'] for event in drain(subscription)])
+
+    def test_overflow(self):
+        """A subscriber that falls behind is marked overflowed instead of buffering."""
+
+        feed = ChangeFeed(self.app, interval=60, recent=5, max_events=2)
+        subscription = feed.subscribe(self.meal_id)
+
+        for i in range(3):
+            self.respond(f'person{i}@example.com')
+
+        feed.poll()
+
+        self.assertTrue(subscription.overflowed)
+
+    def test_max_streams(self):
+        """Viewers past max_streams are refused until someone stops watching."""
+
+        feed = ChangeFeed(self.app, interval=60, recent=5, max_streams=2)
+        first = feed.subscribe(self.meal_id)
+        feed.subscribe(self.other_meal_id)
+
+        with self.assertRaises(FeedFull):
+            feed.subscribe(self.meal_id)
+
+        feed.unsubscribe(first)
+        feed.subscribe(self.meal_id)
+
+    def test_format_event(self):
+        """Events are encoded as Server-Sent Events."""
+
+        self.assertEqual(
+            'event: tally\nid: 3\ndata: {"responses": 1}\n\n',
+            format_event({'event': 'tally', 'id': 3, 'data': {'responses': 1}})
+        )
+
+class TestLiveRoutes(LiveTestMixin, RouteTestMixin, unittest.TestCase):
+    """Tests for the dashboard page and its event stream."""
+
+    def test_dashboard(self):
+        """The dashboard page points the browser at the meal's event stream."""
+
+        self.login_admin()
+
+        result = self.client.get(f'/live/{self.meal_id}')
+
+        self.assertEqual(200, result.status_code)
+        self.assertIn(f'/live/{self.meal_id}/events'.encode(), result.data)
+
+    def test_event_stream(self):
+        """The stream sends the feed's snapshot, then ends at its maximum age."""
+
+        self.app.config['LIVE_STREAM_MAX_AGE'] = 0.2
+        self.app.config['LIVE_KEEPALIVE'] = 0.05
+        self.app.config['LIVE_POLL_INTERVAL'] = 60
+
+        self.respond('paul@example.com')
+        watcher = change_feed().subscribe(self.meal_id)
+        change_feed().poll()
+        self.login_admin()
+
+        result = self.client.get(f'/live/{self.meal_id}/events')
+        body = result.get_data(as_text=True)
+
+        self.assertEqual('text/event-stream', result.mimetype)
+        self.assertIn('event: tally', body)
+        self.assertIn('event: response', body)
+        self.assertIn(': keepalive', body)
+
+        # The stream unsubscribed when it ended
+        change_feed().unsubscribe(watcher)
+        self.assertFalse(change_feed()._subscribers) #pylint: disable=protected-access
+
+    def test_event_stream_full(self):
+        """Streams past the worker's limit are refused with a 503."""
+
+        self.app.config['LIVE_MAX_STREAMS'] = 1
+
+        watcher = change_feed().subscribe(self.other_meal_id)
+        self.login_admin()
+
+        result = self.client.get(f'/live/{self.meal_id}/events')
+
+        self.assertEqual(503, result.status_code)
+        self.assertIn('Retry-After', result.headers)
+
+        change_feed().unsubscribe(watcher)
+
+    def test_event_stream_missing_meal(self):
+        """Streams for unknown meals are refused."""
+
+        self.login_admin()
+
+        self.assertEqual(404, self.client.get('/live/999/events').status_code)
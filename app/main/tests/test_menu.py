@@ -0,0 +1,61 @@
+"""Test loading meal menus."""
+
+import unittest
+from datetime import datetime
+from app import db
+from app.main.models import MealType, Meal, Drink, Food, Side
+from app.main.menu import load_menu
+from app.tests.test_utils import ModelTestMixin, StatementCounter
+
+class TestLoadMenu(ModelTestMixin, unittest.TestCase):
+    """Tests for the menu loader."""
+
+    def test_load_menu(self):
+        """Foods, sides, and drinks are loaded in a fixed number of queries."""
+
+        burger = Food(label='Hamburger')
+        chicken = Food(label='Chicken')
+        salad = Food(label='Salad')
+        fries = Side(label='Fries')
+        rice = Side(label='Rice')
+        slaw = Side(label='Coleslaw')
+        tea = Drink(label='Tea')
+        coffee = Drink(label='Coffee')
+
+        for side in [fries, slaw]:
+            burger.sides.append(side)
+        chicken.sides.append(rice)
+
+        meal = Meal(meal_type=MealType(name='Lunch'), date=datetime.utcnow().date())
+        for food in [burger, chicken, salad]:
+            meal.foods.append(food)
+        for drink in [tea, coffee]:
+            meal.drinks.append(drink)
+
+        db.session.add_all([meal, burger, chicken, salad, fries, rice, slaw, tea, coffee])
+        db.session.commit()
+        meal_id, burger_id, chicken_id, salad_id, rice_id = \
+            meal.id, burger.id, chicken.id, salad.id, rice.id
+
+        with StatementCounter() as statements:
+            menu = load_menu(meal_id)
+
+        self.assertEqual(3, len(statements))
+
+        self.assertEqual('Lunch', menu.meal_type)
+        self.assertListEqual(['Hamburger', 'Chicken', 'Salad'], [food.label for food in menu.foods])
+        self.assertListEqual(['Coffee', 'Tea'], [drink.label for drink in menu.drinks])
+        self.assertListEqual(['Coleslaw', 'Fries'], [side.label for side in menu.sides[burger_id]])
+        self.assertEqual((), menu.sides[salad_id])
+
+        self.assertListEqual([(rice_id, 'Rice'), ("0", "Other")], menu.side_choices(chicken_id))
+        self.assertListEqual([], menu.side_choices(salad_id))
+        self.assertListEqual(menu.side_choices(burger_id), menu.side_choices(None))
+
+        with self.assertRaises(TypeError):
+            menu.sides[burger_id] = ()
+
+    def test_load_missing_menu(self):
+        """Missing meals have no menu."""
+
+        self.assertIsNone(load_menu(999))
@@ -5,8 +5,9 @@ from datetime import datetime, timedelta
 from config import Config
 from app import create_app
 from app import db
-from app.main.models import MealType, Meal, Drink, Food, Side, Response
-from app.tests.test_utils import ModelTestMixin
+from app.main.models import MealType, Meal, Drink, Food, Side, Response, meal_drink,\
+    sync_association
+from app.tests.test_utils import ModelTestMixin, StatementCounter
 
 class TestMealsAndTypes(ModelTestMixin, unittest.TestCase):
     """Tests for the meal type model."""
@@ -233,6 +234,37 @@ class TestManyManyRelationships(ModelTestMixin, unittest.TestCase):
         rice_foods = rice.foods.order_by(Food.label).all()
         self.assertListEqual([hamburger, chicken], rice_foods)
 
+    def test_sync_association(self):
+        """Association rows are synced with one validation query and bulk writes."""
+
+        drinks = [Drink(label=f'Drink {i}') for i in range(30)]
+        meal = Meal(meal_type=MealType(name='Lunch'), date=datetime.utcnow().date())
+
+        for drink in drinks[:20]:
+            meal.drinks.append(drink)
+
+        db.session.add_all([meal] + drinks)
+        db.session.commit()
+
+        meal_id = meal.id
+        drink_ids = [drink.id for drink in drinks]
+
+        with StatementCounter() as statements:
+            missing = sync_association(meal_drink, meal_id, Drink, drink_ids[10:] + [999])
+
+        self.assertSetEqual({999}, missing)
+        self.assertEqual(4, len(statements))
+
+        self.assertSetEqual(
+            set(drink_ids[10:]),
+            {drink.id for drink in Meal.query.get(meal_id).drinks}
+        )
+
+        with StatementCounter() as statements:
+            sync_association(meal_drink, meal_id, Drink, drink_ids[10:])
+
+        self.assertEqual(2, len(statements))
+
 class TestResponse(ModelTestMixin, unittest.TestCase):
     """Verify the response object."""
 
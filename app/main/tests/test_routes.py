@@ -0,0 +1,525 @@
+"""Test core app routes."""
+
+import csv
+import io
+import json
+import re
+import unittest
+from datetime import datetime, timedelta
+from flask import g
+from app import db
+from app.main.fragments import CSRF_SENTINEL
+from app.main.models import MealType, Meal, Drink, Food, Side, Response, ChoiceCount
+from app.tests.test_utils import RouteTestMixin, StatementCounter
+
+class TestResponsesExport(RouteTestMixin, unittest.TestCase):
+    """Tests for the streaming CSV export of meal responses."""
+
+    def setUp(self):
+        """Create a meal with a handful of responses."""
+
+        super().setUp()
+
+        self.meal = Meal(
+            meal_type=MealType(name='Lunch'),
+            date=datetime.utcnow().date() + timedelta(days=1)
+        )
+        burger = Food(label='Hamburger')
+        fries = Side(label='Fries')
+        tea = Drink(label='Tea')
+
+        db.session.add_all([self.meal, burger, fries, tea])
+
+        for i in range(25):
+            response = Response(
+                first_name=f'First{i}',
+                last_name=f'Last{i}',
+                email=f'person{i}@example.com',
+                meal=self.meal
+            )
+
+            if i % 2:
+                response.food = burger
+                response.side = fries
+                response.drink = tea
+            else:
+                response.food_other = 'Steak'
+                response.side_other = 'Salad'
+                response.drink_other = 'Water'
+
+            db.session.add(response)
+
+        db.session.commit()
+
+        self.meal_id = self.meal.id
+
+    def test_export_rows(self):
+        """Labels are joined in and "other" values are used as a fallback."""
+
+        result = self.client.get(f'/responses/{self.meal_id}')
+
+        self.assertEqual('text/csv', result.mimetype)
+        self.assertIn('Lunch.csv', result.headers['Content-Disposition'])
+
+        rows = list(csv.reader(io.StringIO(result.get_data(as_text=True))))
+
+        self.assertEqual(26, len(rows))
+        self.assertEqual('First Name', rows[0][0])
+        self.assertListEqual(['Steak', 'Salad', 'Water'], rows[1][3:6])
+        self.assertListEqual(['Hamburger', 'Fries', 'Tea'], rows[2][3:6])
+
+    def test_export_query_count(self):
+        """The export issues a fixed number of statements regardless of size."""
+
+        with StatementCounter() as statements:
+            self.client.get(f'/responses/{self.meal_id}').get_data()
+
+        self.assertEqual(2, len(statements))
+
+    def test_export_missing_meal(self):
+        """Unknown meals redirect back to the meal list."""
+
+        result = self.client.get('/responses/999')
+
+        self.assertEqual(302, result.status_code)
+
+class TestRespond(RouteTestMixin, unittest.TestCase):
+    """Tests for the meal sign-up page."""
+
+    def setUp(self):
+        """Create a meal with a small menu."""
+
+        super().setUp()
+
+        self.burger = Food(label='Hamburger', description='Beef on a bun.')
+        self.chicken = Food(label='Chicken')
+        self.fries = Side(label='Fries')
+        self.rice = Side(label='Rice')
+        self.tea = Drink(label='Tea')
+
+        self.burger.sides.append(self.fries)
+        self.chicken.sides.append(self.rice)
+
+        meal = Meal(
+            meal_type=MealType(name='Lunch'),
+            restaurant='Burger Barn',
+            date=datetime.utcnow().date() + timedelta(days=1),
+            registration_open=datetime.utcnow() - timedelta(days=1),
+            registration_close=datetime.utcnow() + timedelta(days=1)
+        )
+        meal.foods.append(self.burger)
+        meal.foods.append(self.chicken)
+        meal.drinks.append(self.tea)
+
+        db.session.add_all([meal, self.burger, self.chicken, self.fries, self.rice, self.tea])
+        db.session.commit()
+
+        self.meal_id = meal.id
+
+    def test_respond_get(self):
+        """The sign-up page lists the menu, which is cached after the first request."""
+
+        with StatementCounter() as statements:
+            result = self.client.get(f'/respond/{self.meal_id}')
+
+        page = result.get_data(as_text=True)
+
+        self.assertEqual(200, result.status_code)
+        self.assertIn('Burger Barn', page)
+        self.assertIn('Hamburger (Beef on a bun.)', page)
+        self.assertIn('Fries', page)
+        self.assertEqual(4, len(statements))
+
+        with StatementCounter() as statements:
+            cached = self.client.get(f'/respond/{self.meal_id}').get_data(as_text=True)
+
+        self.assertEqual(page, cached)
+        self.assertEqual(1, len(statements))
+
+    def test_respond_cache_invalidation(self):
+        """Editing a meal or an item on its menu re-renders the sign-up page."""
+
+        self.login_admin()
+        self.client.get(f'/respond/{self.meal_id}')
+
+        self.client.post(f'/item_edit/food/{self.burger.id}', data={
+            'label': 'Cheeseburger',
+            'description': 'Beef on a bun.',
+            'sides': [self.fries.id]
+        })
+
+        page = self.client.get(f'/respond/{self.meal_id}').get_data(as_text=True)
+
+        self.assertIn('Cheeseburger (Beef on a bun.)', page)
+        self.assertEqual(2, Meal.query.get(self.meal_id).version)
+
+    def test_respond_csrf_token(self):
+        """Cached forms carry each user's own CSRF token."""
+
+        self.app.config['WTF_CSRF_ENABLED'] = True
+
+        tokens = []
+        for _ in range(2):
+            # Tests share one app context, where Flask-WTF keeps the current token
+            g.pop('csrf_token', None)
+
+            client = self.app.test_client()
+            page = client.get(f'/respond/{self.meal_id}').get_data(as_text=True)
+            tokens.append(re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page)\
+                .group(1))
+
+        self.assertNotIn(CSRF_SENTINEL, tokens)
+        self.assertNotEqual(tokens[0], tokens[1])
+
+    def test_respond_side_map(self):
+        """Side options for every food are embedded in the sign-up page."""
+
+        page = self.client.get(f'/respond/{self.meal_id}').get_data(as_text=True)
+        side_map = json.loads(re.search(
+            r'<script id="side-map" type="application/json">(.*?)</script>', page
+        ).group(1))
+
+        sides = self.client.get(f'/sides/{self.chicken.id}').get_json()['sides']
+
+        self.assertListEqual(sides, side_map[str(self.chicken.id)])
+        self.assertEqual('Fries', side_map[str(self.burger.id)][0]['label'])
+
+    def test_respond_post(self):
+        """Submitting the form records a response for the meal."""
+
+        result = self.client.post(f'/respond/{self.meal_id}', data={
+            'first_name': 'Paul',
+            'last_name': 'Revere',
+            'email': 'paul@rider.com',
+            'meal_id': self.meal_id,
+            'food': self.chicken.id,
+            'side': self.rice.id,
+            'drink': self.tea.id
+        })
+
+        self.assertEqual(302, result.status_code)
+
+        response = Response.query.one()
+        self.assertEqual(self.meal_id, response.meal_id)
+        self.assertEqual(self.chicken, response.food)
+        self.assertEqual(self.rice, response.side)
+
+    def test_respond_resubmit(self):
+        """Resubmitting from the same email replaces the earlier response."""
+
+        for email, food, side in [('paul@rider.com', self.chicken, self.rice),
+                                  ('Paul@Rider.com', self.burger, self.fries)]:
+            self.client.post(f'/respond/{self.meal_id}', data={
+                'first_name': 'Paul',
+                'last_name': 'Revere',
+                'email': email,
+                'meal_id': self.meal_id,
+                'food': food.id,
+                'side': side.id
+            })
+
+        response = Response.query.one()
+        self.assertEqual(self.burger, response.food)
+        self.assertEqual(self.fries, response.side)
+        self.assertEqual('Paul@Rider.com', response.email)
+
+        counts = ChoiceCount.for_meal(self.meal_id)
+        self.assertEqual(1, Meal.query.get(self.meal_id).response_count)
+        self.assertEqual({self.burger.id: 1}, counts['food'])
+        self.assertEqual({self.fries.id: 1}, counts['side'])
+
+    def test_respond_off_menu(self):
+        """Choices that aren't on the meal's menu are rejected."""
+
+        result = self.client.post(f'/respond/{self.meal_id}', data={
+            'first_name': 'Paul',
+            'last_name': 'Revere',
+            'email': 'paul@rider.com',
+            'meal_id': self.meal_id,
+            'food': self.chicken.id,
+            'side': self.fries.id
+        })
+
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(0, Response.query.count())
+
+    def test_bulk_json(self):
+        """Many responses are validated and inserted together."""
+
+        records = [{
+            'first_name': f'First{i}',
+            'last_name': f'Last{i}',
+            'email': f'person{i}@example.com',
+            'food': 'hamburger',
+            'side': 'Fries',
+            'drink': self.tea.id
+        } for i in range(30)]
+        records.append({
+            'first_name': 'Thomas',
+            'last_name': 'Jefferson',
+            'email': 'tom@framers.com',
+            'food_other': 'Filet Mignon'
+        })
+
+        with StatementCounter() as statements:
+            result = self.client.post(f'/respond/{self.meal_id}/bulk', json=records)
+
+        self.assertEqual(201, result.status_code)
+        self.assertEqual(31, result.get_json()['created'])
+        # Menu, write lock, insert, replaced-response check, and two counter updates
+        self.assertEqual(8, len(statements))
+
+        self.assertEqual(30, Response.query.filter_by(side_id=self.fries.id).count())
+        self.assertEqual('Filet Mignon',
+                         Response.query.filter_by(email='tom@framers.com').one().food_other)
+
+        counts = ChoiceCount.for_meal(self.meal_id)
+        self.assertEqual(31, Meal.query.get(self.meal_id).response_count)
+        self.assertEqual({self.burger.id: 30, 0: 1}, counts['food'])
+        self.assertEqual({self.tea.id: 30}, counts['drink'])
+
+    def test_bulk_csv_errors(self):
+        """Per-row errors are reported and nothing is inserted."""
+
+        body = '\n'.join([
+            'first_name,last_name,email,food,side,drink',
+            'Paul,Revere,paul@rider.com,Chicken,Rice,Tea',
+            ',Hancock,john@signers.com,Chicken,Fries,Tea',
+            'Tom,Jefferson,not-an-email,Pizza,,'
+        ])
+
+        result = self.client.post(f'/respond/{self.meal_id}/bulk', data=body,
+                                  content_type='text/csv')
+        errors = result.get_json()['errors']
+
+        self.assertEqual(400, result.status_code)
+        self.assertListEqual([1, 2], [error['row'] for error in errors])
+        self.assertIn('first_name', errors[0]['errors'])
+        self.assertIn('side', errors[0]['errors'])
+        self.assertIn('email', errors[1]['errors'])
+        self.assertIn('food', errors[1]['errors'])
+        self.assertEqual(0, Response.query.count())
+
+    def test_respond_missing_meal(self):
+        """Unknown meals redirect back to the index."""
+
+        self.assertEqual(302, self.client.get('/respond/999').status_code)
+
+    def test_respond_closed(self):
+        """Closed meals can't be signed up for."""
+
+        meal = Meal.query.get(self.meal_id)
+        meal.registration_close = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+
+        self.assertEqual(302, self.client.get(f'/respond/{self.meal_id}').status_code)
+
+        result = self.client.post(f'/respond/{self.meal_id}/bulk', json=[])
+        self.assertEqual(409, result.status_code)
+
+class TestIndex(RouteTestMixin, unittest.TestCase):
+    """Tests for the landing page."""
+
+    def test_open_meals_snapshot(self):
+        """Open meals are listed without querying until a boundary or an edit."""
+
+        lunch = MealType(name='Lunch')
+        now = datetime.utcnow()
+
+        db.session.add_all([
+            Meal(meal_type=lunch, restaurant='Open Diner', date=now.date(),
+                 registration_open=now - timedelta(days=1),
+                 registration_close=now + timedelta(days=1)),
+            Meal(meal_type=lunch, restaurant='Later Cafe', date=now.date(),
+                 registration_open=now + timedelta(days=1),
+                 registration_close=now + timedelta(days=2))
+        ])
+        db.session.commit()
+
+        page = self.client.get('/').get_data(as_text=True)
+
+        self.assertIn('Open Diner', page)
+        self.assertNotIn('Later Cafe', page)
+
+        with StatementCounter() as statements:
+            self.client.get('/')
+
+        self.assertEqual(0, len(statements))
+
+        self.login_admin()
+        self.client.post('/meal_delete', data={'meal_id': 1})
+
+        self.assertNotIn('Open Diner', self.client.get('/').get_data(as_text=True))
+
+class TestSides(RouteTestMixin, unittest.TestCase):
+    """Tests for the side list JSON endpoint."""
+
+    def setUp(self):
+        """Create a food with a couple of sides."""
+
+        super().setUp()
+
+        food = Food(label='Hamburger')
+        self.fries = Side(label='Fries')
+        food.sides.append(self.fries)
+        food.sides.append(Side(label='Coleslaw'))
+
+        db.session.add(food)
+        db.session.commit()
+
+        self.food_id = food.id
+        self.side_id = self.fries.id
+
+    def test_not_modified(self):
+        """Repeat requests with a matching ETag get a 304 without loading sides."""
+
+        first = self.client.get(f'/sides/{self.food_id}')
+
+        self.assertEqual(200, first.status_code)
+        self.assertEqual(['Coleslaw', 'Fries', 'Other'],
+                         [side['label'] for side in first.get_json()['sides']])
+        self.assertEqual('public, max-age=60', first.headers['Cache-Control'])
+
+        etag = first.headers['ETag']
+
+        with StatementCounter() as statements:
+            second = self.client.get(f'/sides/{self.food_id}', headers={'If-None-Match': etag})
+
+        self.assertEqual(304, second.status_code)
+        self.assertEqual(etag, second.headers['ETag'])
+        self.assertEqual(1, len(statements))
+
+    def test_side_edit_changes_etag(self):
+        """Editing or deleting a side changes the ETag of foods offering it."""
+
+        self.login_admin()
+
+        etag = self.client.get(f'/sides/{self.food_id}').headers['ETag']
+
+        self.client.post(f'/item_edit/side/{self.side_id}', data={'label': 'Curly Fries'})
+        result = self.client.get(f'/sides/{self.food_id}', headers={'If-None-Match': etag})
+
+        self.assertEqual(200, result.status_code)
+        self.assertIn('Curly Fries', [side['label'] for side in result.get_json()['sides']])
+
+        etag = result.headers['ETag']
+
+        self.client.post('/item_delete', data={'item_type': 'side', 'item_id': self.side_id})
+        result = self.client.get(f'/sides/{self.food_id}', headers={'If-None-Match': etag})
+
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(2, len(result.get_json()['sides']))
+
+    def test_missing_food(self):
+        """Unknown foods are a 404."""
+
+        self.assertEqual(404, self.client.get('/sides/999').status_code)
+
+class TestTally(RouteTestMixin, unittest.TestCase):
+    """Tests for the per-meal order summary."""
+
+    def test_tally_json(self):
+        """Choices and "other" values are counted per meal."""
+
+        burger = Food(label='Hamburger')
+        fries = Side(label='Fries')
+        tea = Drink(label='Tea')
+        meal = Meal(meal_type=MealType(name='Lunch'), date=datetime.utcnow().date())
+        other_meal = Meal(meal_type=MealType(name='Dinner'), date=datetime.utcnow().date())
+
+        db.session.add_all([
+            Response(first_name='A', last_name='A', meal=meal, food=burger, side=fries,
+                     drink=tea),
+            Response(first_name='B', last_name='B', meal=meal, food=burger,
+                     side_other='Salad', drink=tea),
+            Response(first_name='C', last_name='C', meal=meal, food_other='Steak',
+                     side_other='Salad', drink_other='Water'),
+            Response(first_name='D', last_name='D', meal=other_meal, food=burger)
+        ])
+        db.session.commit()
+        meal_id, burger_id = meal.id, burger.id
+
+        self.login_admin()
+        tally = self.client.get(f'/tally/{meal_id}/json').get_json()
+
+        self.assertEqual(3, tally['responses'])
+        self.assertListEqual([
+            {'id': burger_id, 'label': 'Hamburger', 'count': 2},
+            {'id': None, 'label': 'Steak', 'count': 1}
+        ], tally['foods'])
+        self.assertEqual({'id': None, 'label': 'Salad', 'count': 2}, tally['sides'][0])
+        self.assertEqual(2, tally['drinks'][0]['count'])
+
+        page = self.client.get(f'/tally/{meal_id}').get_data(as_text=True)
+        self.assertIn('Steak <em>(other)</em>', page)
+
+    def test_tally_requires_login(self):
+        """Order summaries are for admins only."""
+
+        self.assertEqual(302, self.client.get('/tally/1/json').status_code)
+
+class TestMealEdit(RouteTestMixin, unittest.TestCase):
+    """Tests for creating and editing meals."""
+
+    def test_create_and_edit(self):
+        """Menu selections are saved and replaced on edit."""
+
+        self.login_admin()
+
+        lunch = MealType(name='Lunch')
+        foods = [Food(label=f'Food {i}') for i in range(4)]
+        drinks = [Drink(label=f'Drink {i}') for i in range(4)]
+        db.session.add_all([lunch] + foods + drinks)
+        db.session.commit()
+
+        food_ids = [food.id for food in foods]
+        drink_ids = [drink.id for drink in drinks]
+
+        result = self.client.post('/meal_edit', data={
+            'meal_type': lunch.id,
+            'date': '2030-01-01',
+            'registration_open': '2029-12-01T08:00',
+            'registration_close': '2029-12-31T12:00',
+            'drinks': drink_ids[:2],
+            'foods': food_ids[:2]
+        })
+        self.assertEqual(302, result.status_code)
+
+        meal = Meal.query.one()
+        self.assertSetEqual(set(food_ids[:2]), {food.id for food in meal.foods})
+        self.assertEqual(datetime(2029, 12, 31, 12), meal.registration_close)
+        meal_id = meal.id
+
+        self.client.post(f'/meal_edit/{meal_id}', data={
+            'meal_type': lunch.id,
+            'date': '2030-01-01',
+            'drinks': drink_ids[1:],
+            'foods': food_ids[3:]
+        })
+
+        meal = Meal.query.get(meal_id)
+        self.assertSetEqual(set(drink_ids[1:]), {drink.id for drink in meal.drinks})
+        self.assertSetEqual(set(food_ids[3:]), {food.id for food in meal.foods})
+
+    def test_registration_window_order(self):
+        """Registration can't close before it opens."""
+
+        self.login_admin()
+
+        lunch = MealType(name='Lunch')
+        food = Food(label='Food')
+        drink = Drink(label='Drink')
+        db.session.add_all([lunch, food, drink])
+        db.session.commit()
+
+        result = self.client.post('/meal_edit', data={
+            'meal_type': lunch.id,
+            'date': '2030-01-01',
+            'registration_open': '2029-12-31T12:00',
+            'registration_close': '2029-12-01T08:00',
+            'drinks': [drink.id],
+            'foods': [food.id]
+        })
+
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(0, Meal.query.count())
@@ -0,0 +1,227 @@
+"""Test meal templates and generating series of meals from them."""
+
+import unittest
+from unittest import mock
+from datetime import date, datetime, timedelta
+from app import db
+from app.main.models import MealType, Meal, Drink, Food, MealTemplate, meal_drink
+from app.main.series import generate_series, next_series_start, template_from_meal
+from app.tests.test_utils import ModelTestMixin, RouteTestMixin, StatementCounter
+
+class SeriesTestMixin():
+    """Creates a Friday lunch template with two drinks and a food."""
+
+    def setUp(self):
+        """Create the template and its menu."""
+
+        super().setUp()
+
+        lunch = MealType(name='Lunch')
+        drinks = [Drink(label='Tea'), Drink(label='Water')]
+        burger = Food(label='Hamburger')
+
+        template = MealTemplate(
+            name='Friday Lunch',
+            meal_type=lunch,
+            restaurant='Burger Barn',
+            interval_days=7,
+            registration_open_hours=168,
+            registration_close_hours=12
+        )
+        template.drinks.extend(drinks)
+        template.foods.append(burger)
+
+        db.session.add(template)
+        db.session.commit()
+
+        self.template_id = template.id
+        self.drink_ids = sorted(drink.id for drink in drinks)
+        self.burger_id = burger.id
+        self.start = date.today() + timedelta(days=3)
+
+class TestSeries(SeriesTestMixin, ModelTestMixin, unittest.TestCase):
+    """Tests for generating meals from templates."""
+
+    def test_generate_series(self):
+        """Meals are created an interval apart with the template's menu and window."""
+
+        template = MealTemplate.query.get(self.template_id)
+        dates = generate_series(template, self.start, 3)
+        db.session.commit()
+
+        self.assertEqual([self.start + timedelta(days=7 * i) for i in range(3)], dates)
+
+        meals = Meal.query.order_by(Meal.date).all()
+        self.assertEqual(dates, [meal.date for meal in meals])
+
+        for meal in meals:
+            self.assertEqual(self.template_id, meal.template_id)
+            self.assertEqual('Lunch', meal.meal_type.name)
+            self.assertEqual('Burger Barn', meal.restaurant)
+            self.assertEqual(self.drink_ids, sorted(drink.id for drink in meal.drinks))
+            self.assertEqual([self.burger_id], [food.id for food in meal.foods])
+            self.assertEqual(1, meal.version)
+            self.assertEqual(0, meal.response_count)
+
+            start = datetime.combine(meal.date, datetime.min.time())
+            self.assertEqual(start - timedelta(hours=168), meal.registration_open)
+            self.assertEqual(start - timedelta(hours=12), meal.registration_close)
+
+    def test_skip_existing(self):
+        """Dates that already have a meal from the template aren't generated again."""
+
+        template = MealTemplate.query.get(self.template_id)
+        generate_series(template, self.start, 2)
+
+        dates = generate_series(template, self.start, 4)
+        db.session.commit()
+
+        self.assertEqual(2, len(dates))
+        self.assertEqual(4, Meal.query.count())
+        self.assertEqual(self.start + timedelta(days=28), next_series_start(template))
+
+        # The menus of the earlier meals weren't copied twice
+        self.assertEqual(2, Meal.query.order_by(Meal.date).first().drinks.count())
+
+    def test_concurrent_series(self):
+        """Meals another request generated after the dates were checked are left alone."""
+
+        template = MealTemplate.query.get(self.template_id)
+        generate_series(template, self.start, 2)
+        db.session.commit()
+
+        with mock.patch('app.main.series.taken_dates', return_value=set()):
+            generate_series(template, self.start, 3)
+        db.session.commit()
+
+        self.assertEqual(3, Meal.query.count())
+        self.assertEqual(6, db.session.query(meal_drink).count())
+
+    def test_series_statements(self):
+        """A series is created with the same number of statements however long it is."""
+
+        template = MealTemplate.query.get(self.template_id)
+
+        with StatementCounter() as short:
+            generate_series(template, self.start, 2, interval_days=1)
+
+        with StatementCounter() as long:
+            generate_series(template, self.start + timedelta(days=10), 40, interval_days=1)
+
+        self.assertEqual(len(short), len(long))
+        self.assertEqual(42, Meal.query.count())
+
+    def test_template_from_meal(self):
+        """A meal's type, restaurant, menu, and registration window are saved as a template."""
+
+        template = MealTemplate.query.get(self.template_id)
+        generate_series(template, self.start, 1)
+        meal = Meal.query.one()
+
+        copy = template_from_meal(meal, 'Copy')
+        db.session.commit()
+
+        self.assertEqual('Lunch', copy.meal_type.name)
+        self.assertEqual('Burger Barn', copy.restaurant)
+        self.assertEqual(self.drink_ids, sorted(drink.id for drink in copy.drinks))
+        self.assertEqual([self.burger_id], [food.id for food in copy.foods])
+        self.assertEqual((168, 12), (copy.registration_open_hours, copy.registration_close_hours))
+
+class TestSeriesRoutes(SeriesTestMixin, RouteTestMixin, unittest.TestCase):
+    """Tests for the meal template pages and command."""
+
+    def test_template_edit(self):
+        """Admins create templates with a menu."""
+
+        self.login_admin()
+
+        result = self.client.post('/template_edit', data={
+            'name': 'Tuesday Dinner',
+            'meal_type': MealTemplate.query.get(self.template_id).meal_type_id,
+            'interval_days': 14,
+            'drinks': self.drink_ids[:1],
+            'foods': [self.burger_id],
+            'registration_open_hours': 48,
+            'registration_close_hours': 24
+        }, follow_redirects=True)
+
+        self.assertIn(b'Tuesday Dinner', result.data)
+
+        template = MealTemplate.query.filter_by(name='Tuesday Dinner').one()
+        self.assertEqual(14, template.interval_days)
+        self.assertEqual(self.drink_ids[:1], [drink.id for drink in template.drinks])
+
+    def test_generate(self):
+        """Admins generate a series of meals from a template."""
+
+        self.login_admin()
+
+        # With no meals from the template yet, the series starts today
+        result = self.client.get(f'/template_generate/{self.template_id}')
+        self.assertIn(date.today().isoformat().encode(), result.data)
+
+        result = self.client.post(f'/template_generate/{self.template_id}', data={
+            'start': self.start.isoformat(),
+            'count': 4
+        }, follow_redirects=True)
+
+        self.assertIn(b'Created 4 meals', result.data)
+        self.assertEqual(4, Meal.query.count())
+
+        result = self.client.post(f'/template_generate/{self.template_id}', data={
+            'start': self.start.isoformat(),
+            'count': 1000
+        })
+
+        self.assertIn(b'Generate between 1 and', result.data)
+        self.assertEqual(4, Meal.query.count())
+
+    def test_meal_edit_leaves_series(self):
+        """Moving a meal onto the date of another from its template takes it out of the series."""
+
+        generate_series(MealTemplate.query.get(self.template_id), self.start, 2)
+        db.session.commit()
+        first, second = Meal.query.order_by(Meal.date).all()
+        self.login_admin()
+
+        self.client.post(f'/meal_edit/{second.id}', data={
+            'meal_type': second.meal_type_id,
+            'date': first.date.isoformat(),
+            'drinks': self.drink_ids,
+            'foods': [self.burger_id]
+        })
+
+        second = Meal.query.get(second.id)
+        self.assertEqual(first.date, second.date)
+        self.assertIsNone(second.template_id)
+        self.assertEqual(self.template_id, Meal.query.get(first.id).template_id)
+
+    def test_template_delete(self):
+        """Deleting a template keeps the meals generated from it."""
+
+        generate_series(MealTemplate.query.get(self.template_id), self.start, 2)
+        db.session.commit()
+        self.login_admin()
+
+        self.client.post('/template_delete', data={'template_id': self.template_id})
+
+        self.assertEqual(0, MealTemplate.query.count())
+        self.assertEqual([None, None], [meal.template_id for meal in Meal.query])
+        self.assertEqual(2, Meal.query.first().drinks.count())
+
+    def test_command(self):
+        """The generate-meals command creates a series from a template."""
+
+        runner = self.app.test_cli_runner()
+
+        result = runner.invoke(args=[
+            'generate-meals', str(self.template_id),
+            '--count', '3', '--start', self.start.isoformat(), '--every', '1'
+        ])
+
+        self.assertEqual(0, result.exit_code)
+        self.assertIn('Created 3 meals', result.output)
+        self.assertEqual(3, Meal.query.count())
+
+        result = runner.invoke(args=['generate-meals', '999', '--count', '3'])
+        self.assertNotEqual(0, result.exit_code)
@@ -0,0 +1,295 @@
+"""Test the write-coalescing submission queue."""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.main.models import MealType, Meal, Food, Response
+from app.main.orders import insert_responses
+from app.main.submissions import SubmissionQueue, submission_queue
+from app.processes import process_key
+from app.tests.test_utils import RouteTestConfig, RouteTestMixin
+
+# A pid that can't belong to a running process
+DEAD_PID = 2147483000
+
+def stalled_write(release):
+    """Build a SubmissionQueue._write that waits for release before reporting success."""
+
+    def write(items):
+        release.wait(5)
+        return {seq for seq, _ in items}
+
+    return write
+
+def locked(first_name):
+    """Patch insert_responses to fail as if the database were locked for one submitter's rows."""
+
+    def insert(rows):
+        if any(row['first_name'] == first_name for row in rows):
+            raise OperationalError('INSERT', {}, Exception('database is locked'))
+        insert_responses(rows)
+
+    return mock.patch('app.main.submissions.insert_responses', side_effect=insert)
+
+class QueueTestConfig(RouteTestConfig):
+    """App config with the submission queue turned on."""
+
+    RESPONSE_QUEUE_ENABLED = True
+    RESPONSE_QUEUE_FLUSH_MS = 20
+
+class TestSubmissionQueue(RouteTestMixin, unittest.TestCase):
+    """Tests for queued response submissions."""
+
+    config = QueueTestConfig
+
+    def setUp(self):
+        """Create an open meal with one food."""
+
+        super().setUp()
+
+        self.journal_dir = tempfile.mkdtemp()
+
+        food = Food(label='Hamburger')
+        meal = Meal(
+            meal_type=MealType(name='Lunch'),
+            date=datetime.utcnow().date() + timedelta(days=1),
+            registration_open=datetime.utcnow() - timedelta(days=1),
+            registration_close=datetime.utcnow() + timedelta(days=1)
+        )
+        meal.foods.append(food)
+
+        db.session.add_all([meal, food])
+        db.session.commit()
+
+        self.meal_id = meal.id
+        self.food_id = food.id
+
+    def tearDown(self):
+        """Stop the flusher before the database goes away."""
+
+        submissions = self.app.extensions.get('submission_queue')
+        if submissions:
+            submissions.close()
+
+        shutil.rmtree(self.journal_dir)
+
+        super().tearDown()
+
+    def row(self, i):
+        """Build a response row."""
+
+        return {
+            'meal_id': self.meal_id,
+            'first_name': f'First{i}',
+            'last_name': f'Last{i}',
+            'email': f'person{i}@example.com',
+            'food_id': self.food_id,
+            'side_id': None,
+            'drink_id': None,
+            'food_other': None,
+            'side_other': None,
+            'drink_other': None,
+            'note': None
+        }
+
+    def test_respond_post_queued(self):
+        """A queued submission is acknowledged and written by the flusher."""
+
+        result = self.client.post(f'/respond/{self.meal_id}', data={
+            'first_name': 'Paul',
+            'last_name': 'Revere',
+            'email': 'paul@rider.com',
+            'meal_id': self.meal_id,
+            'food': self.food_id
+        }, follow_redirects=True)
+
+        self.assertIn('will be saved shortly', result.get_data(as_text=True))
+
+        submission_queue().flush()
+        db.session.remove()
+
+        response = Response.query.one()
+        self.assertEqual('Paul', response.first_name)
+        self.assertIsNotNone(response.timestamp)
+
+    def test_batches(self):
+        """Rows submitted together are written in one transaction per batch."""
+
+        submissions = SubmissionQueue(self.app, batch_rows=10, flush_ms=50)
+        commits = []
+        original = submissions._write #pylint: disable=protected-access
+
+        def write(items):
+            commits.append(len(items))
+            return original(items)
+
+        submissions._write = write #pylint: disable=protected-access
+
+        for i in range(25):
+            self.assertTrue(submissions.submit(self.row(i)))
+
+        submissions.close()
+        db.session.remove()
+
+        self.assertEqual(25, Response.query.count())
+        self.assertEqual(25, sum(commits))
+        self.assertLessEqual(max(commits), 10)
+        self.assertLess(len(commits), 25)
+
+    def test_backpressure(self):
+        """Submissions are refused once max_pending rows are waiting."""
+
+        submissions = SubmissionQueue(self.app, batch_rows=1, max_pending=2, submit_timeout=0.01)
+
+        # Stall the flusher so nothing drains
+        release = threading.Event()
+        submissions._write = stalled_write(release) #pylint: disable=protected-access
+
+        accepted = [submissions.submit(self.row(i)) for i in range(5)]
+
+        release.set()
+        submissions.close()
+
+        self.assertFalse(accepted[-1])
+        self.assertLessEqual(sum(accepted), 3)
+
+    def test_backpressure_lock(self):
+        """A submitter waiting for room doesn't hold the lock other submitters need."""
+
+        submissions = SubmissionQueue(self.app, batch_rows=1, max_pending=1, submit_timeout=1.0)
+
+        release = threading.Event()
+        submissions._write = stalled_write(release) #pylint: disable=protected-access
+
+        submissions.submit(self.row(0))
+        submissions.submit(self.row(1))
+
+        waiter = threading.Thread(target=submissions.submit, args=(self.row(2),))
+        waiter.start()
+
+        # The lock is free while the waiter is waiting for room
+        self.assertTrue(submissions._lock.acquire(timeout=0.5)) #pylint: disable=protected-access
+        submissions._lock.release() #pylint: disable=protected-access
+
+        release.set()
+        waiter.join()
+        submissions.close()
+
+    @mock.patch('app.main.submissions.WRITE_BACKOFF_SECONDS', 0.001)
+    def test_transient_errors(self):
+        """Rows a locked database keeps from being written are retried until they are."""
+
+        submissions = SubmissionQueue(self.app, journal_dir=self.journal_dir, fsync=False)
+
+        with locked('First1'):
+            for i in range(3):
+                self.assertTrue(submissions.submit(self.row(i)))
+            submissions.flush(timeout=0.2)
+
+        submissions.close()
+        db.session.remove()
+
+        self.assertEqual(3, Response.query.count())
+        self.assertEqual([], os.listdir(self.journal_dir))
+
+    @mock.patch('app.main.submissions.WRITE_BACKOFF_SECONDS', 0.001)
+    def test_unwritten_rows_journaled(self):
+        """Rows never written stay in the journal, past the checkpoints of later rows."""
+
+        submissions = SubmissionQueue(self.app, batch_rows=1, journal_dir=self.journal_dir,
+                                      fsync=False)
+
+        with locked('First1'):
+            submissions.submit(self.row(1))
+            submissions.submit(self.row(2))
+            submissions.flush(timeout=0.2)
+
+            # Stop retrying the first row, as if the worker had been killed
+            submissions._queue.put(None) #pylint: disable=protected-access
+            submissions._thread.join() #pylint: disable=protected-access
+            submissions._closed = True #pylint: disable=protected-access
+
+        db.session.remove()
+        self.assertEqual(['First2'], [response.first_name for response in Response.query])
+
+        name, = os.listdir(self.journal_dir)
+        with open(os.path.join(self.journal_dir, name)) as journal:
+            entries = [json.loads(line) for line in journal]
+        self.assertIn({'committed': 0, 'written': [2]}, entries)
+        self.assertNotIn(1, [entry.get('committed') for entry in entries])
+
+        with mock.patch('app.main.submissions.is_alive', return_value=False):
+            replay = SubmissionQueue(self.app, journal_dir=self.journal_dir, fsync=False)
+            replay.submit(self.row(3))
+        replay.close()
+        db.session.remove()
+
+        names = sorted(response.first_name for response in Response.query)
+        self.assertListEqual(['First1', 'First2', 'First3'], names)
+        self.assertEqual([], os.listdir(self.journal_dir))
+
+    def test_journal_replay(self):
+        """Uncommitted rows journaled by a dead process are written on startup."""
+
+        path = os.path.join(self.journal_dir, f'journal-{DEAD_PID}.jsonl')
+        timestamp = datetime.utcnow().isoformat()
+        with open(path, 'w') as journal:
+            for seq in range(1, 4):
+                row = dict(self.row(seq), timestamp=timestamp)
+                journal.write(json.dumps({'seq': seq, 'row': row}) + '\n')
+            journal.write(json.dumps({'committed': 1}) + '\n')
+            journal.write('{"seq": 4, "ro')
+
+        submissions = SubmissionQueue(self.app, journal_dir=self.journal_dir, fsync=False)
+        submissions.submit(self.row(10))
+        submissions.close()
+        db.session.remove()
+
+        names = sorted(response.first_name for response in Response.query.all())
+        self.assertListEqual(['First10', 'First2', 'First3'], names)
+        self.assertFalse(os.path.exists(path))
+
+    def write_journal(self, name, seqs):
+        """Write a journal of uncommitted rows, returning its path."""
+
+        path = os.path.join(self.journal_dir, name)
+        timestamp = datetime.utcnow().isoformat()
+        with open(path, 'w') as journal:
+            for seq in seqs:
+                row = dict(self.row(seq), timestamp=timestamp)
+                journal.write(json.dumps({'seq': seq, 'row': row}) + '\n')
+
+        return path
+
+    def test_journal_pid_reuse(self):
+        """Journals are replayed unless a live process with the same start time wrote them."""
+
+        # An earlier process that had this PID, and a live one (the parent)
+        reused = self.write_journal(f'journal-{os.getpid()}-1-0a1b2c3d.jsonl', [1, 2])
+        live = self.write_journal(f'journal-{process_key(os.getppid())}-4e5f6a7b.jsonl', [3])
+
+        submissions = SubmissionQueue(self.app, journal_dir=self.journal_dir, fsync=False)
+        submissions.submit(self.row(10))
+        submissions.flush()
+
+        # This process's own journal is separate from the one it replayed
+        own = [name for name in os.listdir(self.journal_dir) if name.startswith(
+            f'journal-{process_key()}-'
+        )]
+        self.assertEqual(1, len(own))
+
+        submissions.close()
+        db.session.remove()
+
+        names = sorted(response.first_name for response in Response.query.all())
+        self.assertListEqual(['First1', 'First10', 'First2'], names)
+        self.assertFalse(os.path.exists(reused))
+        self.assertTrue(os.path.exists(live))
+        self.assertFalse(os.path.exists(os.path.join(self.journal_dir, own[0])))
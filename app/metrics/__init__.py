@@ -0,0 +1,47 @@
+"""Per-endpoint request metrics, exposed in Prometheus format."""
+
+import time
+from flask import Blueprint, current_app, g, request
+from app.metrics.store import MetricsStore
+
+bp = Blueprint('metrics', __name__)
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or 'unknown'
+    current_app.extensions['metrics'].start_request(g.metrics_endpoint)
+
+def _record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+def _finish_request(exc): #pylint: disable=unused-argument
+    # Teardown runs even when the view raised, so in-flight counts stay balanced
+    start = g.pop('metrics_start', None)
+
+    if start is not None:
+        current_app.extensions['metrics'].finish_request(
+            g.pop('metrics_endpoint'),
+            request.method,
+            g.pop('metrics_status', 500),
+            time.perf_counter() - start
+        )
+
+def init_app(app):
+    """Record metrics for every request if METRICS_ENABLED is set."""
+
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    app.extensions['metrics'] = MetricsStore(
+        directory=app.config['METRICS_DIR'],
+        flush_interval=app.config['METRICS_FLUSH_INTERVAL']
+    )
+
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
+
+    app.register_blueprint(bp)
+
+from app.metrics import routes
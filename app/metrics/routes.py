@@ -0,0 +1,22 @@
+"""Routes for request metrics."""
+
+import hmac
+from flask import current_app, request, abort
+from flask_login import current_user
+from app.metrics import bp
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint for admins (or scrapers holding METRICS_TOKEN)."""
+
+    token = current_app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+
+    if not current_user.is_authenticated and \
+            not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        abort(403)
+
+    return current_app.response_class(
+        current_app.extensions['metrics'].prometheus(),
+        mimetype='text/plain; version=0.0.4'
+    )
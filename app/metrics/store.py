@@ -0,0 +1,353 @@
+"""Request metrics shared between worker processes.
+
+Each process keeps its own counters in memory and writes them to a JSON file
+named after its pid and start time in a shared directory: when it finishes a
+request at least flush_interval seconds after its last write, and once more
+when it exits. Reading the metrics merges every process's file, so any
+worker can answer a scrape for all of them. In-flight gauges only count live
+processes.
+
+Counters and histograms from exited workers are kept so totals don't go
+backwards, but their files aren't: a reader folds them into a single retired
+file and removes them. Folding and reading both hold a lock on the directory
+(exclusive and shared), so a scrape never sees a worker's counts twice or not
+at all. The retired file lists the files last folded into it, in case a
+reader dies before it removes them.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from app.processes import is_alive, parse_process_key, process_key
+
+# Metrics file name prefix; files are named metrics-<pid>-<start time>.json
+METRICS_PREFIX = 'metrics-'
+# Counters folded in from exited processes' files
+RETIRED_FILE = 'retired.json'
+# Held (shared to read, exclusive to fold) while reading the directory
+LOCK_FILE = 'metrics.lock'
+
+# Histogram bucket upper bounds for request latency, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class MetricsStore():
+    """Request counts, latency histograms, and in-flight gauges per endpoint.
+
+    directory is where per-process files are written (None keeps metrics in
+    this process only). Files are rewritten at most every flush_interval seconds,
+    when a request finishes, and at exit.
+    """
+
+    def __init__(self, directory=None, buckets=DEFAULT_BUCKETS, flush_interval=1.0):
+        self.directory = directory
+        self.buckets = tuple(sorted(buckets))
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self._flush_at_exit)
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.key = process_key(self.pid)
+        self._requests = {}
+        self._latency = {}
+        self._in_flight = {}
+        self._flushed = 0.0
+
+    def _check_fork(self):
+        """Start fresh in a worker forked from a process that already had metrics."""
+
+        if os.getpid() != self.pid:
+            self._reset()
+
+    @property
+    def path(self):
+        """This process's metrics file."""
+
+        return os.path.join(self.directory, f'{METRICS_PREFIX}{self.key}.json')
+
+    def start_request(self, endpoint):
+        """Record that a request for endpoint has started."""
+
+        with self._lock:
+            self._check_fork()
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+
+    def finish_request(self, endpoint, method, status, seconds):
+        """Record a finished request and its latency."""
+
+        with self._lock:
+            self._check_fork()
+
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 1) - 1
+
+            key = (endpoint, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+            histogram = self._latency.get(endpoint)
+            if histogram is None:
+                # Per-bucket (non-cumulative) counts, with a final +Inf bucket
+                histogram = self._latency[endpoint] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+            if self.directory and time.monotonic() - self._flushed >= self.flush_interval:
+                self._flush()
+
+    def _snapshot(self):
+        return {
+            'pid': self.pid,
+            'key': self.key,
+            'buckets': list(self.buckets),
+            'requests': [list(key) + [count] for key, count in self._requests.items()],
+            'latency': [
+                [endpoint, list(counts), total, count] \
+                    for endpoint, (counts, total, count) in self._latency.items()
+            ],
+            'in_flight': [[endpoint, count] for endpoint, count in self._in_flight.items()]
+        }
+
+    def _flush(self):
+        """Write this process's metrics file atomically. Caller holds the lock."""
+
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as tmp_file:
+            json.dump(self._snapshot(), tmp_file)
+        os.replace(tmp_path, self.path)
+
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        """Write this process's metrics file now.
+
+        Does nothing in a process that hasn't recorded anything yet, such as a
+        forked worker exiting before its first request.
+        """
+
+        if self.directory:
+            with self._lock:
+                if self.pid == os.getpid():
+                    self._flush()
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except OSError:
+            # The directory may already have been cleaned up
+            pass
+
+    @contextmanager
+    def _locked(self, operation):
+        """Hold the metrics directory's lock (fcntl.LOCK_SH or fcntl.LOCK_EX)."""
+
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self, name):
+        """Read a metrics file, or None if it's gone or half-written."""
+
+        try:
+            with open(os.path.join(self.directory, name)) as metrics_file:
+                return json.load(metrics_file)
+        except (OSError, ValueError):
+            return None
+
+    def _process_files(self, folded=()):
+        """List other processes' metrics files as (name, live) pairs."""
+
+        files = []
+
+        for name in os.listdir(self.directory):
+            if not name.startswith(METRICS_PREFIX) or not name.endswith('.json') or \
+                    name == os.path.basename(self.path) or name in folded:
+                continue
+
+            try:
+                pid, started = parse_process_key(name[len(METRICS_PREFIX):-len('.json')])
+            except ValueError:
+                continue
+
+            files.append((name, pid == os.getpid() or is_alive(pid, started)))
+
+        return files
+
+    def _retire(self):
+        """Fold exited processes' files into the retired file and remove them."""
+
+        with self._locked(fcntl.LOCK_EX):
+            retired = self._read(RETIRED_FILE) or {
+                'buckets': list(self.buckets), 'requests': [], 'latency': [], 'folded': []
+            }
+
+            # These were counted by an earlier fold that didn't get to remove them
+            for name in retired['folded']:
+                _remove(os.path.join(self.directory, name))
+
+            dead = [name for name, live in self._process_files() if not live]
+            if not dead:
+                return
+
+            snapshots = [retired]
+            for name in dead:
+                snapshot = self._read(name)
+                if snapshot is not None and snapshot['buckets'] == retired['buckets']:
+                    snapshots.append(snapshot)
+
+            requests, latency, _ = _merge(snapshots)
+            retired.update(
+                requests=[list(key) + [count] for key, count in requests.items()],
+                latency=[
+                    [endpoint, counts, total, count] \
+                        for endpoint, (counts, total, count) in latency.items()
+                ],
+                folded=dead
+            )
+
+            tmp_path = os.path.join(self.directory, f'{RETIRED_FILE}.tmp')
+            with open(tmp_path, 'w') as tmp_file:
+                json.dump(retired, tmp_file)
+            os.replace(tmp_path, os.path.join(self.directory, RETIRED_FILE))
+
+            for name in dead:
+                _remove(os.path.join(self.directory, name))
+
+    def _snapshots(self):
+        """Get the metrics of every process, using live data for this one.
+
+        Returns (snapshot, live) pairs; the retired counters count as not live.
+        """
+
+        with self._lock:
+            self._check_fork()
+            snapshots = [(self._snapshot(), True)]
+
+        if not self.directory:
+            return snapshots
+
+        self._retire()
+
+        with self._locked(fcntl.LOCK_SH):
+            retired = self._read(RETIRED_FILE)
+            folded = retired['folded'] if retired else ()
+
+            if retired is not None:
+                snapshots.append((retired, False))
+
+            for name, live in self._process_files(folded):
+                # Another worker may be replacing its file
+                snapshot = self._read(name)
+                if snapshot is not None:
+                    snapshots.append((snapshot, live))
+
+        return snapshots
+
+    def collect(self):
+        """Merge the metrics of all processes.
+
+        Returns a dict with 'requests' ({(endpoint, method, status): count}),
+        'latency' ({endpoint: (cumulative bucket counts, sum, count)}), and
+        'in_flight' ({endpoint: count}).
+        """
+
+        snapshots = self._snapshots()
+        requests, latency, in_flight = _merge(
+            [snapshot for snapshot, _ in snapshots if tuple(snapshot['buckets']) == self.buckets],
+            live={id(snapshot) for snapshot, live in snapshots if live}
+        )
+
+        for endpoint, (counts, total, count) in latency.items():
+            cumulative = []
+            running = 0
+            for bucket_count in counts:
+                running += bucket_count
+                cumulative.append(running)
+            latency[endpoint] = (cumulative, total, count)
+
+        return {'requests': requests, 'latency': latency, 'in_flight': in_flight}
+
+    def prometheus(self, prefix='mealpoll'):
+        """Render the merged metrics in the Prometheus text exposition format."""
+
+        metrics = self.collect()
+        lines = []
+
+        lines.append(f'# HELP {prefix}_http_requests_total Requests handled, '
+                     'by endpoint, method, and status.')
+        lines.append(f'# TYPE {prefix}_http_requests_total counter')
+        for (endpoint, method, status), count in sorted(metrics['requests'].items()):
+            lines.append(f'{prefix}_http_requests_total'
+                         f'{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines.append(f'# HELP {prefix}_http_request_duration_seconds Request latency by endpoint.')
+        lines.append(f'# TYPE {prefix}_http_request_duration_seconds histogram')
+        for endpoint, (cumulative, total, count) in sorted(metrics['latency'].items()):
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, bucket_count in zip(bounds, cumulative):
+                lines.append(f'{prefix}_http_request_duration_seconds_bucket'
+                             f'{_labels(endpoint=endpoint, le=bound)} {bucket_count}')
+            lines.append(f'{prefix}_http_request_duration_seconds_sum'
+                         f'{_labels(endpoint=endpoint)} {total}')
+            lines.append(f'{prefix}_http_request_duration_seconds_count'
+                         f'{_labels(endpoint=endpoint)} {count}')
+
+        lines.append(f'# HELP {prefix}_http_requests_in_flight Requests currently being handled.')
+        lines.append(f'# TYPE {prefix}_http_requests_in_flight gauge')
+        for endpoint, count in sorted(metrics['in_flight'].items()):
+            lines.append(f'{prefix}_http_requests_in_flight{_labels(endpoint=endpoint)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+def _merge(snapshots, live=()):
+    """Add up snapshots' counters and histograms, and the in-flight gauges of those in live.
+
+    live holds the id()s of snapshots from live processes. Returns (requests,
+    latency, in_flight) dicts, with per-bucket (not cumulative) latency counts.
+    """
+
+    requests = {}
+    latency = {}
+    in_flight = {}
+
+    for snapshot in snapshots:
+        for endpoint, method, status, count in snapshot['requests']:
+            key = (endpoint, method, status)
+            requests[key] = requests.get(key, 0) + count
+
+        for endpoint, counts, total, count in snapshot['latency']:
+            merged = latency.setdefault(endpoint, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+
+        if id(snapshot) in live:
+            for endpoint, count in snapshot['in_flight']:
+                in_flight[endpoint] = in_flight.get(endpoint, 0) + count
+
+    return requests, latency, in_flight
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _labels(**labels):
+    """Format Prometheus labels, escaping their values."""
+
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
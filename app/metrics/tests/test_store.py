@@ -0,0 +1,167 @@
+"""Test the request metrics store and endpoint."""
+
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from app.metrics.store import MetricsStore, RETIRED_FILE
+from app.tests.test_utils import RouteTestMixin
+
+def _worker_requests(directory, count):
+    """Record requests from a separate process, as a gunicorn worker would."""
+
+    store = MetricsStore(directory)
+    for _ in range(count):
+        store.start_request('main.respond')
+        store.finish_request('main.respond', 'POST', 302, 0.02)
+    store.flush()
+
+# Records requests in a separate interpreter and exits without flushing
+EXIT_SCRIPT = '''
+import sys
+from app.metrics.store import MetricsStore
+
+store = MetricsStore(sys.argv[1], flush_interval=3600)
+for _ in range(5):
+    store.start_request('main.index')
+    store.finish_request('main.index', 'GET', 200, 0.01)
+'''
+
+class TestMetricsStore(unittest.TestCase):
+    """Tests for merging metrics across processes."""
+
+    def setUp(self):
+        """Create a scratch metrics directory."""
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the metrics directory."""
+
+        shutil.rmtree(self.directory)
+
+    def test_histogram(self):
+        """Latencies land in cumulative buckets."""
+
+        store = MetricsStore(buckets=(0.1, 1.0))
+
+        for seconds in [0.05, 0.1, 0.5, 2.0]:
+            store.start_request('main.index')
+            store.finish_request('main.index', 'GET', 200, seconds)
+
+        cumulative, total, count = store.collect()['latency']['main.index']
+
+        self.assertListEqual([2, 3, 4], cumulative)
+        self.assertAlmostEqual(2.65, total)
+        self.assertEqual(4, count)
+        self.assertEqual(0, store.collect()['in_flight']['main.index'])
+
+    def test_multiprocess(self):
+        """Metrics written by other processes are merged into this one's."""
+
+        store = MetricsStore(self.directory)
+        store.start_request('main.respond')
+
+        workers = [
+            multiprocessing.Process(target=_worker_requests, args=(self.directory, count)) \
+                for count in [3, 4]
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        metrics = store.collect()
+
+        self.assertEqual(7, metrics['requests'][('main.respond', 'POST', '302')])
+        self.assertEqual(7, metrics['latency']['main.respond'][2])
+        # Exited workers don't contribute to in-flight gauges
+        self.assertEqual(1, metrics['in_flight']['main.respond'])
+
+        text = store.prometheus()
+        self.assertIn(
+            'mealpoll_http_requests_total{endpoint="main.respond",method="POST",status="302"} 7',
+            text
+        )
+        self.assertIn(
+            'mealpoll_http_request_duration_seconds_bucket{endpoint="main.respond",le="+Inf"} 7',
+            text
+        )
+
+    def test_retired(self):
+        """Exited workers' files are folded into the retired counters without changing totals."""
+
+        store = MetricsStore(self.directory)
+
+        for count in [3, 4]:
+            worker = multiprocessing.Process(target=_worker_requests, args=(self.directory, count))
+            worker.start()
+            worker.join()
+
+        self.assertEqual(7, store.collect()['requests'][('main.respond', 'POST', '302')])
+        self.assertFalse(
+            [name for name in os.listdir(self.directory) if name.startswith('metrics-')]
+        )
+
+        worker = multiprocessing.Process(target=_worker_requests, args=(self.directory, 2))
+        worker.start()
+        worker.join()
+
+        metrics = store.collect()
+        self.assertEqual(9, metrics['requests'][('main.respond', 'POST', '302')])
+        self.assertEqual(9, metrics['latency']['main.respond'][2])
+
+    def test_retired_not_removed(self):
+        """Files an interrupted fold counted but didn't remove aren't counted again."""
+
+        store = MetricsStore(self.directory)
+        worker = multiprocessing.Process(target=_worker_requests, args=(self.directory, 3))
+        worker.start()
+        worker.join()
+
+        name = [name for name in os.listdir(self.directory) if name.startswith('metrics-')][0]
+        with open(os.path.join(self.directory, name)) as metrics_file:
+            contents = metrics_file.read()
+
+        self.assertEqual(3, store.collect()['requests'][('main.respond', 'POST', '302')])
+
+        # Put the folded file back, as if the fold had stopped before removing it
+        with open(os.path.join(self.directory, name), 'w') as metrics_file:
+            metrics_file.write(contents)
+        with open(os.path.join(self.directory, RETIRED_FILE)) as retired_file:
+            self.assertEqual([name], json.load(retired_file)['folded'])
+
+        self.assertEqual(3, store.collect()['requests'][('main.respond', 'POST', '302')])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, name)))
+
+    def test_flush_at_exit(self):
+        """A process's requests since its last flush are written when it exits."""
+
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+        subprocess.run([sys.executable, '-c', EXIT_SCRIPT, self.directory], cwd=root, check=True)
+
+        self.assertEqual(5, MetricsStore(self.directory).collect()['latency']['main.index'][2])
+
+class TestMetricsRoute(RouteTestMixin, unittest.TestCase):
+    """Tests for the /metrics endpoint."""
+
+    def test_admin_only(self):
+        """Metrics are only shown to admins or holders of the scrape token."""
+
+        self.client.get('/sides/1')
+
+        self.assertEqual(403, self.client.get('/metrics').status_code)
+
+        self.app.config['METRICS_TOKEN'] = 'secret'
+        result = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(200, result.status_code)
+
+        self.login_admin()
+        text = self.client.get('/metrics').get_data(as_text=True)
+
+        self.assertIn('endpoint="main.sides",method="GET",status="404"} 1', text)
+        self.assertIn('mealpoll_http_requests_in_flight{endpoint="metrics.metrics"} 1', text)
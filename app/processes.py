@@ -0,0 +1,63 @@
+"""Identifying the worker processes behind per-process files.
+
+Response journals and metrics files are named after the process that writes
+them. PIDs are reused, so a file also records its process's start time (where
+the platform reports one), and a file only belongs to a live process if a
+process with the same PID and start time is running.
+"""
+
+import os
+
+def start_time(pid):
+    """Get a process's start time in clock ticks since boot, or None if unknown.
+
+    Read from /proc on Linux; other platforms always get None.
+    """
+
+    try:
+        with open(f'/proc/{pid}/stat') as stat:
+            fields = stat.read()
+    except OSError:
+        return None
+
+    # The command name (field 2) is in parentheses and may contain spaces;
+    # start time is field 22, the 20th after it
+    try:
+        return int(fields[fields.rindex(')') + 2:].split()[19])
+    except (ValueError, IndexError):
+        return None
+
+def process_key(pid=None):
+    """Get a "<pid>-<start time>" key for a process (default: this one).
+
+    The start time is 0 where the platform doesn't report one.
+    """
+
+    pid = pid or os.getpid()
+
+    return f'{pid}-{start_time(pid) or 0}'
+
+def parse_process_key(key):
+    """Get (pid, start time or None) from a process_key() or a bare pid."""
+
+    pid, _, started = key.partition('-')
+    started = int(started) if started else 0
+
+    return int(pid), started or None
+
+def is_alive(pid, started=None):
+    """Check whether a process exists (and, given started, is the one that started then)."""
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    if started is not None:
+        current = start_time(pid)
+        if current is not None and current != started:
+            return False
+
+    return True
@@ -1,4 +1,4 @@
-// Submit item deletes with JS from button click. 
+// Submit item deletes and archive restores with JS from button click.
 // #region
 document.querySelectorAll(".item-list").forEach((element) => {
         element.addEventListener('click', (event) => {
@@ -26,7 +26,26 @@ document.querySelectorAll(".item-list").forEach((element) => {
 
                     form.submit();
 
+                } else if (event.target.dataset.delete == 'template') {
+
+                    let form = document.getElementById('template-delete-form');
+                    let id_field = form.querySelector('[name="template_id"]');
+
+                    id_field.setAttribute('value', target.dataset.id);
+
+                    form.submit();
+
                 }
+            } else if (event.target.hasAttribute('data-restore')) {
+
+                let target = (event.target.tagName === 'BUTTON') ? event.target : event.target.parentElement;
+
+                let form = document.getElementById('archive-restore-form');
+                let id_field = form.querySelector('[name="archive_id"]');
+
+                id_field.setAttribute('value', target.dataset.id);
+
+                form.submit();
             }
         });
     }
@@ -37,22 +56,39 @@ document.querySelectorAll(".item-list").forEach((element) => {
 // #region
 
 // Dynamic side choices
+// Side options for every food on the menu are embedded in the page, so we only
+// need to ask the server when a food is missing from the map.
+let sideMapElement = document.getElementById('side-map');
+let sideMap = sideMapElement ? JSON.parse(sideMapElement.textContent) : {};
+
+function getSides(foodId) {
+    if (foodId in sideMap) {
+        return Promise.resolve(sideMap[foodId]);
+    }
+
+    return fetch(`/sides/${foodId}`)
+        .then((response) => {
+            return response.json()
+        })
+        .then((response) => {
+            sideMap[foodId] = response.sides;
+            return response.sides;
+        });
+}
+
 document.querySelectorAll("#respond-form #food").forEach((element) => {
     element.addEventListener('change', (event) => {
         if (parseInt(element.value)) {
             let sideField = document.getElementById('side');
 
-            fetch(`/sides/${element.value}`)
-                .then((response) => {
-                    return response.json()
-                })
-                .then((response) => {
+            getSides(element.value)
+                .then((sides) => {
 
                     while(sideField.firstChild) {
                         sideField.firstChild.remove();
                     }
 
-                    response.sides.forEach((side) => {
+                    sides.forEach((side) => {
                         let option = document.createElement("option");
                         option.value = side.id;
                         option.text = side.label;
@@ -85,4 +121,86 @@ document.querySelectorAll("#respond-form #side, #respond-form #drink").forEach((
 
 // Enable/Disable "other drink" option
 
-// #endregion
\ No newline at end of file
+// #endregion
+
+// Live signup dashboard
+// #region
+let liveDashboard = document.getElementById('live-dashboard');
+
+function liveItem(badge, text) {
+    let item = document.createElement('li');
+    item.className = 'list-group-item';
+
+    if (badge !== null) {
+        let count = document.createElement('span');
+        count.className = 'badge';
+        count.textContent = badge;
+        item.appendChild(count);
+    }
+
+    item.appendChild(document.createTextNode(text));
+    return item;
+}
+
+// How long to wait before trying again when the server has no room for another stream
+const LIVE_BUSY_RETRY = 10000;
+
+function connectLive() {
+    let source = new EventSource(liveDashboard.dataset.events);
+    let status = document.getElementById('live-status');
+    let recent = document.getElementById('live-recent');
+
+    source.addEventListener('open', () => {
+        status.textContent = 'Live';
+        status.className = 'label label-success';
+    });
+
+    // Browsers reconnect by themselves unless the stream was refused (e.g. with a 503)
+    source.addEventListener('error', () => {
+        status.className = 'label label-warning';
+
+        if (source.readyState === EventSource.CLOSED) {
+            status.textContent = 'Busy, retrying shortly...';
+            setTimeout(connectLive, LIVE_BUSY_RETRY);
+        } else {
+            status.textContent = 'Reconnecting...';
+        }
+    });
+
+    source.addEventListener('tally', (event) => {
+        let tally = JSON.parse(event.data);
+
+        document.getElementById('live-responses').textContent = tally.responses;
+
+        ['foods', 'sides', 'drinks'].forEach((key) => {
+            let list = document.getElementById(`live-${key}`);
+            list.replaceChildren(...tally[key].map((row) => liveItem(row.count, row.label)));
+        });
+    });
+
+    // Replaced responses come through again with the same id, so move them to the top
+    source.addEventListener('response', (event) => {
+        let response = JSON.parse(event.data);
+        let choices = [response.food, response.side, response.drink].filter((choice) => choice);
+        let item = liveItem(null, `${response.first_name} ${response.last_name}: ${choices.join(', ')}`);
+
+        item.dataset.id = response.id;
+        recent.querySelectorAll(`[data-id="${response.id}"]`).forEach((old) => old.remove());
+        recent.prepend(item);
+
+        while (recent.children.length > parseInt(liveDashboard.dataset.recent)) {
+            recent.lastChild.remove();
+        }
+    });
+
+    source.addEventListener('closed', () => {
+        source.close();
+        status.textContent = 'Meal closed';
+        status.className = 'label label-default';
+    });
+}
+
+if (liveDashboard) {
+    connectLive();
+}
+// #endregion
@@ -0,0 +1,465 @@
+"""Route-level benchmarks against seeded datasets.
+
+Seeds a scratch database with a configurable number of meals, menu items, and
+responses, then times the main routes through the Flask test client, recording
+latency percentiles and SQL statement counts. Results are written as JSON and
+can be compared against an earlier run to catch regressions:
+
+    python -m app.tests.benchmark --responses 100000 --output baseline.json
+    python -m app.tests.benchmark --responses 100000 --compare baseline.json
+
+With --concurrency, several processes instead post responses and download the
+CSV export against one SQLite file at the same time, once with default pragmas
+and once with the SQLITE_PRODUCTION profile, reporting throughput and errors:
+
+    python -m app.tests.benchmark --concurrency --writers 4 --readers 4 --duration 10
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import inspect
+from app import create_app
+from app import db
+from app.auth.models import Admin
+from app.main.counters import recount
+from app.main.models import MealType, Meal, Drink, Food, Side, Response, meal_drink,\
+    meal_food, food_side
+from app.tests.test_utils import RouteTestConfig, StatementCounter
+
+# Rows per executemany batch when seeding
+SEED_BATCH_ROWS = 10000
+
+# A run regresses if a latency percentile grows by more than this factor...
+LATENCY_TOLERANCE = 1.25
+# ...or if a route issues more statements per request than before
+STATEMENT_TOLERANCE = 0
+
+def percentile(values, fraction):
+    """Get a percentile of values (which must be sorted) by nearest rank."""
+
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+def seed(meals=20, foods=30, sides=15, drinks=10, responses=10000,
+         foods_per_meal=6, sides_per_food=3, drinks_per_meal=4):
+    """Fill the current app's database with a synthetic dataset.
+
+    Responses are spread evenly across meals. Returns the id of the first meal,
+    which is the one the per-meal routes are timed against.
+    """
+
+    rand = random.Random(0)
+    now = datetime.utcnow()
+
+    db.session.add(MealType(id=1, name='Lunch'))
+    db.session.flush()
+
+    def insert(table, rows):
+        for start in range(0, len(rows), SEED_BATCH_ROWS):
+            db.session.execute(table.insert(), rows[start:start + SEED_BATCH_ROWS])
+
+    insert(Food.__table__, [
+        {'id': i, 'label': f'Food {i}', 'description': f'Food number {i}', 'version': 1} \
+            for i in range(1, foods + 1)
+    ])
+    insert(Side.__table__, [
+        {'id': i, 'label': f'Side {i}', 'description': None} for i in range(1, sides + 1)
+    ])
+    insert(Drink.__table__, [
+        {'id': i, 'label': f'Drink {i}', 'description': None} for i in range(1, drinks + 1)
+    ])
+    insert(Meal.__table__, [{
+        'id': i,
+        'meal_type_id': 1,
+        'restaurant': f'Restaurant {i}',
+        'date': (now + timedelta(days=i)).date(),
+        'registration_open': now - timedelta(days=1),
+        'registration_close': now + timedelta(days=i)
+    } for i in range(1, meals + 1)])
+
+    food_sides = {
+        food_id: rand.sample(range(1, sides + 1), min(sides, sides_per_food)) \
+            for food_id in range(1, foods + 1)
+    }
+    insert(food_side, [
+        {'food_id': food_id, 'side_id': side_id} \
+            for food_id, side_ids in food_sides.items() for side_id in side_ids
+    ])
+
+    meal_foods = {
+        meal_id: rand.sample(range(1, foods + 1), min(foods, foods_per_meal)) \
+            for meal_id in range(1, meals + 1)
+    }
+    meal_drinks = {
+        meal_id: rand.sample(range(1, drinks + 1), min(drinks, drinks_per_meal)) \
+            for meal_id in range(1, meals + 1)
+    }
+    insert(meal_food, [
+        {'meal_id': meal_id, 'food_id': food_id} \
+            for meal_id, food_ids in meal_foods.items() for food_id in food_ids
+    ])
+    insert(meal_drink, [
+        {'meal_id': meal_id, 'drink_id': drink_id} \
+            for meal_id, drink_ids in meal_drinks.items() for drink_id in drink_ids
+    ])
+
+    rows = []
+    for i in range(responses):
+        meal_id = i % meals + 1
+        food_id = rand.choice(meal_foods[meal_id])
+        rows.append({
+            'meal_id': meal_id,
+            'first_name': f'First{i}',
+            'last_name': f'Last{i}',
+            'email': f'person{i}@example.com',
+            'food_id': food_id,
+            'side_id': rand.choice(food_sides[food_id]),
+            'drink_id': rand.choice(meal_drinks[meal_id]),
+            'note': None,
+            'timestamp': now
+        })
+
+        if len(rows) == SEED_BATCH_ROWS:
+            insert(Response.__table__, rows)
+            rows = []
+
+    insert(Response.__table__, rows)
+    recount()
+
+    admin = Admin(first_name='Bench', last_name='Admin', email='bench@example.com')
+    admin.set_password('benchmark')
+    db.session.add(admin)
+
+    db.session.commit()
+
+    return 1
+
+def menu_choices(meal_id):
+    """Get a (food_id, side_id, drink_id) combination that's on a meal's menu."""
+
+    food_id, side_id = db.session.query(food_side.c.food_id, food_side.c.side_id)\
+        .join(meal_food, meal_food.c.food_id == food_side.c.food_id)\
+        .filter(meal_food.c.meal_id == meal_id).first()
+    drink_id, = db.session.query(meal_drink.c.drink_id)\
+        .filter(meal_drink.c.meal_id == meal_id).first()
+
+    return food_id, side_id, drink_id
+
+def time_route(client, name, request, iterations):
+    """Time repeated requests, returning latency percentiles and statement counts.
+
+    request is called with the client and the iteration number and should make
+    one request, returning the response.
+    """
+
+    latencies = []
+    statements = []
+
+    for i in range(iterations):
+        with StatementCounter() as counter:
+            start = time.perf_counter()
+            response = request(client, i)
+            response.get_data()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        if response.status_code >= 400:
+            raise RuntimeError(f'{name} returned {response.status_code}')
+
+        statements.append(len(counter))
+
+    latencies.sort()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p90_ms': round(percentile(latencies, 0.90), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'statements': max(statements)
+    }
+
+def scenarios(meal_id, food_id, side_id, drink_id):
+    """Get the named requests to time."""
+
+    def respond_post(client, i):
+        return client.post(f'/respond/{meal_id}', data={
+            'first_name': 'Bench',
+            'last_name': f'Mark{i}',
+            'email': f'bench{i}@example.com',
+            'meal_id': meal_id,
+            'food': food_id,
+            'side': side_id,
+            'drink': drink_id
+        })
+
+    return [
+        ('index', lambda client, i: client.get('/')),
+        ('respond_get', lambda client, i: client.get(f'/respond/{meal_id}')),
+        ('respond_post', respond_post),
+        ('sides', lambda client, i: client.get(f'/sides/{food_id}')),
+        ('responses_csv', lambda client, i: client.get(f'/responses/{meal_id}')),
+        ('meal_list', lambda client, i: client.get('/meal_list')),
+        ('item_list', lambda client, i: client.get('/item_list/food'))
+    ]
+
+def run(dataset, iterations=20, database=None):
+    """Seed a scratch database and time every scenario against it.
+
+    dataset holds keyword arguments for seed(). database is an optional
+    SQLAlchemy URI of an empty database; by default a temporary SQLite file is
+    used. A database that already has tables is refused with a ValueError, and
+    a supplied database is left seeded rather than dropped afterwards.
+    """
+
+    tmp_dir = tempfile.mkdtemp()
+
+    class BenchmarkConfig(RouteTestConfig):
+        """App config for benchmark runs."""
+
+        SQLALCHEMY_DATABASE_URI = database or \
+            f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}"
+
+    app = create_app(BenchmarkConfig)
+    app_context = app.app_context()
+    app_context.push()
+
+    try:
+        if database and inspect(db.engine).get_table_names():
+            raise ValueError(f'Benchmarks need an empty database; {database} has tables')
+
+        db.create_all()
+
+        seed_start = time.perf_counter()
+        meal_id = seed(**dataset)
+        seed_seconds = time.perf_counter() - seed_start
+
+        food_id, side_id, drink_id = menu_choices(meal_id)
+        admin_session_id = Admin.query.first().get_id()
+        db.session.remove()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = admin_session_id
+            session['_fresh'] = True
+
+        results = {}
+        for name, request in scenarios(meal_id, food_id, side_id, drink_id):
+            results[name] = time_route(client, name, request, iterations)
+            db.session.remove()
+
+        return {
+            'created': datetime.utcnow().isoformat(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0],
+            'dataset': dataset,
+            'seed_seconds': round(seed_seconds, 3),
+            'results': results
+        }
+
+    finally:
+        db.session.remove()
+        db.engine.dispose()
+        app_context.pop()
+        shutil.rmtree(tmp_dir)
+
+def _concurrency_worker( #pylint: disable=too-many-arguments
+        database, production, kind, choices, duration, results):
+    """Make requests of one kind until duration passes, then report to results."""
+
+    class WorkerConfig(RouteTestConfig):
+        """App config for a benchmark worker process."""
+
+        SQLALCHEMY_DATABASE_URI = database
+        SQLITE_PRODUCTION = production
+
+    app = create_app(WorkerConfig)
+    app_context = app.app_context()
+    app_context.push()
+
+    scenario = dict(scenarios(*choices))['respond_post' if kind == 'writer' else 'responses_csv']
+    client = app.test_client()
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    i = os.getpid() * 1000000
+
+    while time.monotonic() < deadline:
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = scenario(client, i)
+            response.get_data()
+            if response.status_code >= 400:
+                errors += 1
+                continue
+        except Exception: #pylint: disable=broad-except
+            # Usually "database is locked"
+            errors += 1
+            db.session.remove()
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    db.engine.dispose()
+    app_context.pop()
+
+    results.put({'kind': kind, 'latencies': latencies, 'errors': errors})
+
+def run_concurrency(dataset, writers=4, readers=4, duration=5.0, production=True):
+    """Seed a scratch SQLite file and hit it from several processes at once.
+
+    writers processes post responses while readers processes download the CSV
+    export, all for duration seconds. production selects the SQLITE_PRODUCTION
+    pragma profile.
+    """
+
+    tmp_dir = tempfile.mkdtemp()
+    database = f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}"
+
+    class BenchmarkConfig(RouteTestConfig):
+        """App config for seeding the benchmark database."""
+
+        SQLALCHEMY_DATABASE_URI = database
+        SQLITE_PRODUCTION = production
+
+    app = create_app(BenchmarkConfig)
+
+    try:
+        with app.app_context():
+            db.create_all()
+            meal_id = seed(**dataset)
+            choices = (meal_id,) + menu_choices(meal_id)
+            db.session.remove()
+            db.engine.dispose()
+
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_concurrency_worker,
+                args=(database, production, kind, choices, duration, results)
+            ) for kind in ['writer'] * writers + ['reader'] * readers
+        ]
+
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        summary = {}
+        for kind, processes_of_kind in [('writer', writers), ('reader', readers)]:
+            latencies = sorted(itertools.chain.from_iterable(
+                report['latencies'] for report in reports if report['kind'] == kind
+            ))
+            summary[kind] = {
+                'processes': processes_of_kind,
+                'requests': len(latencies),
+                'errors': sum(report['errors'] for report in reports if report['kind'] == kind),
+                'per_second': round(len(latencies) / duration, 2),
+                'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+                'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None
+            }
+
+        return {
+            'created': datetime.utcnow().isoformat(),
+            'profile': 'production' if production else 'default',
+            'dataset': dataset,
+            'duration': duration,
+            'results': summary
+        }
+
+    finally:
+        shutil.rmtree(tmp_dir)
+
+def compare(baseline, current):
+    """List the regressions in current relative to a baseline run."""
+
+    regressions = []
+
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+
+        for key in ['p50_ms', 'p90_ms']:
+            if result[key] > before[key] * LATENCY_TOLERANCE:
+                regressions.append(f'{name}: {key} {before[key]} -> {result[key]}')
+
+        if result['statements'] > before['statements'] + STATEMENT_TOLERANCE:
+            regressions.append(
+                f"{name}: statements {before['statements']} -> {result['statements']}"
+            )
+
+    return regressions
+
+def main(argv=None):
+    """Command line entry point."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--meals', type=int, default=20)
+    parser.add_argument('--foods', type=int, default=30)
+    parser.add_argument('--sides', type=int, default=15)
+    parser.add_argument('--drinks', type=int, default=10)
+    parser.add_argument('--responses', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--database',
+                        help='SQLAlchemy URI of an empty database (default: temporary SQLite file)')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Fail if results regress from this JSON file')
+    parser.add_argument('--concurrency', action='store_true',
+                        help='Benchmark concurrent reads and writes with both SQLite profiles')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    dataset = {
+        'meals': args.meals,
+        'foods': args.foods,
+        'sides': args.sides,
+        'drinks': args.drinks,
+        'responses': args.responses
+    }
+
+    if args.concurrency:
+        results = {
+            profile: run_concurrency(dataset, writers=args.writers, readers=args.readers,
+                                     duration=args.duration, production=production) \
+                for profile, production in [('default', False), ('production', True)]
+        }
+        print(json.dumps(results, indent=2))
+        return 0
+
+    try:
+        results = run(dataset, iterations=args.iterations, database=args.database)
+    except ValueError as error:
+        parser.error(str(error))
+
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(json.load(baseline_file), results)
+
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
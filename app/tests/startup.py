@@ -0,0 +1,88 @@
+"""Cold-start timing and import-time profile for the app's entry points.
+
+Each measurement imports an entry point in a fresh interpreter, as a gunicorn
+worker (or, with preload_app, the master) would:
+
+    python -m app.tests.startup
+    python -m app.tests.startup --module mealpoll --runs 10 --top 30
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Repository root, where the entry point modules live
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Seconds a cold import of wsgi may take before the startup test fails
+COLD_START_BUDGET = 2.5
+
+def _python(code, *options):
+    """Run code in a fresh interpreter from the repository root."""
+
+    env = dict(os.environ)
+    env.pop('LOAD_CLI_EXTENSIONS', None)
+
+    return subprocess.run(
+        [sys.executable, *options, '-c', code],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True
+    )
+
+def cold_start(module='wsgi', runs=5):
+    """Get the median time (seconds) taken to import an entry point."""
+
+    code = f'import time; start = time.perf_counter(); import {module}; ' \
+        'print(time.perf_counter() - start)'
+
+    return statistics.median(float(_python(code).stdout) for _ in range(runs))
+
+def imported_modules(module='wsgi'):
+    """Get the names of every module loaded by importing an entry point."""
+
+    code = f'import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))'
+
+    return set(json.loads(_python(code).stdout))
+
+def import_profile(module='wsgi'):
+    """Get import time per top-level package, slowest first.
+
+    Returns a list of (package, seconds) from python -X importtime, counting
+    each module's own time (not its children's) toward its top-level package.
+    """
+
+    stderr = _python(f'import {module}', '-X', 'importtime').stderr
+
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000000
+
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+def main(argv=None):
+    """Command line entry point."""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='wsgi', help='Entry point to import')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f'Cold start ({args.module}, median of {args.runs}): '
+          f'{cold_start(args.module, args.runs) * 1000:.1f} ms')
+    print()
+    print(f"{'Package':<30} {'ms':>8}")
+    for package, seconds in import_profile(args.module)[:args.top]:
+        print(f'{package:<30} {seconds * 1000:>8.1f}')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Smoke test the route benchmark suite."""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from app import db
+from app.main.models import Meal, ChoiceCount
+from app.tests import benchmark
+from app.tests.test_utils import ModelTestMixin
+
+class TestBenchmark(unittest.TestCase):
+    """Run the benchmarks against a tiny dataset."""
+
+    def test_run_and_compare(self):
+        """Every scenario is timed and regressions are detected against a baseline."""
+
+        results = benchmark.run({'meals': 2, 'responses': 50}, iterations=2)
+
+        self.assertSetEqual(
+            {'index', 'respond_get', 'respond_post', 'sides', 'responses_csv', 'meal_list',
+             'item_list'},
+            set(results['results'])
+        )
+        self.assertEqual(2, results['results']['responses_csv']['statements'])
+        self.assertListEqual([], benchmark.compare(results, results))
+
+        slower = {'results': {
+            'sides': dict(results['results']['sides'], statements=10, p50_ms=1000)
+        }}
+        self.assertEqual(2, len(benchmark.compare(results, slower)))
+
+    def test_existing_database(self):
+        """A database that already has tables is refused and left as it was."""
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'existing.db')
+
+        with sqlite3.connect(path) as connection:
+            connection.execute('CREATE TABLE meal (id INTEGER PRIMARY KEY)')
+            connection.execute('INSERT INTO meal VALUES (1)')
+
+        with self.assertRaises(ValueError):
+            benchmark.run({'meals': 2, 'responses': 50}, iterations=1,
+                          database=f'sqlite:///{path}')
+
+        with sqlite3.connect(path) as connection:
+            self.assertEqual([(1,)], connection.execute('SELECT id FROM meal').fetchall())
+
+    def test_run_concurrency(self):
+        """Concurrent writers and readers report throughput without errors."""
+
+        results = benchmark.run_concurrency(
+            {'meals': 2, 'responses': 50}, writers=1, readers=1, duration=0.5
+        )
+
+        self.assertEqual('production', results['profile'])
+        for kind in ['writer', 'reader']:
+            self.assertGreater(results['results'][kind]['requests'], 0)
+            self.assertEqual(0, results['results'][kind]['errors'])
+
+class TestSeed(ModelTestMixin, unittest.TestCase):
+    """Seeded datasets look like ones built through the app."""
+
+    def test_counters(self):
+        """Seeded responses are reflected in the meals' counters."""
+
+        benchmark.seed(meals=3, responses=30)
+
+        self.assertEqual([10, 10, 10], [meal.response_count for meal in Meal.query])
+        self.assertEqual(30, db.session.query(db.func.sum(ChoiceCount.count))
+                         .filter(ChoiceCount.kind == 'food').scalar())
@@ -0,0 +1,122 @@
+"""Test database connection setup."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from flask import Config, g
+from sqlalchemy import create_engine
+from app import create_app
+from app import db
+from app.database import TimedQueuePool, is_sqlite_file, pool_options
+from app.instrumentation import RequestStats
+from app.tests.test_utils import ModelTestConfig
+
+class TestSqliteProduction(unittest.TestCase):
+    """The SQLite production profile configures each new connection."""
+
+    def setUp(self):
+        """Create a scratch directory for database files."""
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the scratch directory."""
+
+        shutil.rmtree(self.tmp_dir)
+
+    def pragmas(self, production):
+        """Read back pragmas from a new connection to a database file."""
+
+        class FileConfig(ModelTestConfig):
+            """App config using an SQLite file."""
+
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp_dir, 'test.db')}"
+            SQLITE_PRODUCTION = production
+            SQLITE_BUSY_TIMEOUT_MS = 2500
+
+        app = create_app(FileConfig)
+
+        with app.app_context():
+            with db.engine.connect() as connection:
+                pragmas = {
+                    name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() \
+                        for name in ['journal_mode', 'synchronous', 'busy_timeout', 'cache_size']
+                }
+            db.engine.dispose()
+
+        return pragmas
+
+    def test_production_pragmas(self):
+        """WAL, synchronous=NORMAL, and the configured timeout and cache size are set."""
+
+        pragmas = self.pragmas(True)
+
+        self.assertEqual('wal', pragmas['journal_mode'])
+        self.assertEqual(1, pragmas['synchronous'])
+        self.assertEqual(2500, pragmas['busy_timeout'])
+        self.assertEqual(-20000, pragmas['cache_size'])
+
+    def test_default_pragmas(self):
+        """Without the profile SQLite's defaults are left alone."""
+
+        self.assertEqual('delete', self.pragmas(False)['journal_mode'])
+
+    def test_is_sqlite_file(self):
+        """Only SQLite database files get the profile."""
+
+        self.assertTrue(is_sqlite_file('sqlite:////tmp/app.db'))
+        self.assertFalse(is_sqlite_file('sqlite://'))
+        self.assertFalse(is_sqlite_file('sqlite:///:memory:'))
+        self.assertFalse(is_sqlite_file('postgresql://user@localhost/mealpoll'))
+
+class TestConnectionPool(unittest.TestCase):
+    """Server databases get a configured, instrumented connection pool."""
+
+    def test_pool_options(self):
+        """Pool settings come from the DB_POOL_* config, but not for SQLite."""
+
+        config = Config('')
+        config.from_object(ModelTestConfig)
+        config.update(
+            SQLALCHEMY_DATABASE_URI='postgresql://user@localhost/mealpoll',
+            DB_STATEMENT_TIMEOUT_MS=1500
+        )
+
+        options = pool_options(config)
+
+        self.assertIs(TimedQueuePool, options['poolclass'])
+        self.assertEqual(5, options['pool_size'])
+        self.assertEqual(10, options['max_overflow'])
+        self.assertEqual(1800, options['pool_recycle'])
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual('-c statement_timeout=1500', options['connect_args']['options'])
+
+        config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////tmp/app.db'
+        self.assertDictEqual({}, pool_options(config))
+
+    def test_checkout_wait(self):
+        """Time spent waiting for a connection is recorded in the request stats."""
+
+        # A one-connection pool stands in for a busy Postgres pool
+        engine = create_engine('sqlite://', poolclass=TimedQueuePool, pool_size=1,
+                               max_overflow=0, pool_timeout=5)
+        app = create_app(ModelTestConfig)
+
+        held = engine.connect()
+        threading.Timer(0.1, held.close).start()
+
+        with app.test_request_context():
+            g.request_stats = RequestStats()
+
+            with engine.connect():
+                pass
+
+            stats = g.request_stats
+
+        engine.dispose()
+
+        self.assertEqual(1, stats.pool_checkouts)
+        self.assertGreaterEqual(stats.pool_wait_seconds, 0.05)
+        self.assertIn('pool;dur=', stats.server_timing())
@@ -0,0 +1,114 @@
+"""Test per-request SQL instrumentation."""
+
+import io
+import json
+import logging
+import re
+import unittest
+from flask import stream_with_context
+from app import db
+from app import create_app
+from app.instrumentation import LOG_HANDLER_NAME, logger, query_budget
+from app.main.models import Drink
+from app.tests.test_utils import RouteTestConfig, RouteTestMixin
+
+class TestInstrumentation(RouteTestMixin, unittest.TestCase):
+    """Statement counts are reported per request and budgets are enforced."""
+
+    def setUp(self):
+        """Add a route that runs a known number of queries."""
+
+        super().setUp()
+
+        @query_budget(2)
+        def drinks(count):
+            for _ in range(int(count)):
+                Drink.query.all()
+            return 'OK'
+
+        @query_budget(2)
+        def stream_drinks(count):
+            def generate():
+                for _ in range(int(count)):
+                    yield f'{len(Drink.query.all())}\n'
+
+            return self.app.response_class(stream_with_context(generate()))
+
+        self.app.add_url_rule('/test_drinks/<count>', 'test_drinks', drinks)
+        self.app.add_url_rule('/test_stream_drinks/<count>', 'test_stream_drinks', stream_drinks)
+
+    def test_server_timing(self):
+        """The Server-Timing header reports statements and database time."""
+
+        result = self.client.get('/test_drinks/2')
+
+        self.assertRegex(
+            result.headers['Server-Timing'],
+            r'^db;dur=[0-9.]+;desc="2 queries", app;dur=[0-9.]+$'
+        )
+
+    def test_log_line(self):
+        """Each request is logged as a JSON object."""
+
+        with self.assertLogs('app.instrumentation', level='INFO') as logs:
+            self.client.get('/test_drinks/1')
+
+        record = json.loads(re.sub(r'^INFO:app.instrumentation:', '', logs.output[-1]))
+
+        self.assertEqual('test_drinks', record['endpoint'])
+        self.assertEqual(1, record['db_statements'])
+
+    def test_query_budget(self):
+        """Going over a declared budget fails when budgets are enforced."""
+
+        with self.assertRaises(AssertionError):
+            self.client.get('/test_drinks/3')
+
+        self.app.config['ENFORCE_QUERY_BUDGETS'] = False
+
+        with self.assertLogs('app.instrumentation', level='WARNING'):
+            self.assertEqual(200, self.client.get('/test_drinks/3').status_code)
+
+        db.session.remove()
+
+    def test_streamed_query_budget(self):
+        """Statements run while streaming a response count towards its budget."""
+
+        self.assertEqual(b'0\n0\n', self.client.get('/test_stream_drinks/2').data)
+
+        with self.assertRaises(AssertionError):
+            self.client.get('/test_stream_drinks/3').data #pylint: disable=expression-not-assigned
+
+        self.app.config['ENFORCE_QUERY_BUDGETS'] = False
+
+        with self.assertLogs('app.instrumentation', level='WARNING') as logs:
+            self.client.get('/test_stream_drinks/3').data #pylint: disable=expression-not-assigned
+
+        self.assertIn('test_stream_drinks ran 3 queries', logs.output[0])
+
+        db.session.remove()
+
+    def test_log_output(self):
+        """The request log is written at the configured level without any other logging setup."""
+
+        stream = io.StringIO()
+        handler, = [handler for handler in logger.handlers if handler.name == LOG_HANDLER_NAME]
+        previous = handler.setStream(stream)
+        self.addCleanup(handler.setStream, previous)
+
+        self.assertEqual(logging.INFO, logger.getEffectiveLevel())
+
+        self.client.get('/test_drinks/1')
+        self.assertEqual('test_drinks', json.loads(stream.getvalue())['endpoint'])
+
+        class QuietConfig(RouteTestConfig):
+            """Only log query budget warnings."""
+
+            REQUEST_LOG_LEVEL = 'WARNING'
+
+        stream.truncate(0)
+        create_app(QuietConfig)
+        self.addCleanup(logger.setLevel, logging.INFO)
+
+        self.client.get('/test_drinks/1')
+        self.assertEqual('', stream.getvalue())
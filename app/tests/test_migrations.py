@@ -0,0 +1,175 @@
+"""Test database migrations and the query plans they enable."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+import flask_migrate
+from app import create_app
+from app import db
+from app.database import migration_filter
+from app.tests.test_utils import ModelTestConfig
+
+# Migration scripts live in the repository root
+MIGRATIONS = os.path.join(os.path.dirname(__file__), '..', '..', 'migrations')
+
+BASELINE = '1bd1e5a341f8'
+INDEXES = '321bf037fd82'
+REGISTRATION_WINDOWS = '5f5b36159971'
+MEAL_VERSIONS = 'a3cb74299c01'
+UNIQUE_RESPONSES = 'aae6240bcbb4'
+MEAL_ARCHIVE = '63bef883db1f'
+RESPONSE_COUNTERS = '18fb50d6b63e'
+
+class TestMigrations(unittest.TestCase):
+    """Run the migrations against a scratch SQLite database."""
+
+    def setUp(self):
+        """Create an app pointing at an empty SQLite file."""
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+        class MigrationTestConfig(ModelTestConfig):
+            """App config using a file database so migrations can share it."""
+
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmp_dir, 'test.db')}"
+
+        self.app = create_app(MigrationTestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        """Remove the app and the scratch database."""
+
+        db.session.remove()
+        db.engine.dispose()
+        self.app_context.pop()
+        shutil.rmtree(self.tmp_dir)
+
+    def query_plan(self, statement):
+        """Get SQLite's query plan for a statement as a single string."""
+
+        with db.engine.connect() as connection:
+            rows = connection.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+
+        return ' | '.join(row[-1] for row in rows)
+
+    def test_head_matches_models(self):
+        """Upgrading to head yields the schema described by the models."""
+
+        flask_migrate.upgrade(directory=MIGRATIONS)
+
+        with db.engine.connect() as connection:
+            context = MigrationContext.configure(connection, opts={
+                'include_object': migration_filter(connection.dialect.name)
+            })
+            diff = compare_metadata(context, db.metadata)
+
+        self.assertListEqual([], diff)
+
+        flask_migrate.downgrade(directory=MIGRATIONS, revision='base')
+
+    def test_index_query_plans(self):
+        """The indexing revision turns table scans on hot paths into index searches."""
+
+        meal_responses = 'SELECT * FROM response WHERE meal_id = 1'
+        open_meals = 'SELECT * FROM meal WHERE registration_open = 1 ORDER BY date'
+
+        flask_migrate.upgrade(directory=MIGRATIONS, revision=BASELINE)
+
+        before = self.query_plan(meal_responses)
+        self.assertIn('SCAN', before)
+        self.assertNotIn('INDEX', before)
+
+        before = self.query_plan(open_meals)
+        self.assertIn('SCAN', before)
+        self.assertIn('TEMP B-TREE FOR ORDER BY', before)
+
+        flask_migrate.upgrade(directory=MIGRATIONS, revision=INDEXES)
+
+        after = self.query_plan(meal_responses)
+        self.assertIn('SEARCH', after)
+        self.assertIn('ix_response_meal_id', after)
+
+        after = self.query_plan(open_meals)
+        self.assertIn('SEARCH', after)
+        self.assertIn('ix_meal_registration_open_date', after)
+        self.assertNotIn('TEMP B-TREE', after)
+
+    def test_open_meals_query_plan(self):
+        """Open meals are found with a range search on the registration window index."""
+
+        flask_migrate.upgrade(directory=MIGRATIONS, revision=REGISTRATION_WINDOWS)
+
+        plan = self.query_plan(
+            "SELECT * FROM meal WHERE registration_close > '2030-01-01' "
+            "AND registration_open < '2030-01-01' ORDER BY registration_close"
+        )
+
+        self.assertIn('SEARCH', plan)
+        self.assertIn('ix_meal_registration_close_open', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_unique_responses(self):
+        """Duplicate responses are collapsed to the latest before the unique index is built."""
+
+        flask_migrate.upgrade(directory=MIGRATIONS, revision=MEAL_VERSIONS)
+
+        with db.engine.begin() as connection:
+            connection.execute(
+                "INSERT INTO meal_type (id, name) VALUES (1, 'Lunch')"
+            )
+            connection.execute(
+                "INSERT INTO meal (id, meal_type_id, date) VALUES (1, 1, '2030-01-01')"
+            )
+            for response_id, email in [(1, 'paul@rider.com'), (2, 'Paul@Rider.com'),
+                                       (3, 'sam@rider.com'), (4, None), (5, None)]:
+                connection.execute(
+                    'INSERT INTO response (id, first_name, last_name, email, meal_id) '
+                    "VALUES (?, 'First', 'Last', ?, 1)", (response_id, email)
+                )
+
+        flask_migrate.upgrade(directory=MIGRATIONS, revision=UNIQUE_RESPONSES)
+
+        with db.engine.connect() as connection:
+            ids = [row[0] for row in connection.execute('SELECT id FROM response ORDER BY id')]
+
+        self.assertListEqual([2, 3, 4, 5], ids)
+        self.assertIn(
+            'uq_response_meal_id_email',
+            self.query_plan("SELECT id FROM response WHERE meal_id = 1 AND lower(email) = 'x'")
+        )
+
+    def test_response_counters(self):
+        """Counters are filled in from the existing responses."""
+
+        flask_migrate.upgrade(directory=MIGRATIONS, revision=MEAL_ARCHIVE)
+
+        with db.engine.begin() as connection:
+            connection.execute("INSERT INTO meal_type (id, name) VALUES (1, 'Lunch')")
+            for meal_id in [1, 2]:
+                connection.execute(
+                    "INSERT INTO meal (id, meal_type_id, date) VALUES (?, 1, '2030-01-01')",
+                    (meal_id,)
+                )
+            for response_id, food_id, food_other in [(1, 7, None), (2, 7, None),
+                                                     (3, None, 'Steak'), (4, None, '')]:
+                connection.execute(
+                    'INSERT INTO response (id, first_name, last_name, meal_id, food_id, '
+                    "food_other) VALUES (?, 'First', 'Last', 1, ?, ?)",
+                    (response_id, food_id, food_other)
+                )
+
+        flask_migrate.upgrade(directory=MIGRATIONS, revision=RESPONSE_COUNTERS)
+
+        with db.engine.connect() as connection:
+            meals = connection.execute('SELECT id, response_count FROM meal ORDER BY id')
+            self.assertListEqual([(1, 4), (2, 0)], [tuple(row) for row in meals])
+
+            counts = connection.execute(
+                'SELECT meal_id, kind, item_id, count FROM choice_count ORDER BY item_id'
+            )
+            self.assertListEqual([(1, 'food', 0, 1), (1, 'food', 7, 2)],
+                                 [tuple(row) for row in counts])
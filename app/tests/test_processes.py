@@ -0,0 +1,32 @@
+"""Test identifying the processes behind per-process files."""
+
+import os
+import unittest
+from app.processes import is_alive, parse_process_key, process_key, start_time
+
+# A pid that can't belong to a running process
+DEAD_PID = 2147483000
+
+class TestProcesses(unittest.TestCase):
+    """Tests for process keys and liveness checks."""
+
+    def test_process_key(self):
+        """Keys round-trip, and bare pids parse without a start time."""
+
+        pid, started = parse_process_key(process_key())
+
+        self.assertEqual(os.getpid(), pid)
+        self.assertEqual(start_time(os.getpid()), started)
+        self.assertEqual((12, None), parse_process_key('12'))
+
+    def test_is_alive(self):
+        """A live pid with a different start time belongs to another process."""
+
+        started = start_time(os.getpid())
+
+        self.assertTrue(is_alive(os.getpid()))
+        self.assertTrue(is_alive(os.getpid(), started))
+        self.assertFalse(is_alive(DEAD_PID))
+
+        if started is not None:
+            self.assertFalse(is_alive(os.getpid(), started + 1))
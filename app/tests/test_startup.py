@@ -0,0 +1,39 @@
+"""Guard the web entry point's cold-start time."""
+
+import unittest
+from app.tests import startup
+
+class TestStartup(unittest.TestCase):
+    """Importing wsgi stays lean and fast."""
+
+    def test_cli_extensions_not_loaded(self):
+        """Web workers skip Flask-Migrate and Alembic; the flask command keeps them."""
+
+        self.assertFalse({'flask_migrate', 'alembic'} & startup.imported_modules('wsgi'))
+        self.assertIn('flask_migrate', startup.imported_modules('mealpoll'))
+
+    def test_migrate_extension(self):
+        """app.migrate is still the Flask-Migrate extension the flask command uses."""
+
+        from flask_migrate import Migrate
+        from app import create_app, migrate
+        from app.tests.test_utils import ModelTestConfig
+
+        app = create_app(ModelTestConfig)
+
+        self.assertIsInstance(migrate, Migrate)
+        self.assertIs(migrate, app.extensions['migrate'].migrate)
+
+    def test_cold_start(self):
+        """A fresh interpreter imports wsgi within the cold-start budget."""
+
+        self.assertLess(startup.cold_start('wsgi', runs=3), startup.COLD_START_BUDGET)
+
+    def test_import_profile(self):
+        """The profile attributes import time to top-level packages."""
+
+        packages = dict(startup.import_profile('wsgi'))
+
+        self.assertIn('flask', packages)
+        self.assertIn('app', packages)
+        self.assertNotIn('alembic', packages)
@@ -1,13 +1,41 @@
 """Utilities for unit testing."""
 
+from sqlalchemy import event
 from config import Config
 from app import create_app
 from app import db
+from app.auth.models import Admin
 
 class ModelTestConfig(Config):
     """App config for testing."""
 
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    ENFORCE_QUERY_BUDGETS = True
+
+class RouteTestConfig(ModelTestConfig):
+    """App config for testing routes through the test client."""
+
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+
+class StatementCounter():
+    """Context manager that records the SQL statements run against the database."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, *args): #pylint: disable=unused-argument
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, 'before_cursor_execute', self._record)
 
 class ModelTestMixin():
     """A mixin for model tests.
@@ -15,10 +43,12 @@ class ModelTestMixin():
     Creates app object and in-memory database instance.
     """
 
+    config = ModelTestConfig
+
     def setUp(self): #pylint: disable=invalid-name
         """Create an instance of the app with an in-memory database."""
 
-        self.app = create_app(ModelTestConfig)
+        self.app = create_app(self.config)
         self.app_context = self.app.app_context()
         self.app_context.push()
         db.create_all()
@@ -28,4 +58,32 @@ class ModelTestMixin():
 
         db.session.remove()
         db.drop_all()
-        self.app_context.pop()
\ No newline at end of file
+        self.app_context.pop()
+
+class RouteTestMixin(ModelTestMixin):
+    """A mixin for route tests.
+
+    Adds a test client and disables CSRF protection on forms.
+    """
+
+    config = RouteTestConfig
+
+    def setUp(self): #pylint: disable=invalid-name
+        """Create the app and a test client for it."""
+
+        super().setUp()
+        self.client = self.app.test_client()
+
+    def login_admin(self):
+        """Create an admin and sign the test client in as them."""
+
+        admin = Admin(first_name='Test', last_name='Admin', email='admin@example.com')
+        admin.set_password('password')
+        db.session.add(admin)
+        db.session.commit()
+
+        with self.client.session_transaction() as session:
+            session['_user_id'] = admin.get_id()
+            session['_fresh'] = True
+
+        return admin
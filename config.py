@@ -20,5 +20,152 @@ class Config():
         f"sqlite:///{os.path.join(APP_ROOT, 'app.db')}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Register extensions only used by the flask command, such as Flask-Migrate.
+    # wsgi.py turns this off so web workers start faster.
+    LOAD_CLI_EXTENSIONS = os.environ.get('LOAD_CLI_EXTENSIONS', '1') != '0'
+
+    # Number of proxies in front of the app (e.g. 1 behind a single load
+    # balancer) whose X-Forwarded-For and X-Forwarded-Proto headers are trusted
+    # for the client's address and scheme. Leave at 0 when clients connect
+    # directly, or they can claim any address and dodge sign-in throttling.
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES') or 0)
+
+    # Password hashing method (werkzeug format, including the iteration count).
+    # Admins' passwords are rehashed with it when they next sign in.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:150000'
+
+    # Sign-in password checks run at most LOGIN_VERIFY_CONCURRENCY at a time per
+    # worker, with LOGIN_VERIFY_QUEUE more waiting up to LOGIN_VERIFY_WAIT
+    # seconds. A sign-in still holds its request thread while it waits and while
+    # its hash runs. Failed sign-ins are counted per client address and per email
+    # within each LOGIN_THROTTLE_WINDOW seconds. Addresses over their limit are
+    # refused outright. Emails over theirs can only sign in with the correct
+    # password, so other people's failures can't lock an admin out.
+    LOGIN_VERIFY_CONCURRENCY = int(os.environ.get('LOGIN_VERIFY_CONCURRENCY') or 2)
+    LOGIN_VERIFY_QUEUE = int(os.environ.get('LOGIN_VERIFY_QUEUE') or 8)
+    LOGIN_VERIFY_WAIT = float(os.environ.get('LOGIN_VERIFY_WAIT') or 2.0)
+    LOGIN_THROTTLE_WINDOW = int(os.environ.get('LOGIN_THROTTLE_WINDOW') or 300)
+    LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP') or 20)
+    LOGIN_MAX_FAILURES_PER_EMAIL = int(os.environ.get('LOGIN_MAX_FAILURES_PER_EMAIL') or 5)
+
+    # Seconds a signed-in admin's identity is cached between database lookups
+    # (0 disables the cache). Set IDENTITY_CACHE_DIR to a directory shared by
+    # all workers so that admin changes reach every worker's cache immediately.
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60)
+    IDENTITY_CACHE_DIR = os.environ.get('IDENTITY_CACHE_DIR')
+
+    # Accept sessions and remember-me cookies holding a bare admin id, from
+    # before session ids carried a fingerprint. They're upgraded to a
+    # fingerprinted id when first used. Set to 0 once the old ones have expired
+    # (remember-me cookies last a year) so they can no longer skip revalidation.
+    ACCEPT_LEGACY_SESSION_IDS = os.environ.get('ACCEPT_LEGACY_SESSION_IDS', '1') != '0'
+
+    # Connection pool for server databases such as Postgres (not SQLite).
+    # Connections are checked with a ping before use and replaced after
+    # DB_POOL_RECYCLE seconds. DB_STATEMENT_TIMEOUT_MS sets Postgres's
+    # statement_timeout for each connection (0 disables it).
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 0)
+
+    # Configure SQLite database files for several worker processes: WAL
+    # journaling, synchronous=NORMAL, a busy timeout, and larger page cache and
+    # mmap sizes. Has no effect on other databases.
+    SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '0') != '0'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 20000)
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 268435456)
+
+    # Count SQL statements and database time per request, reported in a
+    # Server-Timing header and a log line. The log lines go to stderr from the
+    # app.instrumentation logger at INFO (query budget warnings at WARNING), and
+    # are written if they're at REQUEST_LOG_LEVEL or above.
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '1') != '0'
+    REQUEST_LOG_LEVEL = os.environ.get('REQUEST_LOG_LEVEL') or 'INFO'
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', '1') != '0'
+    # Fail requests that exceed their declared query budget (otherwise just log)
+    ENFORCE_QUERY_BUDGETS = False
+
+    # Per-endpoint request metrics served in Prometheus format at /metrics.
+    # Set METRICS_DIR to a directory shared by all gunicorn workers to aggregate
+    # across them; without it each worker only reports its own requests. Workers
+    # write their counters there at most every METRICS_FLUSH_INTERVAL seconds, on
+    # the next request they finish, and at exit, so an idle worker's latest
+    # requests can be missing until it serves another. Exited workers' files are
+    # folded into one when metrics are read.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 1.0)
+    # Bearer token letting a scraper read /metrics without an admin login
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Number of response rows fetched per batch when streaming CSV exports
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 500)
+
+    # Maximum number of responses accepted by one bulk submission
+    BULK_RESPONSE_LIMIT = int(os.environ.get('BULK_RESPONSE_LIMIT') or 200)
+
+    # Queue submitted responses and write them in batches from a background
+    # thread, instead of committing once per request. Rows are flushed every
+    # RESPONSE_QUEUE_FLUSH_MS milliseconds or once RESPONSE_QUEUE_BATCH_ROWS are
+    # waiting. Submitters are asked to retry if RESPONSE_QUEUE_MAX_PENDING rows
+    # are already waiting. Set RESPONSE_QUEUE_JOURNAL_DIR to journal queued rows
+    # to disk so they survive a crashed worker.
+    RESPONSE_QUEUE_ENABLED = os.environ.get('RESPONSE_QUEUE_ENABLED', '0') != '0'
+    RESPONSE_QUEUE_FLUSH_MS = int(os.environ.get('RESPONSE_QUEUE_FLUSH_MS') or 200)
+    RESPONSE_QUEUE_BATCH_ROWS = int(os.environ.get('RESPONSE_QUEUE_BATCH_ROWS') or 100)
+    RESPONSE_QUEUE_MAX_PENDING = int(os.environ.get('RESPONSE_QUEUE_MAX_PENDING') or 2000)
+    RESPONSE_QUEUE_SUBMIT_TIMEOUT = float(os.environ.get('RESPONSE_QUEUE_SUBMIT_TIMEOUT') or 0.5)
+    RESPONSE_QUEUE_JOURNAL_DIR = os.environ.get('RESPONSE_QUEUE_JOURNAL_DIR')
+    RESPONSE_QUEUE_FSYNC = os.environ.get('RESPONSE_QUEUE_FSYNC', '1') != '0'
+
+    # Meals dated more than ARCHIVE_AFTER_DAYS ago are offered for archiving
+    # from the meals list (flask archive-meals takes its own cutoff). Meals are
+    # archived ARCHIVE_BATCH_MEALS at a time, one transaction per batch.
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 180)
+    ARCHIVE_BATCH_MEALS = int(os.environ.get('ARCHIVE_BATCH_MEALS') or 50)
+
+    # Live signup dashboard. Each worker checks the meals being watched every
+    # LIVE_POLL_INTERVAL seconds (one query for all viewers) and streams the
+    # LIVE_RECENT_RESPONSES latest responses with the tally. Streams send a
+    # keepalive comment every LIVE_KEEPALIVE seconds, end after
+    # LIVE_STREAM_MAX_AGE seconds (browsers reconnect), and are dropped if
+    # LIVE_MAX_QUEUED_EVENTS events back up.
+    #
+    # Every open stream holds a worker thread for up to LIVE_STREAM_MAX_AGE
+    # seconds, so each worker serves at most LIVE_MAX_STREAMS streams and
+    # refuses more with a 503 (the dashboard retries). Keep it below
+    # GUNICORN_THREADS so sign-ups always have threads left; the default is half
+    # of them.
+    LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL') or 1.0)
+    LIVE_RECENT_RESPONSES = int(os.environ.get('LIVE_RECENT_RESPONSES') or 20)
+    LIVE_KEEPALIVE = float(os.environ.get('LIVE_KEEPALIVE') or 15)
+    LIVE_STREAM_MAX_AGE = float(os.environ.get('LIVE_STREAM_MAX_AGE') or 300)
+    LIVE_MAX_QUEUED_EVENTS = int(os.environ.get('LIVE_MAX_QUEUED_EVENTS') or 100)
+    LIVE_MAX_STREAMS = int(
+        os.environ.get('LIVE_MAX_STREAMS') or
+        max(1, int(os.environ.get('GUNICORN_THREADS') or 4) // 2)
+    )
+
+    # Most meals a template's "generate series" action (or flask generate-meals)
+    # creates at once
+    MEAL_SERIES_MAX = int(os.environ.get('MEAL_SERIES_MAX') or 52)
+
+    # Longest time (seconds) the open meals list is cached between registration
+    # boundaries. Bounds how long other workers take to notice meal edits.
+    OPEN_MEALS_MAX_AGE = int(os.environ.get('OPEN_MEALS_MAX_AGE') or 60)
+
+    # Number of rendered index and sign-up page fragments kept in each worker,
+    # and the longest time (seconds) one is reused before being re-rendered
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 256)
+    FRAGMENT_CACHE_MAX_AGE = int(os.environ.get('FRAGMENT_CACHE_MAX_AGE') or 300)
+
+    # Cache-Control header for menu JSON endpoints (responses also carry an ETag)
+    MENU_CACHE_CONTROL = os.environ.get('MENU_CACHE_CONTROL') or \
+        'public, max-age=60'
+
     if os.environ.get('FLASK_ENV') == 'development':
         SEND_FILE_MAX_AGE_DEFAULT = 0
@@ -0,0 +1,46 @@
+"""Gunicorn settings for serving wsgi:app.
+
+The app is imported once in the master process and shared with forked workers
+(GUNICORN_PRELOAD=0 imports it in each worker instead). Database connections
+opened while loading are dropped in each worker after the fork.
+
+Migrations run in the Procfile's release phase rather than on every start.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY') or 2)
+# Threads per worker; live dashboard streams each hold one while they're open, up
+# to LIVE_MAX_STREAMS of them
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+def on_starting(server): #pylint: disable=unused-argument
+    """Clear metrics files left by a previous run, so old workers aren't counted."""
+
+    metrics_dir = os.environ.get('METRICS_DIR')
+
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.startswith('metrics-') or name.startswith('retired.json'):
+                os.remove(os.path.join(metrics_dir, name))
+
+def post_fork(server, worker): #pylint: disable=unused-argument
+    """Don't share the master's database connections with a worker."""
+
+    if preload_app:
+        from app import db
+        from wsgi import app
+
+        with app.app_context():
+            db.engine.dispose()
+
+def worker_exit(server, worker): #pylint: disable=unused-argument
+    """Write the worker's final metrics, so requests since its last flush are counted."""
+
+    from wsgi import app
+
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.flush()
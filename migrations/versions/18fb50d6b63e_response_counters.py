@@ -0,0 +1,84 @@
+"""response counters
+
+Revision ID: 18fb50d6b63e
+Revises: 63bef883db1f
+Create Date: 2026-10-18 10:23:45.709521
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '18fb50d6b63e'
+down_revision = '63bef883db1f'
+branch_labels = None
+depends_on = None
+
+
+# Lightweight views of the tables for data migration
+meal = sa.table(
+    'meal',
+    sa.column('id', sa.Integer),
+    sa.column('response_count', sa.Integer)
+)
+
+response = sa.table(
+    'response',
+    sa.column('id', sa.Integer),
+    sa.column('meal_id', sa.Integer),
+    sa.column('food_id', sa.Integer),
+    sa.column('side_id', sa.Integer),
+    sa.column('drink_id', sa.Integer),
+    sa.column('food_other', sa.String),
+    sa.column('side_other', sa.String),
+    sa.column('drink_other', sa.String)
+)
+
+choice_count = sa.table(
+    'choice_count',
+    sa.column('meal_id', sa.Integer),
+    sa.column('kind', sa.String),
+    sa.column('item_id', sa.Integer),
+    sa.column('count', sa.Integer)
+)
+
+
+def upgrade():
+    op.create_table('choice_count',
+    sa.Column('meal_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=8), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['meal_id'], ['meal.id'], ),
+    sa.PrimaryKeyConstraint('meal_id', 'kind', 'item_id')
+    )
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.add_column(
+            sa.Column('response_count', sa.Integer(), server_default='0', nullable=False)
+        )
+
+    # Count the existing responses (the same as flask recount-responses)
+    op.execute(meal.update().values(
+        response_count=sa.select([sa.func.count(response.c.id)])\
+            .where(response.c.meal_id == meal.c.id).scalar_subquery()
+    ))
+
+    for kind in ['food', 'side', 'drink']:
+        item_id = response.c[f'{kind}_id']
+        other = response.c[f'{kind}_other']
+        counted_id = sa.func.coalesce(item_id, 0)
+
+        op.execute(choice_count.insert().from_select(
+            ['meal_id', 'kind', 'item_id', 'count'],
+            sa.select([response.c.meal_id, sa.literal(kind), counted_id,
+                       sa.func.count(response.c.id)])\
+                .where(sa.or_(item_id.isnot(None), sa.and_(other.isnot(None), other != '')))\
+                .group_by(response.c.meal_id, counted_id)
+        ))
+
+
+def downgrade():
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.drop_column('response_count')
+    op.drop_table('choice_count')
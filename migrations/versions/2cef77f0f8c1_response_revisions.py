@@ -0,0 +1,28 @@
+"""response revisions
+
+Revision ID: 2cef77f0f8c1
+Revises: 18fb50d6b63e
+Create Date: 2026-10-18 10:27:15.790757
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2cef77f0f8c1'
+down_revision = '18fb50d6b63e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.add_column(
+            sa.Column('response_revision', sa.Integer(), server_default='0', nullable=False)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.drop_column('response_revision')
@@ -0,0 +1,50 @@
+"""index hot query paths
+
+Revision ID: 321bf037fd82
+Revises: 1bd1e5a341f8
+Create Date: 2026-10-18 09:57:33.205553
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '321bf037fd82'
+down_revision = '1bd1e5a341f8'
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns) for each index; names match the models
+INDEXES = [
+    ('ix_meal_date', 'meal', ['date']),
+    ('ix_meal_registration_open_date', 'meal', ['registration_open', 'date']),
+    ('ix_response_drink_id', 'response', ['drink_id']),
+    ('ix_response_food_id', 'response', ['food_id']),
+    ('ix_response_meal_id', 'response', ['meal_id']),
+    ('ix_response_side_id', 'response', ['side_id']),
+]
+
+
+def upgrade():
+    # Postgres can build the indexes without locking out writes, but
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False,
+                                postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
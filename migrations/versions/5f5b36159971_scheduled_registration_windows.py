@@ -0,0 +1,82 @@
+"""scheduled registration windows
+
+Revision ID: 5f5b36159971
+Revises: 321bf037fd82
+Create Date: 2026-10-18 09:59:50.598239
+
+"""
+from datetime import datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f5b36159971'
+down_revision = '321bf037fd82'
+branch_labels = None
+depends_on = None
+
+# Lightweight view of the meal table for data migration
+meal = sa.table(
+    'meal',
+    sa.column('id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('registration_open', sa.Boolean),
+    sa.column('registration_flag', sa.Boolean),
+    sa.column('registration_start', sa.DateTime),
+    sa.column('registration_close', sa.DateTime)
+)
+
+
+def upgrade():
+    # The meal table is small, so these indexes are built inline on every database
+    op.drop_index('ix_meal_registration_open_date', table_name='meal')
+
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.add_column(sa.Column('registration_start', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('registration_close', sa.DateTime(), nullable=True))
+
+    # Meals that were open stay open through the end of the meal's date
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    open_meals = bind.execute(
+        sa.select([meal.c.id, meal.c.date]).where(meal.c.registration_open == sa.true())
+    ).fetchall()
+
+    for meal_id, date in open_meals:
+        bind.execute(meal.update().where(meal.c.id == meal_id).values(
+            registration_start=now,
+            registration_close=datetime(date.year, date.month, date.day) + timedelta(days=1)
+        ))
+
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.drop_column('registration_open')
+        batch_op.alter_column('registration_start', new_column_name='registration_open',
+                              existing_type=sa.DateTime(), existing_nullable=True)
+
+    op.create_index('ix_meal_registration_close_open', 'meal',
+                    ['registration_close', 'registration_open'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_meal_registration_close_open', table_name='meal')
+
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.add_column(sa.Column('registration_flag', sa.Boolean(), nullable=False,
+                                      server_default=sa.false()))
+
+    now = datetime.utcnow()
+    op.get_bind().execute(meal.update().where(sa.and_(
+        meal.c.registration_open < now,
+        meal.c.registration_close > now
+    )).values(registration_flag=True))
+
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.drop_column('registration_close')
+        batch_op.drop_column('registration_open')
+        batch_op.alter_column('registration_flag', new_column_name='registration_open',
+                              existing_type=sa.Boolean(), existing_nullable=False,
+                              server_default=None)
+
+    op.create_index('ix_meal_registration_open_date', 'meal',
+                    ['registration_open', 'date'], unique=False)
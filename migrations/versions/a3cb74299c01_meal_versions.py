@@ -0,0 +1,28 @@
+"""meal versions
+
+Revision ID: a3cb74299c01
+Revises: 5f5b36159971
+Create Date: 2026-10-18 10:09:42.301258
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3cb74299c01'
+down_revision = '5f5b36159971'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.add_column(
+            sa.Column('version', sa.Integer(), server_default='1', nullable=False)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('meal') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,52 @@
+"""unique response per meal and email
+
+Revision ID: aae6240bcbb4
+Revises: a3cb74299c01
+Create Date: 2026-10-18 10:17:26.661433
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aae6240bcbb4'
+down_revision = 'a3cb74299c01'
+branch_labels = None
+depends_on = None
+
+
+# Lightweight view of the response table for data migration
+response = sa.table(
+    'response',
+    sa.column('id', sa.Integer),
+    sa.column('meal_id', sa.Integer),
+    sa.column('email', sa.String)
+)
+
+
+def upgrade():
+    # Keep only the latest response from each email for each meal
+    latest = sa.select([sa.func.max(response.c.id)])\
+        .where(response.c.email.isnot(None))\
+        .group_by(response.c.meal_id, sa.func.lower(response.c.email))
+    op.execute(
+        response.delete()\
+            .where(response.c.email.isnot(None))\
+            .where(response.c.id.notin_(latest))
+    )
+
+    # As with the other response indexes, Postgres builds this one without
+    # locking out writes, which needs to happen outside a transaction
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index('uq_response_meal_id_email', 'response',
+                            ['meal_id', sa.text('lower(email)')], unique=True,
+                            postgresql_concurrently=True)
+    else:
+        op.create_index('uq_response_meal_id_email', 'response',
+                        ['meal_id', sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_response_meal_id_email', table_name='response')
@@ -0,0 +1,28 @@
+"""food versions
+
+Revision ID: c41d7e2a9b05
+Revises: 87807c17ede7
+Create Date: 2026-10-18 11:02:37.514209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e2a9b05'
+down_revision = '87807c17ede7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('food') as batch_op:
+        batch_op.add_column(
+            sa.Column('version', sa.Integer(), server_default='1', nullable=False)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('food') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,10 @@
+"""Mealpoll WSGI Entry Point
+
+Serves the app without CLI-only extensions; use mealpoll.py for the flask command.
+"""
+import os
+os.environ.setdefault('LOAD_CLI_EXTENSIONS', '0')
+
+from app import create_app #pylint: disable=wrong-import-position
+
+app = create_app()